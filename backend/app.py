@@ -1,278 +1,177 @@
-import os
-from flask import Flask, request, jsonify, send_from_directory
+import logging
+import secrets
+from flask import Flask, jsonify
 from flask_cors import CORS
-from flask_mysqldb import MySQL
-from MySQLdb.cursors import DictCursor  # Important fix
-import bcrypt
-from werkzeug.utils import secure_filename
-
-app = Flask(__name__)
-CORS(app)
-
-# Configuration
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = 'root'
-app.config['MYSQL_PASSWORD'] = ''
-app.config['MYSQL_DB'] = 'hospital_inventory'
-
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-mysql = MySQL(app)
-
-
-# Routes
-@app.route('/signup', methods=['POST'])
-def signup():
-    try:
-        data = request.json
-        required_fields = ['firstName', 'lastName', 'dateOfBirth', 'email', 
-                         'position', 'idNumber', 'phoneNumber', 'password']
-        
-        if not all(field in data for field in required_fields):
-            return jsonify({'message': 'Missing required fields'}), 400
-
-        cursor = mysql.connection.cursor()
-        
-        # Check if email or ID number already exists
-        cursor.execute("SELECT * FROM userss WHERE email = %s OR id_number = %s", 
-                     (data['email'], data['idNumber']))
-        existing_user = cursor.fetchone()
-
-        if existing_user:
-            conflict = 'Email' if existing_user['email'] == data['email'] else 'ID Number'
-            return jsonify({'message': f'{conflict} already exists!'}), 409
-
-        # Hash password
-        hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
-
-        # Insert new user
-        cursor.execute("""
-            INSERT INTO userss 
-            (first_name, last_name, date_of_birth, email, position, id_number, phone_number, password)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            data['firstName'],
-            data['lastName'],
-            data['dateOfBirth'],
-            data['email'],
-            data['position'],
-            data['idNumber'],
-            data['phoneNumber'],
-            hashed_password
-        ))
-
-        mysql.connection.commit()
-        cursor.close()
-
-        return jsonify({'message': 'User registered successfully!'}), 201
-
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-
-@app.route('/api/login', methods=['POST'])
-def login():
-    try:
-        data = request.json
-        username = data.get('username')
-        password = data.get('password')
-
-        cursor = mysql.connection.cursor()
-        cursor.execute("SELECT * FROM userss WHERE email = %s", (username,))
-        user = cursor.fetchone()
-
-        if not user:
-            return jsonify({'status': 'error', 'message': 'Invalid username or password!'}), 401
-
-        stored_password = user[2].encode('utf-8')  # Access by index
-        if bcrypt.checkpw(password.encode('utf-8'), stored_password):
-            return jsonify({'status': 'success', 'message': 'Login successful!'}), 200
-        else:
-            return jsonify({'status': 'error', 'message': 'Invalid username or password!'}), 401
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
-
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
-
-# Resource Management
-@app.route('/api/resources', methods=['GET'])
-def get_resources():
-    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
-    cursor.execute('SELECT * FROM resources')
-    resources = cursor.fetchall()
-    cursor.close()
-    return jsonify(resources)
-
-
-@app.route('/api/resources', methods=['POST'])
-def add_resource():
-    name = request.form.get('name')
-    section = request.form.get('section')
-    file = request.files.get('image')
-
-    if not name or not section or not file:
-        return jsonify({'error': 'Missing required fields'}), 400
-
-    if allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-
-        cursor = mysql.connection.cursor()
-        cursor.execute(
-            'INSERT INTO resources (name, section, image_path) VALUES (%s, %s, %s)',
-            (name, section, filename)
-        )
-        mysql.connection.commit()
-        resource_id = cursor.lastrowid
-        cursor.close()
-
-        return jsonify({'id': resource_id, 'name': name, 'section': section, 'image_path': filename}), 201
-    else:
-        return jsonify({'error': 'Invalid file type'}), 400
-
-
-@app.route('/api/resources/<int:resource_id>', methods=['PUT'])
-def update_resource(resource_id):
-    name = request.form.get('name')
-    section = request.form.get('section')
-    file = request.files.get('image')
-
-    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
-    cursor.execute('SELECT * FROM resources WHERE id = %s', (resource_id,))
-    resource = cursor.fetchone()
-
-    if not resource:
-        return jsonify({'error': 'Resource not found'}), 404
-
-    filename = resource['image_path']  # Now safe with DictCursor
-
-    if file and allowed_file(file.filename):
-        old_file = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(old_file):
-            os.remove(old_file)
-
-        filename = secure_filename(file.filename)
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-
-    update_cursor = mysql.connection.cursor()
-    update_cursor.execute(
-        'UPDATE resources SET name = %s, section = %s, image_path = %s WHERE id = %s',
-        (name or resource['name'], section or resource['section'], filename, resource_id)
+from werkzeug.exceptions import RequestEntityTooLarge
+from db import mysql, PoolTimeout
+import auth
+from bench import bench_cli
+import cache
+import change_feed
+import dashboard
+import http_cache
+import images
+import metrics
+from migrate import db_cli
+import reports
+import resources
+import search_index
+
+
+def create_app(test_config=None):
+    app = Flask(__name__)
+    app.request_class = images.UploadRequest
+    CORS(app, expose_headers=['X-Next-After-Id'])
+
+    # Configuration
+    app.config.from_mapping(
+        # Signs session tokens; set HAMS_SECRET_KEY so tokens work across workers and restarts
+        SECRET_KEY=None,
+
+        # Auth
+        BCRYPT_ROUNDS=12,  # Work factor for new hashes; older hashes are upgraded on login
+        BCRYPT_WORKERS=2,  # Threads hashing/checking passwords in parallel
+        BCRYPT_QUEUE_LIMIT=32,  # Logins waiting for a bcrypt thread before 503
+        BCRYPT_TIMEOUT=10,
+        SESSION_TTL=12 * 3600,  # Seconds a login token stays valid
+        SESSION_CACHE_TTL=60,  # Seconds a session lookup is trusted before re-reading MySQL
+        SESSION_CACHE_SIZE=10000,
+        AUTH_REQUIRED=False,  # Reject write requests without a Bearer token
+
+        # MySQL
+        MYSQL_HOST='localhost',
+        MYSQL_USER='root',
+        MYSQL_PASSWORD='',
+        MYSQL_DB='hospital_inventory',
+        # One pool per worker process; keep workers x MYSQL_POOL_SIZE below max_connections
+        MYSQL_POOL_SIZE=5,
+        MYSQL_POOL_TIMEOUT=10,  # Seconds a request waits for a free connection before 503
+        MYSQL_POOL_RECYCLE=3600,  # Seconds before a connection is closed and replaced
+        MYSQL_POOL_PING_INTERVAL=30,  # Idle seconds after which a connection is pinged before reuse
+        # Read replicas for dashboard/report reads, e.g. HAMS_MYSQL_REPLICAS='["db-replica-1", "10.0.0.5:3307"]'
+        MYSQL_REPLICAS=[],
+        MYSQL_REPLICA_POOL_SIZE=5,  # Per replica, per worker process
+        MYSQL_REPLICA_POOL_TIMEOUT=1,  # Seconds to wait for a replica connection before using the primary
+        MYSQL_REPLICA_MAX_LAG=5,  # Seconds; laggier replicas are skipped. None trusts replicas without checking
+        MYSQL_REPLICA_CHECK_INTERVAL=2,  # Seconds between lag checks per replica
+        MYSQL_READ_YOUR_WRITES_WINDOW=10,  # Seconds a client's reads stay on the primary after it writes
+        SLOW_QUERY_LOG_THRESHOLD=None,  # Seconds; statements at least this slow are logged to hams.slow_query
+
+        # Read-through cache for list/count endpoints
+        CACHE_BACKEND='local',  # 'local' (per-process LRU) or 'redis' (shared, needs the redis package)
+        CACHE_MAX_ENTRIES=1024,  # LRU size of the local backend
+        CACHE_TTL=300,  # Seconds an entry may be served
+        CACHE_VERSION_CHECK_INTERVAL=1.0,  # Seconds between table_versions checks; bounds cross-worker staleness
+        CACHE_REDIS_URL='redis://localhost:6379/0',
+
+        # Responses
+        COMPRESS_MIN_SIZE=1024,  # JSON bodies smaller than this (bytes) are sent uncompressed
+        COMPRESS_LEVEL=6,  # gzip level
+        COMPRESS_BROTLI_QUALITY=4,  # brotli quality, used when the brotli package is installed
+
+        # Resources
+        UPLOAD_FOLDER='uploads',
+        UPLOAD_MAX_SIZE=10 * 1024 * 1024,  # Bytes per uploaded image; larger uploads get 413 mid-stream
+        ALLOWED_EXTENSIONS={'png', 'jpg', 'jpeg', 'gif'},
+        IMAGE_VARIANTS={'thumb': 200, 'card': 600},  # WebP variants (max edge in px), /uploads/<f>?variant=
+        IMAGE_CACHE_MAX_AGE=31536000,  # Content-addressed uploads never change
+        IMAGE_SWEEP_GRACE=3600,  # Seconds an unreferenced upload is kept before sweep-images removes it
+        LIST_MAX_LIMIT=5000,  # Upper bound for ?limit= on list endpoints
+        RESOURCE_BATCH_MAX_IDS=500,  # resourceIds accepted per GET /api/assets
+        STREAM_BATCH_SIZE=500,  # Rows fetched per round-trip when streaming
+        ASSET_BULK_BATCH_SIZE=500,  # Rows per multi-row INSERT/UPDATE in /api/assets/bulk
+        ASSET_BULK_MAX_BATCH_SIZE=5000,  # Upper bound for ?batchSize=
+        ASSET_BULK_MAX_ROWS=100000,  # Rows accepted per bulk request
+        DELETED_ASSETS_ARCHIVE_AFTER=30,  # Days a deleted asset stays restorable before archive-deleted-assets moves it
+        DELETED_ASSETS_ARCHIVE_BATCH_SIZE=1000,  # Rows moved per archive transaction
+        DELETED_ASSETS_ARCHIVE_PAUSE=0.05,  # Seconds between archive batches, leaving room for live writes
+        DELETED_ASSETS_ARCHIVE_RETENTION=None,  # Days; archived months older than this are exported and dropped
+        DELETED_ASSETS_EXPORT_DIR='archive',  # Where dropped archive months are written as .ndjson.gz
+
+        # Dashboard
+        DASHBOARD_CACHE_TTL=30,  # Seconds a computed dashboard summary may be reused
+        LOW_STOCK_THRESHOLD=10,  # Reorder threshold for assets without an asset/section threshold
+        FORECAST_WINDOW_DAYS=30,  # Days of stock movements the stock-out forecast measures usage over
+        STOCK_SNAPSHOT_LAG=300,  # Seconds; compact-stock-ledger leaves younger movements for the next run
+        STOCK_SNAPSHOTS_KEPT=14,  # Ledger snapshots kept; older points in time replay more movements
+        CHANGE_FEED_POLL_INTERVAL=1.0,  # Seconds between change_events polls (one poller per process)
+        CHANGE_FEED_QUEUE_SIZE=1000,  # Events buffered per SSE client before it is told to refetch
+        CHANGE_FEED_REPLAY_LIMIT=1000,  # Missed events replayed on reconnect before sending a reset
+        CHANGE_FEED_KEEPALIVE=15,  # Seconds between keepalive comments on an idle stream
+        CHANGE_FEED_RETENTION=86400,  # Seconds change_events rows are kept for resuming clients
+
+        # Reports
+        REPORT_PDF_RENDERER='auto',  # wkhtmltopdf, weasyprint or builtin; auto takes the first one installed
+        WKHTMLTOPDF_PATH=None,  # Found on PATH or in the usual install locations when not set
+        REPORT_WORKERS=2,  # PDFs rendered in parallel
+        REPORT_QUEUE_LIMIT=20,  # Queued + running jobs before new submissions get 503
+        REPORT_JOB_RETENTION=3600,  # Seconds a finished job stays pollable
+        REPORT_JOB_TIMEOUT=900,  # Seconds a job may stay queued or running before it is reported as failed
+        REPORT_CACHE_DIR='report_cache',
+        REPORT_EXPORT_BATCH_SIZE=5000,  # Rows per fetch when exporting csv/ndjson/xlsx/parquet
+        SEARCH_DEFAULT_LIMIT=10,  # Hits per page for /assets/search?q=
+        SEARCH_MAX_LIMIT=50,
+        SEARCH_REPLAY_LIMIT=5000,  # Change events a search index catches up on before it rebuilds instead
     )
-    mysql.connection.commit()
-    update_cursor.close()
-
-    return jsonify({'message': 'Resource updated successfully'})
-
-
-@app.route('/api/resources/<int:resource_id>', methods=['DELETE'])
-def delete_resource(resource_id):
-    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
-    cursor.execute('SELECT * FROM resources WHERE id = %s', (resource_id,))
-    resource = cursor.fetchone()
-
-    if not resource:
-        return jsonify({'error': 'Resource not found'}), 404
-
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], resource['image_path'])
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-    delete_cursor = mysql.connection.cursor()
-    delete_cursor.execute('DELETE FROM resources WHERE id = %s', (resource_id,))
-    mysql.connection.commit()
-    delete_cursor.close()
-
-    return jsonify({'message': 'Resource deleted successfully'})
-
-
-# Asset Management Endpoints
-@app.route('/api/resources/<int:resource_id>/assets', methods=['GET'])
-def get_assets(resource_id):
-    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
-    cursor.execute('SELECT * FROM assets WHERE resource_id = %s', (resource_id,))
-    assets = cursor.fetchall()
-    cursor.close()
-    return jsonify(assets)
-
-
-@app.route('/api/assets/<int:asset_id>', methods=['PUT'])
-def update_asset(asset_id):
-    data = request.get_json()
-    name = data.get('name')
-    stock_count = data.get('stockCount')
-    deduction = data.get('deduction')
-    date = data.get('date')
-
-    if not all([name, stock_count, deduction, date]):
-        return jsonify({'error': 'Missing required fields'}), 400
-
-    cursor = mysql.connection.cursor()
-    cursor.execute(
-        'UPDATE assets SET name = %s, stock_count = %s, deduction = %s, date = %s WHERE id = %s',
-        (name, stock_count, deduction, date, asset_id)
-    )
-    mysql.connection.commit()
-    cursor.close()
-    return jsonify({'message': 'Asset updated successfully'})
-
-
-@app.route('/api/resources/<int:resource_id>/assets', methods=['POST'])
-def add_asset(resource_id):
-    data = request.get_json()
-    name = data.get('name')
-    stock_count = data.get('stockCount')
-    deduction = data.get('deduction')
-    date = data.get('date')
-
-    if not all([name, stock_count, deduction, date]):
-        return jsonify({'error': 'Missing required fields'}), 400
-
-    cursor = mysql.connection.cursor()
-    cursor.execute(
-        'INSERT INTO assets (resource_id, name, stock_count, deduction, date) VALUES (%s, %s, %s, %s, %s)',
-        (resource_id, name, stock_count, deduction, date)
-    )
-    mysql.connection.commit()
-    asset_id = cursor.lastrowid
-    cursor.close()
-    return jsonify(
-        {'id': asset_id, 'resource_id': resource_id, 'name': name, 'stockCount': stock_count, 'deduction': deduction,
-         'date': date}), 201
-
-
-@app.route('/api/assets/<int:asset_id>', methods=['DELETE'])
-def delete_asset(asset_id):
-    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
-    cursor.execute('SELECT * FROM assets WHERE id = %s', (asset_id,))
-    asset = cursor.fetchone()
-
-    if not asset:
-        return jsonify({'error': 'Asset not found'}), 404
-
-    insert_cursor = mysql.connection.cursor()
-    insert_cursor.execute(
-        'INSERT INTO deleted_assets (id, resource_id, name, stock_count, deduction, date) VALUES (%s, %s, %s, %s, %s, %s)',
-        (asset['id'], asset['resource_id'], asset['name'], asset['stock_count'], asset['deduction'], asset['date'])
-    )
-
-    delete_cursor = mysql.connection.cursor()
-    delete_cursor.execute('DELETE FROM assets WHERE id = %s', (asset_id,))
-    mysql.connection.commit()
-    insert_cursor.close()
-    delete_cursor.close()
-
-    return jsonify({'message': 'Asset moved to deleted_assets table'})
-
+    # Deployment overrides, e.g. HAMS_MYSQL_HOST=db HAMS_MYSQL_POOL_SIZE=10
+    app.config.from_prefixed_env('HAMS')
+    if test_config:
+        app.config.update(test_config)
+
+    if not app.config['SECRET_KEY']:
+        app.logger.warning('SECRET_KEY is not set; login tokens will not survive a restart')
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+
+    mysql.init_app(app)
+    # First, so its after_request hook runs last and the timings include compression
+    metrics.init_app(app)
+    auth.init_app(app)
+    cache.init_app(app)
+    http_cache.init_app(app)
+    change_feed.init_app(app)
+    search_index.init_app(app)
+
+    app.register_blueprint(resources.bp)
+    app.register_blueprint(dashboard.bp)
+    app.register_blueprint(reports.bp)
+    app.register_blueprint(metrics.bp)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(bench_cli)
+
+    @app.errorhandler(PoolTimeout)
+    def database_busy(e):
+        return jsonify({'error': 'Database is busy, please retry'}), 503, {'Retry-After': '1'}
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def upload_too_large(e):
+        return jsonify({'error': e.description}), 413
+
+    @app.route('/api/health/db', methods=['GET'])
+    def database_health():
+        try:
+            cursor = mysql.connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            healthy = True
+        except Exception as e:
+            app.logger.error(f"Database health check failed: {str(e)}")
+            healthy = False
+        body = {'healthy': healthy, 'pool': mysql.pool.stats()}
+        if mysql.replicas:
+            body['replicas'] = mysql.replicas.stats()
+        return jsonify(body), 200 if healthy else 503
+
+    @app.route('/api/health/cache', methods=['GET'])
+    def cache_health():
+        try:
+            return jsonify(cache.get_cache().stats())
+        except Exception as e:
+            return jsonify({'error': str(e)}), 503
+
+    return app
+
+
+logging.basicConfig(level=logging.DEBUG)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,274 @@
+import datetime
+import gzip
+import json
+import os
+import time
+
+from MySQLdb.cursors import SSCursor
+
+from db import register_query
+import low_stock
+import stock_rollup
+import table_versions
+
+# Soft delete and restore of assets (one or many ids, one transaction), and the
+# archiver that moves old deleted_assets rows into the month-partitioned
+# deleted_assets_archive in small batches, so deleted_assets and its indexes stay
+# small. Archived months past the retention are exported to gzipped NDJSON files and
+# their partitions dropped, which frees the space without a row-by-row DELETE.
+
+ASSET_COLUMNS = 'id, resource_id, name, stock_count, deduction, date, reorder_threshold'
+
+LOCK_ASSETS_QUERY = f'SELECT {ASSET_COLUMNS} FROM assets WHERE id IN ({{ids}}) FOR UPDATE'
+register_query('archive.lock_assets', LOCK_ASSETS_QUERY.format(ids='%s, %s'), (1, 2))
+
+LOCK_DELETED_QUERY = f"""
+    SELECT {ASSET_COLUMNS}, EXISTS(SELECT 1 FROM resources r WHERE r.id = d.resource_id)
+    FROM deleted_assets d
+    WHERE id IN ({{ids}})
+    FOR UPDATE
+"""
+register_query('archive.lock_deleted', LOCK_DELETED_QUERY.format(ids='%s, %s'), (1, 2))
+
+LIVE_IDS_QUERY = 'SELECT id FROM assets WHERE id IN ({ids})'
+
+EXPIRED_QUERY = register_query('archive.expired', """
+    SELECT id FROM deleted_assets
+    WHERE deleted_at < %s
+    ORDER BY deleted_at, id
+    LIMIT %s
+    FOR UPDATE
+""", ('2024-01-01', 1000))
+
+ARCHIVE_PARTITIONS_QUERY = """
+    SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'deleted_assets_archive'
+    ORDER BY PARTITION_ORDINAL_POSITION
+"""
+
+ARCHIVE_EXPORT_COLUMNS = ('id', 'resource_id', 'name', 'stock_count', 'deduction', 'date', 'reorder_threshold',
+                          'deleted_at', 'archived_at')
+
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def parse_ids(data, max_ids):
+    ids = (data or {}).get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty array of asset ids')
+    if len(ids) > max_ids:
+        raise ValueError(f'At most {max_ids} assets can be changed at once')
+    if not all(isinstance(asset_id, int) and not isinstance(asset_id, bool) for asset_id in ids):
+        raise ValueError('ids must be integers')
+    # Keep the caller's order, once per id
+    return list(dict.fromkeys(ids))
+
+
+# Soft delete / restore
+def soft_delete(cursor, asset_ids, batch_size):
+    """Move assets into deleted_assets inside the caller's transaction.
+
+    Returns ({id: (resource_id, name)} deleted, table versions or None). Ids that do
+    not exist are left out.
+    """
+    deleted = {}
+    rollup = {}
+    for chunk in _chunks(list(asset_ids), batch_size):
+        cursor.execute(LOCK_ASSETS_QUERY.format(ids=_in_clause(chunk)), chunk)
+        rows = cursor.fetchall()
+        if not rows:
+            continue
+        ids = [row[0] for row in rows]
+        for asset_id, resource_id, name, stock_count, deduction, date, _ in rows:
+            stock_rollup.add_delta(rollup, date, stock_count, deduction, -1)
+            deleted[asset_id] = (resource_id, name)
+        cursor.executemany(f"""
+            INSERT INTO deleted_assets ({ASSET_COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                resource_id = VALUES(resource_id), name = VALUES(name), stock_count = VALUES(stock_count),
+                deduction = VALUES(deduction), date = VALUES(date),
+                reorder_threshold = VALUES(reorder_threshold), deleted_at = CURRENT_TIMESTAMP
+        """, list(rows))
+        cursor.execute(f'DELETE FROM assets WHERE id IN ({_in_clause(ids)})', ids)
+        low_stock.refresh_assets(cursor, ids)
+
+    versions = None
+    if deleted:
+        stock_rollup.apply_deltas(cursor, rollup)
+        versions = table_versions.bump(cursor, 'assets', 'deleted_assets')
+    return deleted, versions
+
+
+def restore(cursor, asset_ids, batch_size):
+    """Move assets from deleted_assets back into assets, keeping their ids.
+
+    Returns ({id: (resource_id, name)} restored, {id: reason} skipped, table versions
+    or None). Assets whose resource has been deleted, or whose id is in use again,
+    stay deleted.
+    """
+    restored = {}
+    skipped = {}
+    rollup = {}
+    for chunk in _chunks(list(asset_ids), batch_size):
+        cursor.execute(LOCK_DELETED_QUERY.format(ids=_in_clause(chunk)), chunk)
+        rows = {row[0]: row for row in cursor.fetchall()}
+        cursor.execute(LIVE_IDS_QUERY.format(ids=_in_clause(chunk)), chunk)
+        live = {row[0] for row in cursor.fetchall()}
+
+        values = []
+        for asset_id in chunk:
+            row = rows.get(asset_id)
+            if row is None:
+                skipped[asset_id] = 'not_found'
+            elif asset_id in live:
+                skipped[asset_id] = 'conflict'
+            elif not row[7]:
+                skipped[asset_id] = 'resource_not_found'
+            else:
+                _, resource_id, name, stock_count, deduction, date, _, _ = row
+                stock_rollup.add_delta(rollup, date, stock_count, deduction, 1)
+                restored[asset_id] = (resource_id, name)
+                values.append(row[:7])
+        if not values:
+            continue
+
+        ids = [row[0] for row in values]
+        cursor.executemany(f'INSERT INTO assets ({ASSET_COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s)', values)
+        cursor.execute(f'DELETE FROM deleted_assets WHERE id IN ({_in_clause(ids)})', ids)
+        low_stock.refresh_assets(cursor, ids)
+
+    versions = None
+    if restored:
+        stock_rollup.apply_deltas(cursor, rollup)
+        versions = table_versions.bump(cursor, 'assets', 'deleted_assets')
+    return restored, skipped, versions
+
+
+# Archiving
+FIRST_MONTH = datetime.date(2000, 1, 1)
+
+
+def _month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def _next_month(day):
+    return datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f'p{month:%Y%m}'
+
+
+def ensure_partitions(cursor, until):
+    """Split p_future so every month up to `until` has its own partition.
+
+    DDL commits implicitly, so call this outside a write transaction. p_future is
+    empty whenever the archiver has run before, which makes the split cheap.
+    """
+    cursor.execute(ARCHIVE_PARTITIONS_QUERY)
+    names = [row[0] for row in cursor.fetchall()]
+    months = sorted(name for name in names if name[1:].isdigit())
+    if months:
+        month = _next_month(datetime.datetime.strptime(months[-1][1:], '%Y%m').date())
+    else:
+        cursor.execute('SELECT MIN(deleted_at) FROM deleted_assets')
+        oldest = cursor.fetchone()[0]
+        # Anything older lands in p_old
+        month = max(_month_start(oldest.date() if oldest else until), FIRST_MONTH)
+
+    added = []
+    while month <= _month_start(until):
+        added.append(f"PARTITION {_partition_name(month)} VALUES LESS THAN (TO_DAYS('{_next_month(month)}'))")
+        month = _next_month(month)
+    if added:
+        cursor.execute(f"""
+            ALTER TABLE deleted_assets_archive REORGANIZE PARTITION p_future INTO (
+                {', '.join(added)},
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+        """)
+    return len(added)
+
+
+def archive(connection, cutoff, batch_size, max_batches=None, pause=0):
+    """Move deleted_assets rows deleted before `cutoff` into the archive.
+
+    Each batch is its own short transaction, so the locks on deleted_assets are held
+    for one batch only and live deletes/restores are never blocked for long. Returns
+    the number of rows moved.
+    """
+    cursor = connection.cursor()
+    ensure_partitions(cursor, cutoff.date() if isinstance(cutoff, datetime.datetime) else cutoff)
+
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        cursor.execute(EXPIRED_QUERY, (cutoff, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            connection.rollback()
+            break
+        cursor.execute(f"""
+            INSERT INTO deleted_assets_archive ({ASSET_COLUMNS}, deleted_at)
+            SELECT {ASSET_COLUMNS}, deleted_at FROM deleted_assets WHERE id IN ({_in_clause(ids)})
+        """, ids)
+        cursor.execute(f'DELETE FROM deleted_assets WHERE id IN ({_in_clause(ids)})', ids)
+        table_versions.bump(cursor, 'deleted_assets')
+        connection.commit()
+
+        moved += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    cursor.close()
+    return moved
+
+
+def purge(connection, before, export_dir):
+    """Export and drop archive partitions that end on or before `before`.
+
+    Each month is written to export_dir/deleted_assets-YYYY-MM.ndjson.gz (p_old to
+    deleted_assets-old.ndjson.gz) before its partition is dropped. Returns the files.
+    """
+    cursor = connection.cursor()
+    cursor.execute(ARCHIVE_PARTITIONS_QUERY)
+    partitions = cursor.fetchall()
+    cursor.execute('SELECT TO_DAYS(%s)', (before,))
+    limit = cursor.fetchone()[0]
+
+    os.makedirs(export_dir, exist_ok=True)
+    files = []
+    for name, description in partitions:
+        if name == 'p_future' or int(description) > limit:
+            continue
+        label = 'old' if name == 'p_old' else f'{name[1:5]}-{name[5:]}'
+        path = os.path.join(export_dir, f'deleted_assets-{label}.ndjson.gz')
+        export_partition(connection, name, path)
+        cursor.execute(f'ALTER TABLE deleted_assets_archive DROP PARTITION {name}')
+        files.append(path)
+    cursor.close()
+    return files
+
+
+def export_partition(connection, partition, path):
+    # Streams the partition; written under a temporary name so a half-written file is
+    # never mistaken for a finished export
+    cursor = connection.cursor(SSCursor)
+    cursor.execute(f"SELECT {', '.join(ARCHIVE_EXPORT_COLUMNS)} FROM deleted_assets_archive "
+                   f'PARTITION ({partition}) ORDER BY id')
+    partial = path + '.partial'
+    with gzip.open(partial, 'wt', encoding='utf-8') as f:
+        for row in cursor:
+            f.write(json.dumps(dict(zip(ARCHIVE_EXPORT_COLUMNS, row)), default=str) + '\n')
+    cursor.close()
+    os.replace(partial, path)
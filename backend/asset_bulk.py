@@ -0,0 +1,180 @@
+import csv
+from datetime import datetime
+
+from db import register_query
+import low_stock
+import stock_rollup
+import table_versions
+
+# Bulk asset import/update. Rows are validated one by one, buffered into batches
+# and written with one multi-row statement per batch; the caller commits once at
+# the end, so a whole stock-take lands in a single transaction.
+
+LOCK_ASSETS_QUERY = """
+    SELECT id, resource_id, stock_count, deduction, date FROM assets
+    WHERE id IN ({ids})
+    FOR UPDATE
+"""
+register_query('assets.bulk_lock', LOCK_ASSETS_QUERY.format(ids='%s, %s'), (1, 2))
+
+RESOURCE_IDS_QUERY = 'SELECT id FROM resources WHERE id IN ({ids})'
+register_query('assets.bulk_resources', RESOURCE_IDS_QUERY.format(ids='%s, %s'), (1, 2))
+
+# CSV headers may use the column names instead of the JSON keys
+FIELD_ALIASES = {'resource_id': 'resourceId', 'stock_count': 'stockCount'}
+
+
+def csv_rows(stream):
+    lines = (line.decode('utf-8-sig') for line in stream)
+    return csv.DictReader(lines)
+
+
+def _int(row, field, errors):
+    try:
+        return int(row.get(field))
+    except (TypeError, ValueError):
+        errors.append(f'{field} must be an integer')
+
+
+def validate_row(raw, for_update):
+    if not isinstance(raw, dict):
+        return None, ['row must be an object']
+
+    row = {FIELD_ALIASES.get(key.strip(), key.strip()): value for key, value in raw.items() if key}
+    errors = []
+    asset = {}
+    if for_update:
+        asset['id'] = _int(row, 'id', errors)
+    else:
+        asset['resource_id'] = _int(row, 'resourceId', errors)
+
+    name = row.get('name')
+    asset['name'] = name.strip() if isinstance(name, str) else ''
+    if not asset['name']:
+        errors.append('name is required')
+
+    asset['stock_count'] = _int(row, 'stockCount', errors)
+    asset['deduction'] = _int(row, 'deduction', errors)
+
+    try:
+        asset['date'] = datetime.strptime(str(row.get('date')).strip(), '%Y-%m-%d').date()
+    except ValueError:
+        errors.append('date must be in YYYY-MM-DD format')
+
+    return asset, errors
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+class BulkAssetWriter:
+    def __init__(self, cursor, for_update, batch_size):
+        self.cursor = cursor
+        self.for_update = for_update
+        self.batch_size = batch_size
+        self.pending = []
+        self.results = []
+        self.rollup = {}
+        self.known_resources = set()
+        self.inserted_resources = set()
+        self.written = 0
+        self.assets = {}  # asset id -> (resource id, name) of every row written
+        self.id_step = None
+
+    def add(self, row_number, raw):
+        asset, errors = validate_row(raw, self.for_update)
+        if errors:
+            self.results.append({'row': row_number, 'status': 'error', 'errors': errors})
+            return
+        self.pending.append((row_number, asset))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        batch, self.pending = self.pending, []
+        if batch:
+            if self.for_update:
+                self._update(batch)
+            else:
+                self._insert(batch)
+
+    def finish(self):
+        self.flush()
+        stock_rollup.apply_deltas(self.cursor, self.rollup)
+        low_stock.refresh_resources(self.cursor, self.inserted_resources)
+        if self.written:
+            table_versions.bump(self.cursor, 'assets')
+        self.results.sort(key=lambda result: result['row'])
+        return self.results
+
+    def _in_clause(self, values):
+        return ', '.join(['%s'] * len(values))
+
+    def _insert(self, batch):
+        unknown = list({asset['resource_id'] for _, asset in batch} - self.known_resources)
+        if unknown:
+            self.cursor.execute(RESOURCE_IDS_QUERY.format(ids=self._in_clause(unknown)), unknown)
+            self.known_resources.update(row[0] for row in self.cursor.fetchall())
+
+        values = []
+        for row_number, asset in batch:
+            if asset['resource_id'] not in self.known_resources:
+                self.results.append({'row': row_number, 'status': 'error', 'errors': ['resource not found']})
+                continue
+            values.append((asset['resource_id'], asset['name'], asset['stock_count'], asset['deduction'],
+                           asset['date']))
+            stock_rollup.add_delta(self.rollup, asset['date'], asset['stock_count'], asset['deduction'], 1)
+            self.inserted_resources.add(asset['resource_id'])
+            self.results.append({'row': row_number, 'status': 'created'})
+
+        if values:
+            # One statement per batch (executemany may split it): InnoDB gives the rows of
+            # a multi-row INSERT consecutive ids, the first of which is lastrowid
+            self.cursor.execute(
+                'INSERT INTO assets (resource_id, name, stock_count, deduction, date) VALUES '
+                + ', '.join(['(%s, %s, %s, %s, %s)'] * len(values)),
+                [value for row in values for value in row]
+            )
+            first_id = self.cursor.lastrowid
+            if self.id_step is None:
+                self.cursor.execute('SELECT @@auto_increment_increment')
+                self.id_step = self.cursor.fetchone()[0]
+            for offset, (resource_id, name, _, _, _) in enumerate(values):
+                self.assets[first_id + offset * self.id_step] = (resource_id, name)
+            self.written += len(values)
+
+    def _update(self, batch):
+        ids = list({asset['id'] for _, asset in batch})
+        self.cursor.execute(LOCK_ASSETS_QUERY.format(ids=self._in_clause(ids)), ids)
+        current = {row[0]: row for row in self.cursor.fetchall()}
+
+        # Later rows for the same id see the earlier row's values, as sequential updates would
+        values = {}
+        for row_number, asset in batch:
+            old = current.get(asset['id'])
+            if old is None:
+                self.results.append({'row': row_number, 'status': 'not_found'})
+                continue
+            _, resource_id, old_stock, old_deduction, old_date = old
+            stock_rollup.add_delta(self.rollup, _day(old_date), old_stock, old_deduction, -1)
+            stock_rollup.add_delta(self.rollup, asset['date'], asset['stock_count'], asset['deduction'], 1)
+            current[asset['id']] = (asset['id'], resource_id, asset['stock_count'], asset['deduction'], asset['date'])
+            values[asset['id']] = (asset['id'], resource_id, asset['name'], asset['stock_count'],
+                                   asset['deduction'], asset['date'])
+            self.assets[asset['id']] = (resource_id, asset['name'])
+            self.results.append({'row': row_number, 'status': 'updated'})
+
+        if values:
+            # Every id was just locked above, so this only ever takes the UPDATE branch
+            self.cursor.executemany("""
+                INSERT INTO assets (id, resource_id, name, stock_count, deduction, date)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    name = VALUES(name),
+                    stock_count = VALUES(stock_count),
+                    deduction = VALUES(deduction),
+                    date = VALUES(date)
+            """, list(values.values()))
+            low_stock.refresh_assets(self.cursor, values.keys())
+            self.written += len(values)
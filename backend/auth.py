@@ -0,0 +1,167 @@
+import functools
+import secrets
+import threading
+import time
+from concurrent.futures import TimeoutError
+
+import bcrypt
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+import cooperative
+from db import mysql, register_query
+
+# Logins get a signed token naming a row in user_sessions. Verifying a token is an
+# HMAC check plus a lookup in a small in-process cache of session states, so bcrypt
+# only ever runs at login/signup.
+SESSION_QUERY = register_query('auth.session', """
+    SELECT user_id FROM user_sessions
+    WHERE id = %s AND revoked_at IS NULL AND expires_at > UTC_TIMESTAMP()
+""", ('0' * 32,))
+
+
+class AuthBusy(Exception):
+    pass
+
+
+# Password hashing runs on a small bounded pool so a burst of logins cannot take
+# every core; requests beyond BCRYPT_QUEUE_LIMIT are turned away with 503.
+class BcryptPool:
+    def __init__(self, workers, queue_limit, timeout):
+        self.executor = cooperative.cpu_executor(workers, 'bcrypt')
+        self.slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.timeout = timeout
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise AuthBusy('Too many concurrent logins, please retry')
+        future = self.executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise AuthBusy('Login is taking too long, please retry')
+
+
+def init_app(app):
+    app.config.setdefault('BCRYPT_ROUNDS', 12)
+    app.config.setdefault('BCRYPT_WORKERS', 2)
+    app.config.setdefault('BCRYPT_QUEUE_LIMIT', 32)
+    app.config.setdefault('BCRYPT_TIMEOUT', 10)
+    app.config.setdefault('SESSION_TTL', 12 * 3600)
+    app.config.setdefault('SESSION_CACHE_TTL', 60)
+    app.config.setdefault('SESSION_CACHE_SIZE', 10000)
+    app.config.setdefault('AUTH_REQUIRED', False)
+
+    app.extensions['bcrypt_pool'] = BcryptPool(app.config['BCRYPT_WORKERS'],
+                                               app.config['BCRYPT_QUEUE_LIMIT'],
+                                               app.config['BCRYPT_TIMEOUT'])
+    app.extensions['session_cache'] = {}
+    app.extensions['session_cache_lock'] = threading.Lock()
+
+    @app.errorhandler(AuthBusy)
+    def auth_busy(e):
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '1'}
+
+
+# Passwords
+def _as_bytes(value):
+    return value if isinstance(value, bytes) else value.encode('utf-8')
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+
+def hash_password(password):
+    pool = current_app.extensions['bcrypt_pool']
+    return pool.run(_hash, _as_bytes(password), current_app.config['BCRYPT_ROUNDS'])
+
+
+def check_password(password, stored_hash):
+    pool = current_app.extensions['bcrypt_pool']
+    return pool.run(bcrypt.checkpw, _as_bytes(password), _as_bytes(stored_hash))
+
+
+def needs_rehash(stored_hash):
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(_as_bytes(stored_hash).split(b'$')[2]) != current_app.config['BCRYPT_ROUNDS']
+    except (IndexError, ValueError):
+        return True
+
+
+# Sessions
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='hams-session')
+
+
+def create_session(cursor, user_id):
+    session_id = secrets.token_hex(16)
+    ttl = current_app.config['SESSION_TTL']
+    cursor.execute("""
+        INSERT INTO user_sessions (id, user_id, created_at, expires_at)
+        VALUES (%s, %s, UTC_TIMESTAMP(), UTC_TIMESTAMP() + INTERVAL %s SECOND)
+    """, (session_id, user_id, ttl))
+    _remember(session_id, user_id)
+    return _serializer().dumps({'uid': user_id, 'sid': session_id}), ttl
+
+
+def revoke_session(cursor, session_id):
+    cursor.execute('UPDATE user_sessions SET revoked_at = UTC_TIMESTAMP() WHERE id = %s', (session_id,))
+    _remember(session_id, None)
+
+
+def _remember(session_id, user_id):
+    cache = current_app.extensions['session_cache']
+    with current_app.extensions['session_cache_lock']:
+        if len(cache) >= current_app.config['SESSION_CACHE_SIZE']:
+            # Drop the oldest half; entries are re-read from MySQL on demand
+            for key in list(cache)[:len(cache) // 2]:
+                del cache[key]
+        cache[session_id] = (user_id, time.monotonic())
+
+
+def _session_user(session_id):
+    cache = current_app.extensions['session_cache']
+    with current_app.extensions['session_cache_lock']:
+        entry = cache.get(session_id)
+    if entry and time.monotonic() - entry[1] < current_app.config['SESSION_CACHE_TTL']:
+        return entry[0]
+
+    cursor = mysql.connection.cursor()
+    cursor.execute(SESSION_QUERY, (session_id,))
+    row = cursor.fetchone()
+    cursor.close()
+
+    user_id = row[0] if row else None
+    _remember(session_id, user_id)
+    return user_id
+
+
+def verify_token(token):
+    try:
+        payload = _serializer().loads(token, max_age=current_app.config['SESSION_TTL'])
+    except BadSignature:
+        return None
+    if _session_user(payload['sid']) != payload['uid']:
+        return None
+    return payload
+
+
+def login_required(view):
+    # Sets g.user_id / g.session_id from an "Authorization: Bearer <token>" header.
+    # A missing token is only rejected when AUTH_REQUIRED is enabled.
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        g.user_id = g.session_id = None
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            payload = verify_token(header[7:].strip())
+            if payload is None:
+                return jsonify({'status': 'error', 'message': 'Invalid or expired session'}), 401
+            g.user_id, g.session_id = payload['uid'], payload['sid']
+        elif current_app.config['AUTH_REQUIRED']:
+            return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+        return view(*args, **kwargs)
+    return wrapped
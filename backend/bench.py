@@ -0,0 +1,762 @@
+import base64
+import collections
+import datetime
+import http.client
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.parse
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from db import mysql
+import auth
+import change_feed
+import low_stock
+import stock_rollup
+import table_versions
+
+# Load testing against a synthetic hospital dataset.
+#
+#   flask --app app bench seed --resources 100 --assets 1000000
+#   flask --app app bench run --concurrency 16 --requests 500
+#   flask --app app bench compare bench-results/old.json bench-results/new.json
+#
+# `run` drives every route of the app, in process through the test client or against
+# a server started separately (--url, with --pid for its memory). Both commands refuse
+# to touch a database that is not on this machine: seeding truncates tables and the
+# write scenarios create, update and delete rows.
+
+bench_cli = AppGroup('bench', help='Seed a synthetic dataset and benchmark every endpoint.')
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+BENCH_PASSWORD = 'bench-password'
+BENCH_EMAIL = 'bench{}@example.org'
+
+SECTIONS = ['ICU', 'Emergency', 'Surgery', 'Pediatrics', 'Radiology', 'Pharmacy', 'Maternity', 'Oncology',
+            'Cardiology', 'Outpatient']
+RESOURCE_NAMES = ['Gloves', 'Syringes', 'Masks', 'Gauze', 'Bandages', 'Catheters', 'IV Sets', 'Sutures',
+                  'Gowns', 'Thermometers', 'Oxygen Masks', 'Scalpels', 'Swabs', 'Cannulas', 'Splints']
+ASSET_ADJECTIVES = ['Sterile', 'Disposable', 'Latex', 'Nitrile', 'Surgical', 'Pediatric', 'Adult', 'Reusable',
+                    'Antibacterial', 'Compression', 'Elastic', 'Absorbent']
+ASSET_SIZES = ['Small', 'Medium', 'Large', 'XL', '5ml', '10ml', '20G', '22G', '3-0', '4-0']
+
+# 1x1 PNG used for the upload scenarios
+PIXEL_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+def require_local_database():
+    host = current_app.config['MYSQL_HOST']
+    if host not in LOCAL_HOSTS and not current_app.config.get('MYSQL_UNIX_SOCKET'):
+        raise click.ClickException(f'Refusing to benchmark against MYSQL_HOST={host!r}; '
+                                   f'use a local database ({", ".join(sorted(LOCAL_HOSTS))})')
+
+
+def require_local_url(url):
+    host = urllib.parse.urlsplit(url).hostname
+    if host not in LOCAL_HOSTS:
+        raise click.ClickException(f'Refusing to benchmark {url}; the server must run on this machine')
+
+
+# Dataset
+def asset_name(rng):
+    return f'{rng.choice(ASSET_ADJECTIVES)} {rng.choice(RESOURCE_NAMES)} {rng.choice(ASSET_SIZES)}'
+
+
+def asset_row(rng, resource_id, today):
+    # Roughly one asset in ten is below the default reorder threshold
+    stock_count = rng.randint(1, 9) if rng.random() < 0.1 else rng.randint(10, 500)
+    return (resource_id, asset_name(rng), stock_count, rng.randint(1, 50),
+            today - datetime.timedelta(days=rng.randint(0, 730)))
+
+
+def insert_batches(cursor, sql, rows, total, batch_size, label):
+    inserted = 0
+    while inserted < total:
+        batch = [next(rows) for _ in range(min(batch_size, total - inserted))]
+        cursor.executemany(sql, batch)
+        mysql.connection.commit()
+        inserted += len(batch)
+        if inserted % (batch_size * 20) == 0 or inserted == total:
+            click.echo(f'  {label}: {inserted}/{total}')
+
+
+@bench_cli.command('seed')
+@click.option('--resources', default=100, show_default=True, help='Resources to create.')
+@click.option('--assets', default=100000, show_default=True, help='Assets to create (e.g. 1000000).')
+@click.option('--deleted', default=1000, show_default=True, help='Rows to create in deleted_assets.')
+@click.option('--users', default=50, show_default=True, help='Users to create (bench1@example.org, ...).')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per INSERT.')
+@click.option('--seed', 'random_seed', default=1, show_default=True, help='Random seed, for repeatable datasets.')
+@click.option('--reset/--append', default=True, show_default=True, help='Empty the tables first.')
+def seed(resources, assets, deleted, users, batch_size, random_seed, reset):
+    """Fill the local database with a synthetic hospital inventory."""
+    require_local_database()
+    rng = random.Random(random_seed)
+    today = datetime.date.today()
+    cursor = mysql.connection.cursor()
+
+    if reset:
+        click.echo('Emptying tables')
+        # TRUNCATE bypasses the ledger triggers, so the ledger is emptied with the assets
+        # change_events is kept so running servers see the event below and reload
+        for table in ('assets', 'deleted_assets', 'resources', 'user_sessions', 'userss', 'asset_daily_stock',
+                      'low_stock_assets', 'stock_movements', 'stock_snapshots', 'stock_snapshot_rows',
+                      'deleted_assets_archive'):
+            cursor.execute(f'TRUNCATE TABLE {table}')
+
+    click.echo(f'Creating {resources} resources')
+    cursor.executemany('INSERT INTO resources (name, section, image_path) VALUES (%s, %s, NULL)', [
+        (RESOURCE_NAMES[i % len(RESOURCE_NAMES)] + (f' {i // len(RESOURCE_NAMES) + 1}' if i >= len(RESOURCE_NAMES) else ''),
+         SECTIONS[i % len(SECTIONS)])
+        for i in range(resources)
+    ])
+    mysql.connection.commit()
+    cursor.execute('SELECT id FROM resources')
+    resource_ids = [row[0] for row in cursor.fetchall()]
+    if not resource_ids:
+        raise click.ClickException('No resources to attach assets to')
+
+    click.echo(f'Creating {assets} assets')
+    insert_batches(
+        cursor,
+        'INSERT INTO assets (resource_id, name, stock_count, deduction, date) VALUES (%s, %s, %s, %s, %s)',
+        (asset_row(rng, rng.choice(resource_ids), today) for _ in itertools.count()),
+        assets, batch_size, 'assets'
+    )
+
+    # deleted_assets keeps the ids of removed assets, so start above the live ones
+    click.echo(f'Creating {deleted} deleted assets')
+    cursor.execute('SELECT GREATEST(COALESCE((SELECT MAX(id) FROM assets), 0), '
+                   'COALESCE((SELECT MAX(id) FROM deleted_assets), 0))')
+    next_id = itertools.count(cursor.fetchone()[0] + 1)
+    insert_batches(
+        cursor,
+        'INSERT INTO deleted_assets (id, resource_id, name, stock_count, deduction, date) '
+        'VALUES (%s, %s, %s, %s, %s, %s)',
+        ((next(next_id),) + asset_row(rng, rng.choice(resource_ids), today) for _ in itertools.count()),
+        deleted, batch_size, 'deleted assets'
+    )
+
+    # One hash for everyone: hashing at BCRYPT_ROUNDS per user would dominate the seed
+    click.echo(f'Creating {users} users (password: {BENCH_PASSWORD})')
+    password = auth.hash_password(BENCH_PASSWORD)
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM userss')
+    first = cursor.fetchone()[0] + 1
+    cursor.executemany("""
+        INSERT INTO userss
+        (first_name, last_name, date_of_birth, email, position, id_number, phone_number, password)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [('Bench', f'User {n}', '1990-01-01', BENCH_EMAIL.format(n), rng.choice(['Nurse', 'Doctor', 'Pharmacist']),
+           f'BENCH{n:06d}', f'555{n:07d}', password) for n in range(first, first + users)])
+
+    click.echo('Rebuilding the stock rollup and low-stock list')
+    stock_rollup.backfill(cursor)
+    low_stock.backfill(cursor)
+    table_versions.bump(cursor, 'assets', 'resources')
+    # No ids: search indexes rebuild and dashboards refetch
+    change_feed.publish(cursor, 'assets.bulk', {'written': assets, 'updated': False})
+    mysql.connection.commit()
+    cursor.close()
+    click.echo('Done')
+
+
+# Clients
+def encode_form(form, files):
+    if not files:
+        return urllib.parse.urlencode(form).encode('utf-8'), 'application/x-www-form-urlencoded'
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                     .encode('utf-8'))
+    for name, (content, filename) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class AppClient:
+    # Requests go through the WSGI stack in this process; no network in the numbers
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, json=None, form=None, files=None, headers=None, stream=False):
+        data = dict(form or {})
+        for name, (content, filename) in (files or {}).items():
+            data[name] = (io.BytesIO(content), filename)
+        response = self.client.open(path, method=method, json=json, data=data or None, headers=headers,
+                                    buffered=not stream)
+        if stream:
+            # Time to the response headers; closing ends the stream
+            response.close()
+            return response.status_code, b''
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    # One keep-alive connection per worker thread
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.connection = None
+
+    def request(self, method, path, json=None, form=None, files=None, headers=None, stream=False):
+        headers = dict(headers or {})
+        body = None
+        if json is not None:
+            body = _json_bytes(json)
+            headers['Content-Type'] = 'application/json'
+        elif form or files:
+            body, headers['Content-Type'] = encode_form(form or {}, files or {})
+
+        for attempt in range(2):
+            connection = self.connection or http.client.HTTPConnection(self.host, self.port, timeout=120)
+            self.connection = None
+            try:
+                connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = connection.getresponse()
+                break
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # A kept-alive connection the server already closed; retry once on a new one
+                if attempt:
+                    raise
+        if stream:
+            connection.close()
+            return response.status, b''
+        data = response.read()
+        self.connection = connection
+        return response.status, data
+
+
+def _json_bytes(data):
+    return json.dumps(data).encode('utf-8')
+
+
+# Memory
+def rss_bytes(pid):
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+class RssSampler:
+    # Peak resident memory of the serving process(es) while a scenario runs
+    def __init__(self, pids, interval=0.05):
+        self.pids = pids
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='bench-rss', daemon=True)
+
+    def _sample(self):
+        values = [rss_bytes(pid) for pid in self.pids]
+        if values and None not in values:
+            self.peak = max(self.peak or 0, sum(values))
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self._sample()
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self._sample()
+
+
+# Scenarios
+class Scenario:
+    """One endpoint under load.
+
+    `make(client)` returns the request to time (method, path, json, ...). Any setup it
+    needs, such as creating the row a DELETE removes, happens there and is not timed.
+    """
+
+    def __init__(self, name, rule, make, ok=(200,), stream=False):
+        self.name = name
+        self.rule = rule
+        self.make = make
+        self.ok = set(ok)
+        self.stream = stream
+
+
+class Fixture:
+    # Ids and names sampled from the seeded data, plus things created through the API
+    def __init__(self, cursor, rng):
+        self.rng = rng
+        self.counter = itertools.count()
+        self.run_id = uuid.uuid4().hex[:8]
+
+        cursor.execute('SELECT id, name, section FROM resources ORDER BY id LIMIT 1000')
+        self.resources = list(cursor.fetchall())
+        cursor.execute('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM assets')
+        low, high = cursor.fetchone()
+        cursor.execute("""
+            SELECT id, resource_id, name, stock_count, deduction, DATE_FORMAT(date, '%%Y-%%m-%%d') FROM assets
+            WHERE id >= %s AND stock_count > 0 AND deduction > 0
+            ORDER BY id LIMIT 1000
+        """, (rng.randint(low, max(low, high - 1000)),))
+        self.assets = list(cursor.fetchall())
+        # The report scenarios cover the last year; only resources with assets in it return rows
+        today = datetime.date.today()
+        cursor.execute("""
+            SELECT id, name, section FROM resources r
+            WHERE EXISTS (SELECT 1 FROM assets a WHERE a.resource_id = r.id AND a.date BETWEEN %s AND %s)
+            ORDER BY id LIMIT 1000
+        """, (today - datetime.timedelta(days=365), today))
+        self.report_resources = list(cursor.fetchall())
+        cursor.execute('SELECT email FROM userss WHERE email LIKE %s ORDER BY id LIMIT 1', ('bench%@example.org',))
+        user = cursor.fetchone()
+        if not self.resources or not self.assets or not self.report_resources or not user:
+            raise click.ClickException('No benchmark data found; run `flask --app app bench seed` first')
+        self.email = user[0]
+        self.token = None
+        self.upload = None
+        self.job_spec = None
+        self.job_id = None
+        self.done_job_id = None
+
+    def resource(self):
+        return self.rng.choice(self.resources)
+
+    def report_resource(self):
+        return self.rng.choice(self.report_resources)
+
+    def asset(self):
+        return self.rng.choice(self.assets)
+
+    def unique(self, prefix):
+        return f'{prefix}-{self.run_id}-{next(self.counter)}'
+
+    def auth(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def setup(self, client):
+        status, body = client.request('POST', '/api/login', json={'username': self.email, 'password': BENCH_PASSWORD})
+        if status != 200:
+            raise click.ClickException(f'Login as {self.email} failed ({status}); was the dataset seeded?')
+        self.token = json.loads(body)['token']
+
+        status, body = self.create_resource(client)
+        if status == 201:
+            self.upload = json.loads(body)['image_path']
+
+        self.job_spec = {'kind': 'asset', 'assetName': self.asset()[2]}
+        status, body = client.request('POST', '/reports/jobs', json=self.job_spec)
+        if status in (200, 202):
+            self.job_id = json.loads(body)['jobId']
+            # Wait for the PDF so the download scenario has something to serve
+            job = self.wait_for_job(client, self.job_id)
+            if job['status'] == 'done':
+                self.done_job_id = self.job_id
+            else:
+                click.echo(f"  report job {job['status']} ({job.get('error')}); skipping its download", err=True)
+
+    def wait_for_job(self, client, job_id, timeout=60):
+        deadline = time.monotonic() + timeout
+        while True:
+            status, body = client.request('GET', f'/reports/jobs/{job_id}')
+            job = json.loads(body)
+            if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+                return job
+            time.sleep(0.5)
+
+    def finished_job(self, client):
+        # The PDF is swept once assets change, so earlier write scenarios may have
+        # removed it; resubmitting renders it again (or finds it still cached)
+        status, body = client.request('POST', '/reports/jobs', json=self.job_spec)
+        job = json.loads(body)
+        if status in (200, 202) and self.wait_for_job(client, job['jobId'])['status'] == 'done':
+            return job['jobId']
+        return self.done_job_id
+
+    def create_resource(self, client):
+        return client.request('POST', '/api/resources', headers=self.auth(),
+                              form={'name': self.unique('Bench Resource'), 'section': self.resource()[2]},
+                              files={'image': (PIXEL_PNG, 'bench.png')})
+
+    def create_asset(self, client):
+        status, body = client.request('POST', f'/api/resources/{self.resource()[0]}/assets', headers=self.auth(),
+                                      json=self.asset_body())
+        return json.loads(body)['id']
+
+    def asset_body(self, asset=None):
+        _, _, name, stock_count, deduction, date = asset or self.asset()
+        return {'name': name, 'stockCount': stock_count, 'deduction': deduction, 'date': date}
+
+
+def scenarios(fixture):
+    f = fixture
+    today = datetime.date.today()
+    year_ago = (today - datetime.timedelta(days=365)).isoformat()
+
+    def get(path, **extra):
+        return lambda client: dict(method='GET', path=path() if callable(path) else path, **extra)
+
+    def report_params(fmt):
+        resource = f.report_resource()
+        return f'reportType={urllib.parse.quote(resource[1])}&startDate={year_ago}&endDate={today}&format={fmt}'
+
+    def signup(client):
+        email = f.unique('signup') + '@example.org'
+        return dict(method='POST', path='/signup', json={
+            'firstName': 'Bench', 'lastName': 'Signup', 'dateOfBirth': '1990-01-01', 'email': email,
+            'position': 'Nurse', 'idNumber': email, 'phoneNumber': '5550000000', 'password': BENCH_PASSWORD,
+        })
+
+    def logout(client):
+        # A fresh session per request, so each logout revokes a live one
+        status, body = client.request('POST', '/api/login', json={'username': f.email, 'password': BENCH_PASSWORD})
+        token = json.loads(body)['token']
+        return dict(method='POST', path='/api/logout', headers={'Authorization': f'Bearer {token}'})
+
+    def update_resource(client):
+        resource = f.resource()
+        return dict(method='PUT', path=f'/api/resources/{resource[0]}', headers=f.auth(),
+                    form={'name': resource[1], 'section': resource[2]})
+
+    def delete_resource(client):
+        status, body = f.create_resource(client)
+        return dict(method='DELETE', path=f"/api/resources/{json.loads(body)['id']}", headers=f.auth())
+
+    def update_asset(client):
+        asset = f.asset()
+        return dict(method='PUT', path=f'/api/assets/{asset[0]}', headers=f.auth(), json=f.asset_body(asset))
+
+    def delete_asset(client):
+        return dict(method='DELETE', path=f'/api/assets/{f.create_asset(client)}', headers=f.auth())
+
+    def bulk(method):
+        def make(client):
+            if method == 'PUT':
+                rows = [dict(f.asset_body(asset), id=asset[0]) for asset in f.rng.sample(f.assets, 50)]
+            else:
+                rows = [dict(f.asset_body(), resourceId=f.resource()[0]) for _ in range(50)]
+            return dict(method=method, path='/api/assets/bulk', headers=f.auth(), json=rows)
+        return make
+
+    def bulk_delete(client):
+        ids = [f.create_asset(client) for _ in range(10)]
+        return dict(method='POST', path='/api/assets/bulk/delete', headers=f.auth(), json={'ids': ids})
+
+    def bulk_restore(client):
+        ids = [f.create_asset(client) for _ in range(10)]
+        client.request('POST', '/api/assets/bulk/delete', headers=f.auth(), json={'ids': ids})
+        return dict(method='POST', path='/api/assets/bulk/restore', headers=f.auth(), json={'ids': ids})
+
+    def asset_threshold(client):
+        asset = f.asset()
+        return dict(method='PUT', path=f'/api/assets/{asset[0]}/threshold', headers=f.auth(), json={'threshold': None})
+
+    def section_threshold(client):
+        return dict(method='PUT', path=f'/api/sections/{urllib.parse.quote(f.resource()[2])}/threshold',
+                    headers=f.auth(), json={'threshold': None})
+
+    items = [
+        Scenario('health.db', ('/api/health/db', 'GET'), get('/api/health/db')),
+        Scenario('health.cache', ('/api/health/cache', 'GET'), get('/api/health/cache')),
+        Scenario('metrics', ('/metrics', 'GET'), get('/metrics')),
+        Scenario('auth.signup', ('/signup', 'POST'), signup, ok=(201,)),
+        Scenario('auth.login', ('/api/login', 'POST'),
+                 lambda client: dict(method='POST', path='/api/login',
+                                     json={'username': f.email, 'password': BENCH_PASSWORD})),
+        Scenario('auth.logout', ('/api/logout', 'POST'), logout),
+        Scenario('auth.me', ('/api/me', 'GET'), lambda client: dict(method='GET', path='/api/me', headers=f.auth())),
+        Scenario('uploads.get', ('/uploads/<filename>', 'GET'), get(lambda: f'/uploads/{f.upload}')),
+        Scenario('resources.list', ('/api/resources', 'GET'), get('/api/resources')),
+        Scenario('resources.list_page', ('/api/resources', 'GET'), get('/api/resources?limit=20')),
+        Scenario('resources.list_with_assets', ('/api/resources', 'GET'),
+                 get('/api/resources?include=assets&limit=20')),
+        Scenario('resources.create', ('/api/resources', 'POST'), lambda client: dict(
+            method='POST', path='/api/resources', headers=f.auth(),
+            form={'name': f.unique('Bench Resource'), 'section': f.resource()[2]},
+            files={'image': (PIXEL_PNG, 'bench.png')}), ok=(201,)),
+        Scenario('resources.update', ('/api/resources/<int:resource_id>', 'PUT'), update_resource),
+        Scenario('resources.delete', ('/api/resources/<int:resource_id>', 'DELETE'), delete_resource),
+        Scenario('assets.list', ('/api/resources/<int:resource_id>/assets', 'GET'),
+                 get(lambda: f'/api/resources/{f.resource()[0]}/assets?limit=100')),
+        Scenario('assets.by_resource', ('/api/assets', 'GET'),
+                 get(lambda: '/api/assets?resourceIds=' + ','.join(str(f.resource()[0]) for _ in range(5)))),
+        Scenario('assets.by_section', ('/api/assets', 'GET'),
+                 get(lambda: '/api/assets?section=' + urllib.parse.quote(f.resource()[2]))),
+        Scenario('assets.create', ('/api/resources/<int:resource_id>/assets', 'POST'),
+                 lambda client: dict(method='POST', path=f'/api/resources/{f.resource()[0]}/assets',
+                                     headers=f.auth(), json=f.asset_body()), ok=(201,)),
+        Scenario('assets.history', ('/api/assets/<int:asset_id>/history', 'GET'),
+                 get(lambda: f'/api/assets/{f.asset()[0]}/history')),
+        Scenario('assets.update', ('/api/assets/<int:asset_id>', 'PUT'), update_asset),
+        Scenario('assets.delete', ('/api/assets/<int:asset_id>', 'DELETE'), delete_asset),
+        Scenario('assets.threshold', ('/api/assets/<int:asset_id>/threshold', 'PUT'), asset_threshold),
+        Scenario('assets.bulk_create', ('/api/assets/bulk', 'POST'), bulk('POST')),
+        Scenario('assets.bulk_update', ('/api/assets/bulk', 'PUT'), bulk('PUT')),
+        Scenario('assets.bulk_delete', ('/api/assets/bulk/delete', 'POST'), bulk_delete),
+        Scenario('assets.bulk_restore', ('/api/assets/bulk/restore', 'POST'), bulk_restore),
+        Scenario('sections.thresholds', ('/api/sections/thresholds', 'GET'), get('/api/sections/thresholds')),
+        Scenario('sections.threshold', ('/api/sections/<section>/threshold', 'PUT'), section_threshold),
+        Scenario('dashboard.total_assets', ('/api/total-assets', 'GET'), get('/api/total-assets')),
+        Scenario('dashboard.total_resources', ('/api/total-resources', 'GET'), get('/api/total-resources')),
+        Scenario('dashboard.timeline', ('/api/asset-timeline', 'GET'),
+                 get(f'/api/asset-timeline?from={year_ago}&to={today}&bucket=week')),
+        Scenario('dashboard.low_stock', ('/api/dashboard/low-stock', 'GET'), get('/api/dashboard/low-stock')),
+        Scenario('dashboard.recent_updates', ('/api/recent-updates', 'GET'), get('/api/recent-updates')),
+        Scenario('dashboard.forecast', ('/api/dashboard/forecast', 'GET'), get('/api/dashboard/forecast')),
+        Scenario('dashboard.summary', ('/api/dashboard/summary', 'GET'), get('/api/dashboard/summary')),
+        Scenario('dashboard.changes', ('/api/dashboard/changes', 'GET'), get('/api/dashboard/changes'), stream=True),
+        Scenario('reports.types', ('/reports/types', 'GET'), get('/reports/types')),
+        Scenario('reports.preview', ('/reports/preview', 'GET'), get(lambda: '/reports/preview?' + report_params('pdf'))),
+        Scenario('reports.preview_by_week', ('/reports/preview', 'GET'),
+                 get(lambda: '/reports/preview?groupBy=week&' + report_params('pdf'))),
+        Scenario('reports.preview_page', ('/reports/preview', 'GET'),
+                 get(lambda: '/reports/preview?limit=100&' + report_params('pdf'))),
+        Scenario('reports.download_csv', ('/reports/download', 'GET'),
+                 get(lambda: '/reports/download?' + report_params('csv'))),
+        Scenario('reports.stock_now', ('/reports/stock', 'GET'),
+                 get(lambda: '/reports/stock?reportType=' + urllib.parse.quote(f.resource()[1]))),
+        Scenario('reports.stock_at', ('/reports/stock', 'GET'),
+                 get(lambda: f'/reports/stock?at={year_ago}&reportType=' + urllib.parse.quote(f.resource()[1]))),
+        Scenario('reports.stock_movement', ('/reports/stock-movement', 'GET'),
+                 get(lambda: '/reports/stock-movement?' + report_params('pdf'))),
+        Scenario('reports.search_exact', ('/assets/search', 'GET'),
+                 get(lambda: '/assets/search?assetName=' + urllib.parse.quote(f.asset()[2]))),
+        Scenario('reports.search_fuzzy', ('/assets/search', 'GET'),
+                 get(lambda: '/assets/search?q=' + urllib.parse.quote(f.asset()[2].split()[0][:5]))),
+        Scenario('reports.asset_download_csv', ('/assets/download', 'GET'),
+                 get(lambda: f'/assets/download?format=csv&assetName={urllib.parse.quote(f.asset()[2])}')),
+        Scenario('reports.job_submit', ('/reports/jobs', 'POST'),
+                 lambda client: dict(method='POST', path='/reports/jobs',
+                                     json={'kind': 'asset', 'assetName': f.asset()[2]}), ok=(200, 202)),
+    ]
+    if f.job_id:
+        items.append(Scenario('reports.job_status', ('/reports/jobs/<job_id>', 'GET'),
+                              get(f'/reports/jobs/{f.job_id}')))
+    if f.done_job_id:
+        items.append(Scenario('reports.job_download', ('/reports/jobs/<job_id>/download', 'GET'),
+                              lambda client: dict(method='GET',
+                                                  path=f'/reports/jobs/{f.finished_job(client)}/download')))
+    if not f.upload:
+        items = [item for item in items if item.name != 'uploads.get']
+    return items
+
+
+def uncovered_routes(app, items):
+    covered = {item.rule for item in items}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if (rule.rule, method) not in covered:
+                missing.append(f'{method} {rule.rule}')
+    return sorted(missing)
+
+
+# Runner
+def percentile(values, p):
+    # Nearest-rank on sorted values
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def run_scenario(scenario, clients, requests, warmup, pids):
+    for _ in range(warmup):
+        spec = scenario.make(clients[0])
+        clients[0].request(stream=scenario.stream, **spec)
+    # In process, requests on this thread share the command's app context and its
+    # pooled connection; hand it back so the whole pool serves the workers
+    mysql.teardown(None)
+
+    remaining = itertools.count()
+    latencies = [[] for _ in clients]
+    busy = [0.0] * len(clients)
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    failures = []
+
+    def worker(index):
+        client = clients[index]
+        try:
+            while next(remaining) < requests:
+                spec = scenario.make(client)
+                started = time.perf_counter()
+                status, _ = client.request(stream=scenario.stream, **spec)
+                elapsed = time.perf_counter() - started
+                latencies[index].append(elapsed)
+                busy[index] += elapsed
+                with lock:
+                    statuses[status] += 1
+        except Exception as e:
+            failures.append(repr(e))
+
+    threads = [threading.Thread(target=worker, args=(index,), name=f'bench-{index}') for index in range(len(clients))]
+    with RssSampler(pids) as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    samples = sorted(itertools.chain.from_iterable(latencies))
+    count = len(samples)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'rule': ' '.join(reversed(scenario.rule)),
+        'requests': count,
+        'errors': sum(n for status, n in statuses.items() if status not in scenario.ok) + len(failures),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'failures': failures[:5],
+        'p50_ms': ms(percentile(samples, 50)),
+        'p95_ms': ms(percentile(samples, 95)),
+        'p99_ms': ms(percentile(samples, 99)),
+        'mean_ms': ms(sum(samples) / count if count else None),
+        'max_ms': ms(samples[-1] if samples else None),
+        # Time spent preparing requests (creating rows to delete etc.) is not counted
+        'throughput_rps': round(count / max(busy), 1) if count and max(busy) > 0 else None,
+        'peak_rss_mb': round(sampler.peak / 2 ** 20, 1) if sampler.peak else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_sizes(cursor):
+    sizes = {}
+    for table in ('resources', 'assets', 'deleted_assets', 'userss'):
+        cursor.execute(f'SELECT COUNT(*) FROM {table}')
+        sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+
+@bench_cli.command('run')
+@click.option('--concurrency', '-c', default=8, show_default=True, help='Concurrent clients.')
+@click.option('--requests', '-n', default=200, show_default=True, help='Timed requests per endpoint.')
+@click.option('--warmup', default=10, show_default=True, help='Untimed requests per endpoint first.')
+@click.option('--only', multiple=True, help='Run scenarios whose name contains this (repeatable).')
+@click.option('--url', help='Benchmark a running server (e.g. http://127.0.0.1:5000) instead of in process.')
+@click.option('--pid', 'pids', multiple=True, type=int, help='Server process(es) to measure RSS for with --url.')
+@click.option('--output', '-o', help='Results file [default: bench-results/<time>-<commit>.json].')
+@click.option('--seed', 'random_seed', default=1, show_default=True)
+def run(concurrency, requests, warmup, only, url, pids, output, random_seed):
+    """Load every endpoint and record latency percentiles, throughput and peak RSS."""
+    require_local_database()
+    if url:
+        require_local_url(url)
+        clients = [HTTPClient(url) for _ in range(concurrency)]
+    else:
+        app = current_app._get_current_object()
+        clients = [AppClient(app) for _ in range(concurrency)]
+        pids = (os.getpid(),)
+
+    cursor = mysql.connection.cursor()
+    fixture = Fixture(cursor, random.Random(random_seed))
+    sizes = dataset_sizes(cursor)
+    cursor.close()
+    mysql.connection.commit()
+    fixture.setup(clients[0])
+
+    items = scenarios(fixture)
+    missing = uncovered_routes(current_app, items)
+    if only:
+        items = [item for item in items if any(pattern in item.name for pattern in only)]
+
+    results = {}
+    click.echo(f"{'scenario':32} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'rss MB':>8} {'errors':>6}")
+    for scenario in items:
+        result = run_scenario(scenario, clients, requests, warmup, pids)
+        results[scenario.name] = result
+        click.echo(f"{scenario.name:32} {result['p50_ms'] or 0:9.2f} {result['p95_ms'] or 0:9.2f} "
+                   f"{result['p99_ms'] or 0:9.2f} {result['throughput_rps'] or 0:9.1f} "
+                   f"{result['peak_rss_mb'] or 0:8.1f} {result['errors']:6d}")
+    for route in missing:
+        click.echo(f'not covered: {route}', err=True)
+
+    commit = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'startedAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'target': url or 'in-process',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'concurrency': concurrency,
+            'requests': requests,
+            'warmup': warmup,
+            'dataset': sizes,
+            'poolSize': current_app.config['MYSQL_POOL_SIZE'],
+        },
+        'results': results,
+        'uncovered': missing,
+    }
+    if not output:
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join('bench-results', f"{stamp}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    click.echo(f'Results written to {output}')
+
+
+@bench_cli.command('compare')
+@click.argument('baseline', type=click.File('r', encoding='utf-8'))
+@click.argument('candidate', type=click.File('r', encoding='utf-8'))
+@click.option('--threshold', default=0.1, show_default=True, help='Allowed p95 slowdown (0.1 = 10%).')
+def compare(baseline, candidate, threshold):
+    """Compare two result files; exits 1 when an endpoint's p95 regressed."""
+    old, new = json.load(baseline), json.load(candidate)
+    click.echo(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    click.echo(f"{'scenario':32} {'p95 before':>11} {'p95 after':>11} {'change':>8} {'req/s change':>13}")
+    regressions = []
+    for name, after in new['results'].items():
+        before = old['results'].get(name)
+        if not before or not before['p95_ms'] or not after['p95_ms']:
+            continue
+        change = after['p95_ms'] / before['p95_ms'] - 1
+        rps_change = (after['throughput_rps'] / before['throughput_rps'] - 1
+                      if before['throughput_rps'] and after['throughput_rps'] else 0)
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        click.echo(f"{name:32} {before['p95_ms']:11.2f} {after['p95_ms']:11.2f} {change:+8.1%} "
+                   f"{rps_change:+13.1%}{flag}")
+    if regressions:
+        raise SystemExit(1)
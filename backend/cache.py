@@ -0,0 +1,198 @@
+import collections
+import logging
+import pickle
+import threading
+import time
+
+from flask import current_app
+
+from db import mysql
+import table_versions
+
+# Read-through cache for hot list/count reads. Entries are keyed by the table_versions
+# stamps of the tables they were read from, so any write in any process makes the old
+# entries unreachable; writes in this process also drop them right away. Versions are
+# re-read at most every CACHE_VERSION_CHECK_INTERVAL seconds, which bounds how stale a
+# read served after another worker's write can be.
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    # In-process LRU with a per-entry TTL. Also the stand-in for the shared backend.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (expires_at, value)
+        self.counters = collections.Counter()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[0] <= time.monotonic():
+                del self.entries[key]
+                self.counters['expired'] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            return True, entry[1]
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def delete_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'local',
+                'entries': len(self.entries),
+                'maxEntries': self.max_entries,
+                'evictions': self.counters['evictions'],
+                'expired': self.counters['expired'],
+            }
+
+
+class RedisBackend:
+    # Shared across workers; needs the optional `redis` package. Redis does the TTL
+    # and memory eviction itself (configure maxmemory-policy allkeys-lru).
+
+    def __init__(self, url, prefix='hams:cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis needs the "redis" package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return False, None
+        return True, pickle.loads(value)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.prefix + prefix + '*', count=500))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        info = self.client.info('stats')
+        return {
+            'backend': 'redis',
+            'entries': self.client.dbsize(),
+            'evictions': info.get('evicted_keys', 0),
+            'expired': info.get('expired_keys', 0),
+        }
+
+
+BACKENDS = {
+    'local': lambda config: LocalBackend(config['CACHE_MAX_ENTRIES']),
+    'redis': lambda config: RedisBackend(config['CACHE_REDIS_URL']),
+}
+
+
+class ReadThroughCache:
+    def __init__(self, backend, ttl=300, version_check_interval=1.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.lock = threading.Lock()
+        self.versions = {}  # (connection role, table) -> (version, checked_at)
+        self.counters = collections.Counter()
+
+    def _versions(self, tables):
+        # Replicas lag the primary, so their stamps are remembered separately; a reader
+        # on the primary never reuses a replica's older stamp
+        role = 'replica' if mysql.on_replica else 'primary'
+        now = time.monotonic()
+        with self.lock:
+            known = {table: self.versions.get((role, table)) for table in tables}
+        stale = [table for table, entry in known.items()
+                 if entry is None or now - entry[1] >= self.version_check_interval]
+        if stale:
+            cursor = mysql.connection.cursor()
+            fresh = table_versions.current(cursor, stale)
+            cursor.close()
+            with self.lock:
+                for table, version in fresh.items():
+                    self.versions[(role, table)] = (version, now)
+                    known[table] = (version, now)
+        return [known[table][0] for table in tables]
+
+    def get_or_load(self, key, tables, loader):
+        # `key` must start with the first table's name so invalidate() can find it
+        stamp = ':'.join(str(version) for version in self._versions(tables))
+        full_key = f'{key}@{stamp}'
+        try:
+            hit, value = self.backend.get(full_key)
+        except Exception:
+            logger.exception('Cache read failed; loading from MySQL')
+            hit, value = False, None
+        with self.lock:
+            self.counters['hits' if hit else 'misses'] += 1
+        if hit:
+            return value
+
+        value = loader()
+        try:
+            self.backend.set(full_key, value, self.ttl)
+        except Exception:
+            logger.exception('Cache write failed')
+        return value
+
+    def invalidate(self, *tables):
+        # Call after a write commits. Forgets the version stamps so the next read sees
+        # the bump, and drops this table's entries instead of waiting for eviction.
+        with self.lock:
+            for table in tables:
+                for role in ('primary', 'replica'):
+                    self.versions.pop((role, table), None)
+            self.counters['invalidations'] += len(tables)
+        for table in tables:
+            try:
+                self.backend.delete_prefix(table + ':')
+            except Exception:
+                logger.exception('Cache invalidation failed')
+
+    def stats(self):
+        stats = self.backend.stats()
+        with self.lock:
+            stats.update({
+                'hits': self.counters['hits'],
+                'misses': self.counters['misses'],
+                'invalidations': self.counters['invalidations'],
+                'ttl': self.ttl,
+            })
+        return stats
+
+
+def init_app(app):
+    app.config.setdefault('CACHE_BACKEND', 'local')
+    app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+    app.config.setdefault('CACHE_TTL', 300)
+    app.config.setdefault('CACHE_VERSION_CHECK_INTERVAL', 1.0)
+    app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+    if app.config['CACHE_BACKEND'] not in BACKENDS:
+        raise RuntimeError(f"CACHE_BACKEND must be one of {', '.join(BACKENDS)}")
+    backend = BACKENDS[app.config['CACHE_BACKEND']](app.config)
+    app.extensions['cache'] = ReadThroughCache(backend, app.config['CACHE_TTL'],
+                                               app.config['CACHE_VERSION_CHECK_INTERVAL'])
+
+
+def get_cache():
+    return current_app.extensions['cache']
@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from db import register_query
+import table_versions
+
+# Change feed for live dashboards. Write endpoints insert a row into change_events in
+# the same transaction as the change itself, so every worker process sees the same
+# ordered feed. One poller thread per process reads new rows and fans them out to the
+# SSE streams connected to that process; streams never hold a database connection.
+
+logger = logging.getLogger(__name__)
+
+ASSET_SNAPSHOT_QUERY = register_query('changes.asset_snapshot', """
+    SELECT
+        a.id,
+        a.resource_id,
+        a.name,
+        a.stock_count,
+        a.deduction,
+        a.date,
+        r.name AS resource_name,
+        r.section,
+        l.threshold AS low_stock_threshold
+    FROM assets a
+    LEFT JOIN resources r ON r.id = a.resource_id
+    LEFT JOIN low_stock_assets l ON l.asset_id = a.id
+    WHERE a.id = %s
+""", (1,))
+
+EVENTS_AFTER_QUERY = register_query('changes.after', """
+    SELECT id, event_type, payload FROM change_events
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+""", (0, 100))
+
+# Bulk events list the asset ids they touched up to this many (change_events.payload
+# is a TEXT column). Larger writes carry only counts, and the search index reloads
+# everything when it sees one.
+BULK_EVENT_MAX_IDS = 1000
+
+
+# Payloads
+def asset_snapshot(cursor, asset_id):
+    # The asset as clients show it: totals, recent updates and low-stock membership
+    cursor.execute(ASSET_SNAPSHOT_QUERY, (asset_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    (asset_id, resource_id, name, stock_count, deduction, date, resource_name, section,
+     low_stock_threshold) = row
+    return {
+        'id': asset_id,
+        'resourceId': resource_id,
+        'name': name,
+        'resourceName': resource_name,
+        'section': section,
+        'stockCount': stock_count,
+        'deduction': deduction,
+        'date': date.strftime('%Y-%m-%d'),
+        'lowStock': low_stock_threshold is not None,
+        'threshold': low_stock_threshold,
+    }
+
+
+def resource_snapshot(resource_id, name, section, image_path):
+    return {'id': resource_id, 'name': name, 'section': section, 'image_path': image_path}
+
+
+def bulk_payload(asset_ids, **counts):
+    data = dict(counts)
+    if len(asset_ids) <= BULK_EVENT_MAX_IDS:
+        data['ids'] = sorted(asset_ids)
+    return data
+
+
+def publish(cursor, event_type, data):
+    # Call last inside the write transaction, just before the commit. Bumping the
+    # change_events version locks its row until then, so event ids are handed out in
+    # commit order and the pollers' "id > last seen" never skips a late commit.
+    # Returns the event id.
+    table_versions.bump(cursor, 'change_events')
+    cursor.execute('INSERT INTO change_events (event_type, payload) VALUES (%s, %s)',
+                   (event_type, json.dumps(data)))
+    return cursor.lastrowid
+
+
+def format_event(event_id, event_type, data):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
+
+
+# Fan-out
+class Subscriber:
+    # A bounded per-stream buffer. A client that falls behind is not allowed to grow
+    # it: the overflow is dropped and the stream tells the client to refetch instead.
+    def __init__(self, size):
+        self.events = queue.Queue(maxsize=size)
+        self.overflowed = False
+        # Set once the stream's replay is done: the last id the client already has
+        self.start_id = None
+
+    def put(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def reset(self):
+        self.overflowed = False
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+
+class ChangeFeed:
+    def __init__(self, pool, poll_interval=1.0, batch_size=500, queue_size=1000, retention=86400):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.last_id = None
+        self.thread = None
+        self.pid = None
+        self.last_prune = 0.0
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        with self.lock:
+            # Threads do not survive a fork; each worker starts its own poller
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.subscribers = set()
+                self.last_id = None
+                self.thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self.thread.start()
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                if not self.subscribers:
+                    # Nobody is listening; pick up from the next subscriber's position
+                    self.last_id = None
+                    continue
+                if self.last_id is None:
+                    starts = [subscriber.start_id for subscriber in self.subscribers]
+                    if None in starts:
+                        continue
+                    self.last_id = min(starts)
+            try:
+                self._poll()
+            except Exception:
+                logger.exception('Change feed poll failed')
+
+    def _poll(self):
+        connection = self.pool.acquire()
+        try:
+            cursor = connection.cursor()
+            while True:
+                cursor.execute(EVENTS_AFTER_QUERY, (self.last_id, self.batch_size))
+                rows = cursor.fetchall()
+                # Streams that subscribed while we were reading get these rows too; they
+                # were committed before the stream's replay, which drops duplicates
+                with self.lock:
+                    subscribers = list(self.subscribers)
+                for event_id, event_type, payload in rows:
+                    event = (event_id, event_type, payload)
+                    for subscriber in subscribers:
+                        subscriber.put(event)
+                    self.last_id = event_id
+                if len(rows) < self.batch_size:
+                    break
+
+            if time.monotonic() - self.last_prune > 60:
+                self.last_prune = time.monotonic()
+                cursor.execute(
+                    'DELETE FROM change_events WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 10000',
+                    (self.retention,)
+                )
+                connection.commit()
+            cursor.close()
+        finally:
+            self.pool.release(connection)
+
+
+def init_app(app):
+    app.config.setdefault('CHANGE_FEED_POLL_INTERVAL', 1.0)
+    app.config.setdefault('CHANGE_FEED_QUEUE_SIZE', 1000)
+    app.config.setdefault('CHANGE_FEED_REPLAY_LIMIT', 1000)
+    app.config.setdefault('CHANGE_FEED_KEEPALIVE', 15)
+    app.config.setdefault('CHANGE_FEED_RETENTION', 86400)
+    app.extensions['change_feed'] = ChangeFeed(
+        app.extensions['mysql'],
+        poll_interval=app.config['CHANGE_FEED_POLL_INTERVAL'],
+        queue_size=app.config['CHANGE_FEED_QUEUE_SIZE'],
+        retention=app.config['CHANGE_FEED_RETENTION'],
+    )
+
+
+def replay(cursor, last_id, limit):
+    """Return (events after last_id, head id); events is None when the client must refetch.
+
+    That happens when the gap is larger than `limit` or older rows were already pruned.
+    Without a last_id the stream starts at the head.
+    """
+    cursor.execute('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM change_events')
+    oldest, head = cursor.fetchone()
+    if last_id is None or last_id >= head:
+        return [], head
+    if last_id < oldest - 1:
+        return None, head
+
+    cursor.execute(EVENTS_AFTER_QUERY, (last_id, limit + 1))
+    rows = cursor.fetchall()
+    if len(rows) > limit:
+        return None, head
+    return list(rows), head
+
+
+def stream(feed, subscriber, replayed, head, keepalive):
+    # Generator for the SSE response; runs after the request's connection is released
+    try:
+        yield 'retry: 3000\n\n'
+        sent_id = head
+        if replayed is None:
+            yield format_event(head, 'reset', json.dumps({'reason': 'gap'}))
+        else:
+            for event_id, event_type, payload in replayed:
+                yield format_event(event_id, event_type, payload)
+
+        while True:
+            if subscriber.overflowed:
+                subscriber.reset()
+                sent_id = max(sent_id, feed.last_id or 0)
+                yield format_event(sent_id, 'reset', json.dumps({'reason': 'overflow'}))
+            try:
+                event_id, event_type, payload = subscriber.events.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            # Already delivered by the replay
+            if event_id <= sent_id:
+                continue
+            sent_id = event_id
+            yield format_event(event_id, event_type, payload)
+    finally:
+        feed.unsubscribe(subscriber)
@@ -0,0 +1,36 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Cooperative serving mode (gunicorn -k gevent, see gevent_app.py). Sockets, locks and
+# subprocesses are patched to yield to other greenlets, and the MySQL driver is
+# swapped for PyMySQL, which is pure Python and so waits on the database cooperatively
+# too (mysqlclient blocks the whole worker inside its C calls). One worker can then
+# hold many slow uploads, SSE streams and report downloads at once.
+
+active = False
+
+
+def install():
+    # Call before anything imports MySQLdb, flask or the app modules
+    global active
+    from gevent import monkey
+    monkey.patch_all()
+
+    import pymysql
+    import pymysql.connections
+    import pymysql.constants.FIELD_TYPE
+    import pymysql.cursors
+    pymysql.install_as_MySQLdb()
+    sys.modules['MySQLdb.connections'] = pymysql.connections
+    sys.modules['MySQLdb.constants'] = pymysql.constants
+    sys.modules['MySQLdb.cursors'] = pymysql.cursors
+    active = True
+
+
+def cpu_executor(max_workers, thread_name_prefix):
+    # CPU-bound work (bcrypt) needs real OS threads: once threading is patched, a
+    # ThreadPoolExecutor runs greenlets and hashing would stall every other request
+    if active:
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
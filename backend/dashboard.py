@@ -0,0 +1,316 @@
+from flask import Blueprint, Response, current_app, jsonify, request, json
+from MySQLdb.cursors import DictCursor
+from datetime import datetime
+import hashlib
+import threading
+import time
+from db import mysql, read_only, register_query
+from http_cache import versioned
+import cache
+import change_feed
+import forecast
+import low_stock
+import stock_rollup
+import table_versions
+
+# Dashboard statistics
+bp = Blueprint('dashboard', __name__)
+
+
+# Dashboard panels, shared by the individual endpoints and /api/dashboard/summary
+RECENT_UPDATES_QUERY = register_query('dashboard.recent_updates', """
+    SELECT a.id, a.name AS asset_name, a.deduction, a.date, r.name AS resource_name
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    ORDER BY a.date DESC
+    LIMIT 10
+""")
+
+LOW_STOCK_PAGE_SIZE = 5
+FORECAST_PAGE_SIZE = 50
+
+
+def query_total_assets(cursor):
+    cursor.execute("SELECT COUNT(*) FROM assets")  # Adjust the table name if needed
+    return cursor.fetchone()[0]
+
+
+def query_total_resources(cursor):
+    cursor.execute("SELECT COUNT(*) FROM resources")  # Adjust table name if different
+    return cursor.fetchone()[0]
+
+
+def query_recent_updates(cursor):
+    cursor.execute(RECENT_UPDATES_QUERY)
+    formatted_updates = []
+    for update in cursor.fetchall():
+        action = 'Increased' if update['deduction'] < 0 else 'Decreased'
+        formatted_updates.append({
+            'id': update['id'],
+            'item': f"{update['resource_name']} ({update['asset_name']})",
+            'action': action,
+            'quantity': abs(update['deduction']),
+            'date': update['date'].strftime('%Y-%m-%d')
+        })
+    return formatted_updates
+
+
+@bp.route('/api/total-assets', methods=['GET'])
+@read_only
+@versioned('assets')
+def get_total_assets():
+    try:
+        def load():
+            cur = mysql.connection.cursor()
+            total = query_total_assets(cur)
+            cur.close()
+            return total
+
+        total_assets = cache.get_cache().get_or_load('assets:count', ['assets'], load)
+
+        return jsonify({'totalAssets': total_assets})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/total-resources', methods=['GET'])
+@read_only
+@versioned('resources')
+def get_total_resources():
+    try:
+        def load():
+            cur = mysql.connection.cursor()
+            total = query_total_resources(cur)
+            cur.close()
+            return total
+
+        total_resources = cache.get_cache().get_or_load('resources:count', ['resources'], load)
+        return jsonify({'totalResources': total_resources})  # Return JSON response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500  # Return error response if any issue occurs
+
+@bp.route('/api/asset-timeline', methods=['GET'])
+@read_only
+@versioned('assets')
+def get_asset_timeline():
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in stock_rollup.BUCKET_EXPRESSIONS:
+        return jsonify({'error': 'bucket must be one of day, week, month'}), 400
+
+    try:
+        start = stock_rollup.parse_day(request.args.get('from'))
+        end = stock_rollup.parse_day(request.args.get('to'))
+    except ValueError:
+        return jsonify({'error': 'from/to must be dates in YYYY-MM-DD format'}), 400
+
+    try:
+        # Reads the maintained daily rollup instead of grouping the whole assets table
+        cursor = mysql.connection.cursor()
+        asset_data = stock_rollup.timeline(cursor, start, end, bucket)
+        cursor.close()
+
+        return jsonify({'chartData': asset_data}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/dashboard/low-stock', methods=['GET'])
+@read_only
+@versioned('assets', 'resources', 'section_thresholds')
+def get_low_stock():
+    # ?section= filters, ?limit= pages (default 5, "all" for the full list) and
+    # ?after= continues from a previous page's nextAfter
+    section = request.args.get('section')
+    limit = request.args.get('limit', str(LOW_STOCK_PAGE_SIZE))
+    try:
+        limit = None if limit == 'all' else int(limit)
+        after = low_stock.parse_after(request.args.get('after'))
+    except ValueError:
+        return jsonify({'error': 'limit must be a positive integer or "all", after must be <stockCount>:<id>'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be a positive integer or "all"'}), 400
+
+    try:
+        cursor = mysql.connection.cursor(DictCursor)
+        low_stock_items, next_after = low_stock.page(cursor, section, after, limit)
+        total = low_stock.count(cursor, section)
+        cursor.close()
+
+        return jsonify({'lowStockItems': low_stock_items, 'total': total, 'nextAfter': next_after})
+
+    except Exception as e:
+        current_app.logger.error(f"Error in low stock: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/recent-updates', methods=['GET'])
+@read_only
+@versioned('assets', 'resources')
+def get_recent_updates():
+    try:
+        # Create database cursor
+        cursor = mysql.connection.cursor(DictCursor)
+        formatted_updates = query_recent_updates(cursor)
+
+        return jsonify({
+            'success': True,
+            'recentUpdates': formatted_updates
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching recent updates: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Failed to fetch recent updates'
+        }), 500
+
+    finally:
+        # Always close the cursor
+        if 'cursor' in locals():
+            cursor.close()
+
+
+@bp.route('/api/dashboard/forecast', methods=['GET'])
+@read_only
+def get_stock_forecast():
+    # Days until each asset runs out at its recent rate of use, soonest first.
+    # ?section=, ?resourceId= and ?within=<days> filter, ?limit= (default 50, "all")
+    # pages, ?windowDays= sets how far back usage is measured
+    try:
+        window_days = request.args.get('windowDays', current_app.config['FORECAST_WINDOW_DAYS'], type=int)
+        resource_id = request.args.get('resourceId', type=int)
+        within = request.args.get('within', type=float)
+        limit = request.args.get('limit', str(FORECAST_PAGE_SIZE))
+        limit = None if limit == 'all' else int(limit)
+    except ValueError:
+        return jsonify({'error': 'limit must be a positive integer or "all"'}), 400
+    if not window_days or not 1 <= window_days <= 365:
+        return jsonify({'error': 'windowDays must be between 1 and 365'}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be a positive integer or "all"'}), 400
+
+    try:
+        def load():
+            cursor = mysql.connection.cursor()
+            now = datetime.now()
+            stock, usage = forecast.load(cursor, now, window_days)
+            cursor.close()
+            return forecast.compute(stock, usage, now, window_days), now
+
+        # Recomputed after the next asset write (or CACHE_TTL, as the window moves on)
+        frame, generated_at = cache.get_cache().get_or_load(f'assets:forecast:{window_days}',
+                                                            ['assets', 'resources'], load)
+        selected = forecast.select(frame, request.args.get('section'), resource_id, within)
+        page = selected if limit is None else selected.head(limit)
+        return jsonify({
+            'generatedAt': generated_at.isoformat(timespec='seconds'),
+            'windowDays': window_days,
+            'summary': forecast.summary(selected),
+            'items': forecast.items(page),
+        })
+    except Exception as e:
+        current_app.logger.error(f"Forecast error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# Summary cache: one computed payload per process, reused until the TTL expires
+# or one of the SUMMARY_TABLES version stamps moves on.
+SUMMARY_TABLES = ('assets', 'resources', 'section_thresholds')
+summary_cache = {'versions': None, 'expires_at': 0, 'body': None, 'etag': None}
+summary_lock = threading.Lock()
+
+
+def build_summary(versions):
+    cursor = mysql.connection.cursor(DictCursor)
+    try:
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM assets) AS total_assets,
+                (SELECT COUNT(*) FROM resources) AS total_resources
+        """)
+        totals = cursor.fetchone()
+        summary = {
+            'totalAssets': totals['total_assets'],
+            'totalResources': totals['total_resources'],
+            'lowStockItems': low_stock.page(cursor, limit=LOW_STOCK_PAGE_SIZE)[0],
+            'lowStockCount': low_stock.count(cursor),
+            'recentUpdates': query_recent_updates(cursor),
+        }
+    finally:
+        cursor.close()
+
+    # The timeline helper reads positional rows
+    cursor = mysql.connection.cursor()
+    try:
+        summary['chartData'] = stock_rollup.timeline(cursor)
+    finally:
+        cursor.close()
+
+    body = json.dumps(summary)
+    # Keyed on the same stamps as the cache, so a threshold change also changes the ETag
+    stamps = ':'.join(str(versions[table]) for table in SUMMARY_TABLES)
+    etag = hashlib.sha1(f'{stamps}:{body}'.encode('utf-8')).hexdigest()
+    return body, etag
+
+
+@bp.route('/api/dashboard/summary', methods=['GET'])
+@read_only
+def get_dashboard_summary():
+    try:
+        cursor = mysql.connection.cursor()
+        versions = table_versions.current(cursor, SUMMARY_TABLES)
+        cursor.close()
+
+        with summary_lock:
+            fresh = (summary_cache['body'] is not None
+                     and summary_cache['versions'] == versions
+                     and summary_cache['expires_at'] > time.monotonic())
+            body, etag = summary_cache['body'], summary_cache['etag']
+
+        if not fresh:
+            body, etag = build_summary(versions)
+            with summary_lock:
+                summary_cache.update({
+                    'versions': versions,
+                    'expires_at': time.monotonic() + current_app.config['DASHBOARD_CACHE_TTL'],
+                    'body': body,
+                    'etag': etag,
+                })
+
+        response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        # Answers 304 Not Modified when the client's If-None-Match still matches
+        return response.make_conditional(request)
+
+    except Exception as e:
+        current_app.logger.error(f"Error building dashboard summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/dashboard/changes', methods=['GET'])
+def stream_changes():
+    # Server-Sent Events: asset/resource changes as they commit. Reconnecting clients
+    # send Last-Event-ID (EventSource does this itself) and get what they missed, or a
+    # "reset" event when they fell too far behind and should refetch the summary.
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an event id'}), 400
+
+    feed = current_app.extensions['change_feed']
+    subscriber = feed.subscribe()
+    try:
+        cursor = mysql.connection.cursor()
+        replayed, head = change_feed.replay(cursor, last_id, current_app.config['CHANGE_FEED_REPLAY_LIMIT'])
+        cursor.close()
+    except Exception as e:
+        feed.unsubscribe(subscriber)
+        current_app.logger.error(f"Error opening change feed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    subscriber.start_id = head
+
+    # Not wrapped in stream_with_context: the pooled connection goes back when this
+    # view returns instead of being held for the life of the stream
+    stream = change_feed.stream(feed, subscriber, replayed, head, current_app.config['CHANGE_FEED_KEEPALIVE'])
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,428 @@
+import collections
+import functools
+import itertools
+import logging
+import os
+import threading
+import time
+
+import MySQLdb
+from flask import current_app, g, has_app_context, has_request_context, request
+from MySQLdb.cursors import DictCursor
+
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Hot-path statements with sample parameters; `flask --app app db check` EXPLAINs each one
+QUERY_REGISTRY = {}
+
+
+def register_query(name, sql, sample_params=(), allow_full_scan=False):
+    QUERY_REGISTRY[name] = (sql, tuple(sample_params), allow_full_scan)
+    metrics.name_statement(sql, name)
+    return sql
+
+
+class ConnectionPool:
+    # A bounded pool of MySQLdb connections. At most `size` connections are open at
+    # once per process, so the MySQL budget is (gunicorn workers x MYSQL_POOL_SIZE).
+    # Idle connections are pinged before reuse and replaced once older than `recycle`.
+
+    def __init__(self, connect, size=5, timeout=10, recycle=3600, ping_interval=30):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = collections.deque()  # (connection, created_at, last_used)
+        self._in_use = {}  # id(connection) -> created_at
+        self._open = 0
+        self._stats = collections.Counter()
+        self._wait_time = 0.0
+
+    def acquire(self):
+        with self._cond:
+            # Connections must not be shared with a forked worker
+            if self._pid != os.getpid():
+                self._reset()
+
+            entry = None
+            started = time.monotonic()
+            deadline = started + self.timeout
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection available within {self.timeout}s')
+                self._stats['waits'] += 1
+                self._cond.wait(remaining)
+            self._wait_time += time.monotonic() - started
+
+        connection = created_at = None
+        if entry:
+            connection, created_at, last_used = entry
+            now = time.monotonic()
+            if self.recycle and now - created_at > self.recycle:
+                self._stats['recycled'] += 1
+                self._close(connection)
+                connection = None
+            elif now - last_used > self.ping_interval and not self._ping(connection):
+                self._stats['ping_failures'] += 1
+                self._close(connection)
+                connection = None
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            created_at = time.monotonic()
+            self._stats['created'] += 1
+
+        with self._cond:
+            self._in_use[id(connection)] = created_at
+            self._stats['checkouts'] += 1
+        return connection
+
+    def release(self, connection, discard=False):
+        with self._cond:
+            created_at = self._in_use.pop(id(connection), None)
+        if created_at is None:
+            # Checked out before a fork; the child never owned it
+            return
+
+        if not discard:
+            try:
+                # Never hand the next request a half-finished transaction
+                connection.rollback()
+            except MySQLdb.Error:
+                discard = True
+
+        with self._cond:
+            if discard:
+                self._open -= 1
+                self._stats['discarded'] += 1
+            else:
+                self._idle.append((connection, created_at, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close(connection)
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), collections.deque()
+            self._open -= len(idle)
+        for connection, _, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'inUse': len(self._in_use),
+                'checkouts': self._stats['checkouts'],
+                'created': self._stats['created'],
+                'recycled': self._stats['recycled'],
+                'pingFailures': self._stats['ping_failures'],
+                'discarded': self._stats['discarded'],
+                'waits': self._stats['waits'],
+                'timeouts': self._stats['timeouts'],
+                'waitSeconds': round(self._wait_time, 6),
+            }
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            connection.ping()
+            return True
+        except MySQLdb.Error:
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except MySQLdb.Error:
+            pass
+
+
+# Read replicas. Views marked @read_only (dashboard and report reads) check their
+# connection out of a replica, round-robin, skipping replicas that lag more than
+# MYSQL_REPLICA_MAX_LAG or cannot be reached; with none usable they use the primary.
+# Everything else, and reads by a client that wrote within MYSQL_READ_YOUR_WRITES_WINDOW,
+# stays on the primary.
+READS = metrics.Counter('hams_db_read_only_checkouts_total', 'Connections checked out for @read_only views',
+                        ['target'])
+
+PRIMARY_COOKIE = 'hams_primary_until'
+PRIMARY_HEADER = 'X-Read-Primary'
+
+
+def replica_lag(connection):
+    # Seconds behind the source, or None when the server is not replicating
+    cursor = connection.cursor(DictCursor)
+    try:
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+            key = 'Seconds_Behind_Source'
+        except MySQLdb.ProgrammingError:
+            # Before MySQL 8.0.22
+            cursor.execute('SHOW SLAVE STATUS')
+            key = 'Seconds_Behind_Master'
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return row.get(key) if row else None
+
+
+class ReplicaSet:
+    def __init__(self, names, pools, max_lag=5, check_interval=2):
+        self.names = names
+        self.pools = pools
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        # Per replica: usable?, last measured lag, when it was checked, why it was skipped
+        self.state = [{'healthy': None, 'lag': None, 'checkedAt': 0, 'error': None} for _ in pools]
+
+    def _mark(self, index, healthy, lag=None, error=None):
+        with self.lock:
+            self.state[index].update(healthy=healthy, lag=lag, checkedAt=time.monotonic(), error=error)
+
+    def _check(self, index, connection):
+        if self.max_lag is None:
+            self._mark(index, True)
+            return True
+        lag = replica_lag(connection)
+        if lag is None:
+            self._mark(index, False, error='not replicating')
+        elif lag > self.max_lag:
+            self._mark(index, False, lag, f'{lag}s behind')
+        else:
+            self._mark(index, True, lag)
+        return self.state[index]['healthy']
+
+    def acquire(self):
+        """Return (index, connection) from the next usable replica, or (None, None)."""
+        start = next(self.counter)
+        now = time.monotonic()
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            with self.lock:
+                state = dict(self.state[index])
+            checked = now - state['checkedAt'] < self.check_interval
+            if checked and state['healthy'] is False:
+                continue
+
+            pool = self.pools[index]
+            try:
+                connection = pool.acquire()
+            except (PoolTimeout, MySQLdb.Error) as e:
+                self._mark(index, False, error=str(e))
+                continue
+            if not checked:
+                try:
+                    healthy = self._check(index, connection)
+                except MySQLdb.Error as e:
+                    self._mark(index, False, error=str(e))
+                    pool.release(connection, discard=True)
+                    continue
+                if not healthy:
+                    logger.warning('Skipping replica %s: %s', self.names[index], self.state[index]['error'])
+                    pool.release(connection)
+                    continue
+            return index, connection
+        return None, None
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            states = [dict(state) for state in self.state]
+        return [{
+            'replica': name,
+            'healthy': state['healthy'],
+            'lag': state['lag'],
+            'checkedSecondsAgo': round(now - state['checkedAt'], 1) if state['checkedAt'] else None,
+            'error': state['error'],
+            'pool': pool.stats(),
+        } for name, pool, state in zip(self.names, self.pools, states)]
+
+
+def read_only(view):
+    # Lets the view's queries (including @versioned's version lookup, so put this
+    # decorator above it) run on a replica
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        g.mysql_read_only = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def wants_primary():
+    # Read-your-writes: the client wrote recently (cookie set by remember_write) or asks for it
+    if not has_request_context():
+        return False
+    if request.headers.get(PRIMARY_HEADER):
+        return True
+    until = request.cookies.get(PRIMARY_COOKIE, type=float)
+    return until is not None and until > time.time()
+
+
+def note_write():
+    # Called by table_versions.bump, i.e. by every write path
+    if has_app_context():
+        g.mysql_wrote = True
+
+
+class MySQL:
+    # Drop-in replacement for flask_mysqldb.MySQL backed by a ConnectionPool:
+    # `mysql.connection` checks a connection out for the current app context and
+    # the teardown hands it back.
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('MYSQL_HOST', 'localhost')
+        app.config.setdefault('MYSQL_USER', None)
+        app.config.setdefault('MYSQL_PASSWORD', None)
+        app.config.setdefault('MYSQL_DB', None)
+        app.config.setdefault('MYSQL_PORT', 3306)
+        app.config.setdefault('MYSQL_UNIX_SOCKET', None)
+        app.config.setdefault('MYSQL_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_CHARSET', 'utf8mb4')
+        app.config.setdefault('MYSQL_POOL_SIZE', 5)
+        app.config.setdefault('MYSQL_POOL_TIMEOUT', 10)
+        app.config.setdefault('MYSQL_POOL_RECYCLE', 3600)
+        app.config.setdefault('MYSQL_POOL_PING_INTERVAL', 30)
+        app.config.setdefault('MYSQL_REPLICAS', [])
+        app.config.setdefault('MYSQL_REPLICA_POOL_SIZE', app.config['MYSQL_POOL_SIZE'])
+        app.config.setdefault('MYSQL_REPLICA_POOL_TIMEOUT', 1)
+        app.config.setdefault('MYSQL_REPLICA_MAX_LAG', 5)
+        app.config.setdefault('MYSQL_REPLICA_CHECK_INTERVAL', 2)
+        app.config.setdefault('MYSQL_READ_YOUR_WRITES_WINDOW', 10)
+
+        config = app.config
+        app.extensions['mysql'] = ConnectionPool(
+            lambda: self.connect(config),
+            size=config['MYSQL_POOL_SIZE'],
+            timeout=config['MYSQL_POOL_TIMEOUT'],
+            recycle=config['MYSQL_POOL_RECYCLE'],
+            ping_interval=config['MYSQL_POOL_PING_INTERVAL'],
+        )
+        app.extensions['mysql_replicas'] = None
+        if config['MYSQL_REPLICAS']:
+            names = list(config['MYSQL_REPLICAS'])
+            app.extensions['mysql_replicas'] = ReplicaSet(names, [ConnectionPool(
+                functools.partial(self.connect, config, replica),
+                size=config['MYSQL_REPLICA_POOL_SIZE'],
+                timeout=config['MYSQL_REPLICA_POOL_TIMEOUT'],
+                recycle=config['MYSQL_POOL_RECYCLE'],
+                ping_interval=config['MYSQL_POOL_PING_INTERVAL'],
+            ) for replica in names], config['MYSQL_REPLICA_MAX_LAG'], config['MYSQL_REPLICA_CHECK_INTERVAL'])
+            app.after_request(self.remember_write)
+        app.teardown_appcontext(self.teardown)
+
+    @staticmethod
+    def connect(config, replica=None):
+        # replica: "host" or "host:port"; credentials and database are the primary's
+        host, port = config['MYSQL_HOST'], config['MYSQL_PORT']
+        if replica:
+            host, _, replica_port = replica.partition(':')
+            port = int(replica_port) if replica_port else 3306
+        kwargs = {
+            'host': host,
+            'port': port,
+            'connect_timeout': config['MYSQL_CONNECT_TIMEOUT'],
+            'charset': config['MYSQL_CHARSET'],
+        }
+        if config['MYSQL_USER']:
+            kwargs['user'] = config['MYSQL_USER']
+        if config['MYSQL_PASSWORD']:
+            kwargs['passwd'] = config['MYSQL_PASSWORD']
+        if config['MYSQL_DB']:
+            kwargs['db'] = config['MYSQL_DB']
+        if config['MYSQL_UNIX_SOCKET'] and not replica:
+            kwargs['unix_socket'] = config['MYSQL_UNIX_SOCKET']
+        if replica:
+            # A stray write fails here instead of diverging the replica
+            kwargs['init_command'] = 'SET SESSION TRANSACTION READ ONLY'
+        # Times every statement for /metrics
+        return metrics.TimedConnection(**kwargs)
+
+    @property
+    def pool(self):
+        return current_app.extensions['mysql']
+
+    @property
+    def replicas(self):
+        return current_app.extensions.get('mysql_replicas')
+
+    @property
+    def connection(self):
+        if 'mysql_connection' not in g:
+            g.mysql_connection, g.mysql_pool = self._checkout()
+        return g.mysql_connection
+
+    @property
+    def on_replica(self):
+        # Whether this context's connection (checked out already or next) is a replica's
+        if 'mysql_pool' in g:
+            return g.mysql_pool is not self.pool
+        return self._use_replica()
+
+    def _use_replica(self):
+        return bool(self.replicas and g.get('mysql_read_only') and not wants_primary())
+
+    def _checkout(self):
+        if self._use_replica():
+            index, connection = self.replicas.acquire()
+            if connection is not None:
+                READS.inc(self.replicas.names[index])
+                return connection, self.replicas.pools[index]
+            READS.inc('primary_fallback')
+        elif g.get('mysql_read_only'):
+            READS.inc('primary')
+        return self.pool.acquire(), self.pool
+
+    def remember_write(self, response):
+        # after_request: keep this client's reads on the primary while replicas catch up
+        if g.get('mysql_wrote'):
+            window = current_app.config['MYSQL_READ_YOUR_WRITES_WINDOW']
+            response.set_cookie(PRIMARY_COOKIE, str(time.time() + window), max_age=window, httponly=True,
+                                samesite='Lax')
+        return response
+
+    def teardown(self, exception):
+        connection = g.pop('mysql_connection', None)
+        pool = g.pop('mysql_pool', self.pool)
+        if connection is not None:
+            pool.release(connection, discard=isinstance(exception, MySQLdb.OperationalError))
+
+
+mysql = MySQL()
@@ -0,0 +1,128 @@
+from datetime import timedelta
+
+from db import register_query
+
+# Stock-out forecast for every asset: the daily usage over the last FORECAST_WINDOW_DAYS
+# comes from the stock ledger (stock decreases only; restocks do not offset usage),
+# the remaining stock from assets. Both are read with one query each and combined
+# column-wise, so the cost is two scans and a few array operations whatever the
+# number of assets. numpy and pandas are imported on first use, not at startup.
+
+# Usage per asset in the window. first_seen is set for assets created inside it,
+# whose usage is spread over their own age instead of the whole window.
+USAGE_QUERY = register_query('forecast.usage', """
+    SELECT
+        asset_id,
+        CAST(-SUM(LEAST(stock_delta, 0)) AS SIGNED) AS used,
+        MIN(CASE WHEN kind = 'insert' THEN recorded_at END) AS first_seen
+    FROM stock_movements
+    WHERE recorded_at >= %s AND kind <> 'delete'
+    GROUP BY asset_id
+""", ('2024-01-01',))
+
+STOCK_QUERY = register_query('forecast.stock', """
+    SELECT a.id, a.name, a.resource_id, r.name, r.section, a.stock_count - a.deduction
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+""", allow_full_scan=True)
+
+STOCK_COLUMNS = ['asset_id', 'asset_name', 'resource_id', 'resource_name', 'section', 'net_stock']
+USAGE_COLUMNS = ['asset_id', 'used', 'first_seen']
+
+# Usage seen over less than a day is extrapolated as if it took a day
+MIN_SPAN_DAYS = 1.0
+
+
+def load(cursor, now, window_days):
+    import pandas as pd
+
+    cursor.execute(STOCK_QUERY)
+    stock = pd.DataFrame.from_records(cursor.fetchall(), columns=STOCK_COLUMNS)
+    cursor.execute(USAGE_QUERY, (now - timedelta(days=window_days),))
+    usage = pd.DataFrame.from_records(cursor.fetchall(), columns=USAGE_COLUMNS)
+    return stock, usage
+
+
+def compute(stock, usage, now, window_days):
+    """Return one row per asset, soonest stock-out first.
+
+    Adds used, daily_usage, days_left (0 when already out, inf when nothing is being
+    used) and stockout_at (NaT when days_left is inf).
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = stock.merge(usage, on='asset_id', how='left')
+    used = frame['used'].fillna(0).to_numpy(dtype='float64')
+    net_stock = frame['net_stock'].to_numpy(dtype='float64')
+
+    window_start = np.datetime64(now - timedelta(days=window_days), 'us')
+    since = pd.to_datetime(frame['first_seen']).to_numpy(dtype='datetime64[us]')
+    since = np.where(np.isnat(since), window_start, np.maximum(since, window_start))
+    span_days = (np.datetime64(now, 'us') - since) / np.timedelta64(1, 'D')
+    daily_usage = used / np.maximum(span_days, MIN_SPAN_DAYS)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.where(net_stock <= 0, 0.0,
+                             np.where(daily_usage > 0, net_stock / daily_usage, np.inf))
+
+    frame['used'] = used.astype('int64')
+    frame['daily_usage'] = daily_usage
+    frame['days_left'] = days_left
+    finite = np.isfinite(days_left)
+    seconds = np.where(finite, days_left * 86400, 0).astype('int64')
+    frame['stockout_at'] = np.where(finite, np.datetime64(now, 's') + seconds.astype('timedelta64[s]'),
+                                    np.datetime64('NaT'))
+    frame = frame.drop(columns=['first_seen'])
+    return frame.sort_values(['days_left', 'asset_id'], kind='stable').reset_index(drop=True)
+
+
+def summary(frame):
+    import numpy as np
+
+    days_left = frame['days_left'].to_numpy()
+    return {
+        'assets': int(len(frame)),
+        'stockedOut': int((days_left == 0).sum()),
+        'within7Days': int((days_left <= 7).sum()),
+        'within30Days': int((days_left <= 30).sum()),
+        'notInUse': int(np.isinf(days_left).sum()),
+    }
+
+
+def select(frame, section=None, resource_id=None, within=None):
+    import numpy as np
+
+    mask = np.ones(len(frame), dtype=bool)
+    if section:
+        mask &= (frame['section'] == section).to_numpy()
+    if resource_id is not None:
+        mask &= (frame['resource_id'] == resource_id).to_numpy()
+    if within is not None:
+        mask &= (frame['days_left'] <= within).to_numpy()
+    return frame[mask]
+
+
+def items(frame):
+    import numpy as np
+
+    # Only the returned page is converted to Python objects
+    days_left = frame['days_left'].to_numpy()
+    finite = np.isfinite(days_left)
+    stockout = frame['stockout_at'].dt.strftime('%Y-%m-%d').to_numpy()
+    return [{
+        'assetId': int(asset_id),
+        'assetName': asset_name,
+        'resourceId': int(resource_id),
+        'resourceName': resource_name,
+        'section': section,
+        'netStock': int(net_stock),
+        'usedInWindow': int(used),
+        'dailyUsage': round(float(daily_usage), 3),
+        'daysUntilStockout': round(float(days), 1) if is_finite else None,
+        'stockoutDate': stockout_date if is_finite else None,
+    } for asset_id, asset_name, resource_id, resource_name, section, net_stock, used, daily_usage, days,
+        is_finite, stockout_date in zip(
+            frame['asset_id'], frame['asset_name'], frame['resource_id'], frame['resource_name'],
+            frame['section'], frame['net_stock'], frame['used'], frame['daily_usage'], days_left, finite,
+            stockout)]
@@ -0,0 +1,10 @@
+# Entry point for the cooperative serving mode:
+#   gunicorn -w 4 -k gevent --worker-connections 1000 gevent_app:app
+# The patching has to happen before the app (and MySQLdb) is imported.
+import cooperative
+
+cooperative.install()
+
+from app import create_app  # noqa: E402
+
+app = create_app()
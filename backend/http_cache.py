@@ -0,0 +1,91 @@
+import functools
+import gzip
+import hashlib
+
+from flask import current_app, request
+
+from db import mysql
+import table_versions
+
+try:
+    import brotli
+except ImportError:  # optional: responses fall back to gzip
+    brotli = None
+
+# Conditional GET and response compression for the JSON read endpoints.
+#
+# @versioned('assets', ...) derives a weak ETag from the table_versions rows of the
+# tables a view reads. A client whose If-None-Match still matches gets a 304 before
+# the view runs, so no SQL beyond the version lookup and no JSON serialization happen
+# for unchanged data. There is no Last-Modified: its one-second resolution cannot
+# tell apart writes within the same second, so If-Modified-Since could 304 stale data.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv'}
+
+
+def versioned(*tables):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            cursor = mysql.connection.cursor()
+            versions = table_versions.current(cursor, tables)
+            cursor.close()
+
+            # The URL is part of the tag: every page/filter of a list is its own resource
+            stamp = ':'.join(f'{table}={versions[table]}' for table in tables)
+            etag = hashlib.sha1(f'{request.full_path}|{stamp}'.encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapped
+    return decorator
+
+
+def _encoding():
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response):
+    # after_request hook: compress buffered bodies above COMPRESS_MIN_SIZE with the
+    # best encoding the client accepts. Streamed responses are left alone.
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = _encoding()
+    if encoding == 'br':
+        body = brotli.compress(body, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    elif encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=current_app.config['COMPRESS_LEVEL'])
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The body bytes differ per encoding, so a strong validator can no longer be strong
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+    app.after_request(compress_response)
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Uploaded images are stored under the SHA-256 of their content, so identical uploads
+# share one file and a stored file never changes. Resized WebP variants are written
+# next to the original as <hash>.<variant>.webp.
+HASHED_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z0-9.]+$')
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+SWEEP_CHUNK = 1000
+
+
+def is_content_addressed(filename):
+    # True for originals and their variants
+    return HASHED_NAME.match(filename) is not None
+
+
+def variant_name(filename, variant):
+    return f"{filename.rsplit('.', 1)[0]}.{variant}.webp"
+
+
+# Multipart parts are written straight to a temp file in UPLOAD_FOLDER as they arrive,
+# hashed on the way, so an upload is never held in memory or copied a second time.
+# Oversized bodies are refused from Content-Length before anything is read, and a
+# part without one is cut off as soon as it passes UPLOAD_MAX_SIZE.
+MULTIPART_OVERHEAD = 64 * 1024  # Boundaries and the other form fields
+
+
+class UploadStream:
+    def __init__(self, folder, limit):
+        self.limit = limit
+        self.size = 0
+        self.digest = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(dir=folder, suffix='.upload')
+        self.file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.limit is not None and self.size > self.limit:
+            raise RequestEntityTooLarge(f'Uploads are limited to {self.limit} bytes')
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # read/seek/tell for the parser and FileStorage
+        return getattr(self.file, name)
+
+    def claim(self, path):
+        # Move the finished upload to `path` (dropping it if identical content is there)
+        self.file.close()
+        if not keep_existing(path):
+            os.replace(self.path, path)
+        else:
+            os.remove(self.path)
+        self.path = None
+
+    def close(self):
+        # Runs when the request ends; removes parts nobody claimed
+        self.file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+def keep_existing(path):
+    # Reuse a stored copy of the same content; touching it restarts the sweep's grace period
+    # so the file outlives the INSERT that is about to reference it
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class UploadRequest(Request):
+    @property
+    def max_content_length(self):
+        if self.mimetype == 'multipart/form-data':
+            return current_app.config['UPLOAD_MAX_SIZE'] + MULTIPART_OVERHEAD
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = UploadStream(current_app.config['UPLOAD_FOLDER'], current_app.config['UPLOAD_MAX_SIZE'])
+        # Kept here too: a part cut off by the limit or a disconnect never reaches request.files
+        self.__dict__.setdefault('upload_streams', []).append(stream)
+        return stream
+
+    def close(self):
+        super().close()
+        for stream in self.__dict__.get('upload_streams', ()):
+            stream.close()
+
+
+def store_upload(file, folder, variants):
+    # allowed_file has checked the extension; secure_filename would drop non-ASCII stems with the dot
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    if isinstance(file.stream, UploadStream):
+        filename = f'{file.stream.digest.hexdigest()}.{extension}'
+        file.stream.claim(os.path.join(folder, filename))
+        generate_variants(folder, filename, variants)
+        return filename
+
+    # Hash while copying the upload to a temp file, then move it into place under its digest
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        filename = f'{digest.hexdigest()}.{extension}'
+        path = os.path.join(folder, filename)
+        if not keep_existing(path):
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    generate_variants(folder, filename, variants)
+    return filename
+
+
+def generate_variants(folder, filename, variants):
+    missing = {variant: width for variant, width in variants.items()
+               if not os.path.exists(os.path.join(folder, variant_name(filename, variant)))}
+    if not missing:
+        return
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning('Pillow is not installed; serving original images only')
+        return
+
+    try:
+        with Image.open(os.path.join(folder, filename)) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA')
+            for variant, width in missing.items():
+                image = original.copy()
+                image.thumbnail((width, width))
+                fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.webp')
+                with os.fdopen(fd, 'wb') as out:
+                    image.save(out, 'WEBP', quality=80, method=4)
+                os.replace(tmp_path, os.path.join(folder, variant_name(filename, variant)))
+    except Exception as e:
+        logger.warning(f'Could not create variants for {filename}: {str(e)}')
+
+
+def sweep_unreferenced(cursor, folder, variants, grace):
+    """Remove stored images no resource points at, with their variants.
+
+    Files are left alone until they are `grace` seconds old, so an upload whose INSERT has
+    not committed yet (or that just reused an existing file) is never swept. Returns the
+    names of the removed originals.
+    """
+    cutoff = time.time() - grace
+    candidates = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and is_content_addressed(entry.name) and entry.name.count('.') == 1:
+            if entry.stat().st_mtime < cutoff:
+                candidates.append(entry.name)
+
+    removed = []
+    for start in range(0, len(candidates), SWEEP_CHUNK):
+        chunk = candidates[start:start + SWEEP_CHUNK]
+        cursor.execute(f"SELECT DISTINCT image_path FROM resources WHERE image_path IN ({', '.join(['%s'] * len(chunk))})",
+                       chunk)
+        referenced = {row[0] for row in cursor.fetchall()}
+        for filename in chunk:
+            if filename in referenced:
+                continue
+            # Checked again after the query: an upload may have reused the file meanwhile
+            try:
+                if os.stat(os.path.join(folder, filename)).st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            for name in [variant_name(filename, variant) for variant in variants] + [filename]:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except FileNotFoundError:
+                    pass
+            removed.append(filename)
+    return removed
@@ -0,0 +1,134 @@
+from flask import current_app
+
+from db import register_query
+
+# Assets below their reorder threshold (low_stock_assets), kept in step with the
+# assets table by the write endpoints so the dashboard reads an indexed list instead
+# of scanning and sorting every asset. An asset's threshold is its own
+# reorder_threshold, else its section's (section_thresholds), else LOW_STOCK_THRESHOLD.
+
+REFRESH_QUERY = """
+    INSERT INTO low_stock_assets (asset_id, resource_id, section, stock_count, threshold)
+    SELECT a.id, a.resource_id, r.section, a.stock_count,
+           COALESCE(a.reorder_threshold, st.threshold, %s)
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    LEFT JOIN section_thresholds st ON st.section = r.section
+    WHERE {where} AND a.stock_count < COALESCE(a.reorder_threshold, st.threshold, %s)
+"""
+
+# Both page queries walk (section,) stock_count, asset_id in index order; the
+# asset/resource details are joined for the returned page only.
+PAGE_QUERY = """
+    SELECT
+        l.asset_id AS id,
+        r.name AS resource_name,
+        a.name AS asset_name,
+        l.stock_count,
+        l.threshold,
+        a.date AS last_updated,
+        l.section
+    FROM low_stock_assets l
+    JOIN assets a ON a.id = l.asset_id
+    JOIN resources r ON r.id = l.resource_id
+    WHERE {where}
+    ORDER BY l.stock_count, l.asset_id
+"""
+register_query('low_stock.page', PAGE_QUERY.format(where='(l.stock_count, l.asset_id) > (%s, %s)') + ' LIMIT 5',
+               (-1, 0))
+register_query('low_stock.section_page',
+               PAGE_QUERY.format(where='l.section = %s AND (l.stock_count, l.asset_id) > (%s, %s)') + ' LIMIT 5',
+               ('ICU', -1, 0))
+register_query('low_stock.refresh_resources', REFRESH_QUERY.format(where='a.resource_id IN (%s)'), (10, 1, 10))
+
+
+def default_threshold():
+    return current_app.config['LOW_STOCK_THRESHOLD']
+
+
+def _refresh(cursor, delete_where, where, params):
+    # Drop the affected rows, then re-add the ones that are still below threshold.
+    # Runs inside the caller's write transaction.
+    threshold = default_threshold()
+    cursor.execute(f'DELETE FROM low_stock_assets WHERE {delete_where}', params)
+    cursor.execute(REFRESH_QUERY.format(where=where), [threshold] + list(params) + [threshold])
+
+
+def _in_clause(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def refresh_assets(cursor, asset_ids):
+    # Call after inserting, updating or deleting assets
+    if asset_ids:
+        ids = list(asset_ids)
+        _refresh(cursor, f'asset_id IN ({_in_clause(ids)})', f'a.id IN ({_in_clause(ids)})', ids)
+
+
+def refresh_resources(cursor, resource_ids):
+    # Call after bulk asset writes and after a resource's section changes or it is deleted
+    if resource_ids:
+        ids = list(resource_ids)
+        _refresh(cursor, f'resource_id IN ({_in_clause(ids)})', f'a.resource_id IN ({_in_clause(ids)})', ids)
+
+
+def refresh_section(cursor, section):
+    # Call after a section threshold changes
+    _refresh(cursor, 'section = %s', 'r.section = %s', [section])
+
+
+def backfill(cursor):
+    # Rebuild the whole list, e.g. after deploying or changing LOW_STOCK_THRESHOLD
+    cursor.execute('DELETE FROM low_stock_assets')
+    cursor.execute(REFRESH_QUERY.format(where='1 = 1'), (default_threshold(), default_threshold()))
+    return cursor.rowcount
+
+
+def parse_after(value):
+    # Keyset cursor "<stockCount>:<id>" from a previous page's nextAfter
+    if not value:
+        return -2 ** 31, 0
+    stock_count, asset_id = value.split(':')
+    return int(stock_count), int(asset_id)
+
+
+def page(cursor, section=None, after=None, limit=None):
+    """Return (items, next_after) ordered by stock count, lowest first.
+
+    limit=None returns the whole list. next_after is None on the last page.
+    """
+    where = ['(l.stock_count, l.asset_id) > (%s, %s)']
+    params = list(after or parse_after(None))
+    if section:
+        where.insert(0, 'l.section = %s')
+        params.insert(0, section)
+
+    query = PAGE_QUERY.format(where=' AND '.join(where))
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit + 1)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = f"{rows[-1]['stock_count']}:{rows[-1]['id']}"
+
+    return [{
+        'id': item['id'],
+        'resourceName': item['resource_name'],
+        'assetName': item['asset_name'],
+        'stockCount': item['stock_count'],
+        'threshold': item['threshold'],
+        'lastUpdated': item['last_updated'].strftime('%Y-%m-%d'),
+        'section': item['section']
+    } for item in rows], next_after
+
+
+def count(cursor, section=None):
+    if section:
+        cursor.execute('SELECT COUNT(*) AS total FROM low_stock_assets WHERE section = %s', (section,))
+    else:
+        cursor.execute('SELECT COUNT(*) AS total FROM low_stock_assets')
+    return cursor.fetchone()['total']
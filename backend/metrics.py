@@ -0,0 +1,314 @@
+import bisect
+import contextlib
+import logging
+import re
+import threading
+import time
+
+from flask import Blueprint, Response, g, has_request_context, request
+from MySQLdb.connections import Connection
+
+# In-process metrics in the Prometheus text format, served at /metrics:
+# request latency per route, SQL time per statement and the report rendering stages.
+# Every gunicorn worker keeps its own numbers, so scrape the workers individually
+# (or run one per container) rather than through a load balancer.
+
+bp = Blueprint('metrics', __name__)
+
+slow_query_logger = logging.getLogger('hams.slow_query')
+
+REGISTRY = []
+COLLECTORS = []
+
+# Prometheus' default buckets, plus finer ones for single statements and coarser
+# ones for PDF rendering
+REQUEST_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0)
+QUERY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (.01, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Label values beyond this many series per metric are folded into "other"
+MAX_SERIES = 500
+
+settings = {'slow_query_threshold': None}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.series = {}
+        REGISTRY.append(self)
+
+    def _series(self, labels):
+        # Caller holds the lock
+        series = self.series.get(labels)
+        if series is None:
+            if len(self.series) >= MAX_SERIES:
+                labels = ('other',) * len(self.labelnames)
+                series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = self._new_series()
+        return series
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            series = [(labels, list(values)) for labels, values in sorted(self.series.items())]
+        for labels, values in series:
+            lines.extend(self._render_series(labels, values))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_series(self):
+        return [0]
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self._series(labels)[0] += amount
+
+    def _render_series(self, labels, values):
+        return [f'{self.name}{_labels(self.labelnames, labels)} {_format(values[0])}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self):
+        # One count per bucket (not cumulative), then sum and count
+        return [0] * len(self.buckets) + [0.0, 0]
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self._series(labels)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _render_series(self, labels, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, values):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", _format(bound))])} '
+                         f'{cumulative}')
+        lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {values[-1]}')
+        lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_format(values[-2])}')
+        lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {values[-1]}')
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for collect in COLLECTORS:
+        lines.extend(collect())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_SECONDS = Histogram('hams_http_request_duration_seconds',
+                            'Handler plus after_request time, compression included '
+                            '(streamed bodies are sent afterwards and not counted)',
+                            ['method', 'route'])
+REQUESTS = Counter('hams_http_requests_total', 'Responses by route and status', ['method', 'route', 'status'])
+QUERY_SECONDS = Histogram('hams_db_query_duration_seconds', 'cursor.execute time by statement',
+                          ['statement'], buckets=QUERY_BUCKETS)
+QUERY_ERRORS = Counter('hams_db_query_errors_total', 'Statements that raised', ['statement'])
+SLOW_QUERIES = Counter('hams_db_slow_queries_total', 'Statements slower than SLOW_QUERY_LOG_THRESHOLD',
+                       ['statement'])
+
+
+# Statements
+# Registered queries (db.register_query) are labelled by name, anything else by its
+# text with literals and IN/VALUES lists collapsed
+STATEMENT_NAMES = {}
+_normalized = {}
+
+LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b|%s")
+IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+VALUES_LIST = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+
+
+def name_statement(sql, name):
+    STATEMENT_NAMES[sql] = name
+
+
+def statement_label(sql):
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    name = STATEMENT_NAMES.get(sql)
+    if name:
+        return name
+    label = _normalized.get(sql)
+    if label is None:
+        label = ' '.join(sql.split())
+        label = LITERALS.sub('?', label)
+        label = IN_LIST.sub('(...)', label)
+        label = VALUES_LIST.sub(r'\1, ...', label)
+        label = label[:200]
+        if len(_normalized) > 4096:
+            _normalized.clear()
+        _normalized[sql] = label
+    return label
+
+
+def observe_query(sql, elapsed, failed=False):
+    label = statement_label(sql)
+    QUERY_SECONDS.observe(elapsed, label)
+    if failed:
+        QUERY_ERRORS.inc(label)
+    threshold = settings['slow_query_threshold']
+    if threshold is not None and elapsed >= threshold:
+        SLOW_QUERIES.inc(label)
+        route = request.path if has_request_context() else '-'
+        # Statement text only: parameters can hold emails and password hashes
+        slow_query_logger.warning('%.3fs %s [%s]', elapsed, label, route)
+
+
+class TimedCursorMixin:
+    _timing = False
+
+    def _timed(self, method, query, args):
+        # executemany runs execute() per row for non-INSERT statements; time the outer call only
+        if self._timing:
+            return method(query, args)
+        self._timing = True
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = method(query, args)
+            failed = False
+            return result
+        finally:
+            self._timing = False
+            observe_query(query, time.perf_counter() - started, failed)
+
+    def execute(self, query, args=None):
+        return self._timed(super().execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(super().executemany, query, args)
+
+
+_timed_cursor_classes = {}
+
+
+def timed_cursor_class(cursor_class):
+    timed = _timed_cursor_classes.get(cursor_class)
+    if timed is None:
+        timed = _timed_cursor_classes[cursor_class] = type(
+            f'Timed{cursor_class.__name__}', (TimedCursorMixin, cursor_class), {})
+    return timed
+
+
+class TimedConnection(Connection):
+    # Every cursor, whatever cursorclass the caller asks for, reports its statements
+    def cursor(self, cursorclass=None):
+        return super().cursor(timed_cursor_class(cursorclass or self.cursorclass))
+
+
+# Requests
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route)
+        REQUESTS.inc(request.method, route, str(response.status_code))
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_QUERY_LOG_THRESHOLD', None)
+    settings['slow_query_threshold'] = app.config['SLOW_QUERY_LOG_THRESHOLD']
+
+    app.before_request(start_timer)
+    app.after_request(record_request)
+
+    def pool_metrics():
+        stats = app.extensions['mysql'].stats()
+        return [
+            '# HELP hams_db_pool_connections Pooled MySQL connections in this process',
+            '# TYPE hams_db_pool_connections gauge',
+            f'hams_db_pool_connections{{state="open"}} {stats["open"]}',
+            f'hams_db_pool_connections{{state="idle"}} {stats["idle"]}',
+            f'hams_db_pool_connections{{state="in_use"}} {stats["inUse"]}',
+            '# HELP hams_db_pool_waits_total Checkouts that had to wait for a connection',
+            '# TYPE hams_db_pool_waits_total counter',
+            f'hams_db_pool_waits_total {stats["waits"]}',
+            '# HELP hams_db_pool_timeouts_total Checkouts that gave up after MYSQL_POOL_TIMEOUT',
+            '# TYPE hams_db_pool_timeouts_total counter',
+            f'hams_db_pool_timeouts_total {stats["timeouts"]}',
+            '# HELP hams_db_pool_wait_seconds_total Time spent waiting for a connection',
+            '# TYPE hams_db_pool_wait_seconds_total counter',
+            f'hams_db_pool_wait_seconds_total {stats["waitSeconds"]}',
+        ]
+
+    def replica_metrics():
+        replicas = app.extensions.get('mysql_replicas')
+        if not replicas:
+            return []
+        lines = [
+            '# HELP hams_db_replica_healthy Whether the replica passed its last lag/connection check',
+            '# TYPE hams_db_replica_healthy gauge',
+        ]
+        stats = replicas.stats()
+        for replica in stats:
+            lines.append(f'hams_db_replica_healthy{_labels(["replica"], [replica["replica"]])} '
+                         f'{1 if replica["healthy"] else 0}')
+        lines += [
+            '# HELP hams_db_replica_lag_seconds Replication lag at the last check',
+            '# TYPE hams_db_replica_lag_seconds gauge',
+        ]
+        for replica in stats:
+            if replica['lag'] is not None:
+                lines.append(f'hams_db_replica_lag_seconds{_labels(["replica"], [replica["replica"]])} '
+                             f'{replica["lag"]}')
+        return lines
+    COLLECTORS[:] = [pool_metrics, replica_metrics]
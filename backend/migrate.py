@@ -0,0 +1,126 @@
+import os
+import re
+import sys
+
+import click
+import MySQLdb
+from flask.cli import AppGroup
+from MySQLdb.cursors import DictCursor
+
+from db import mysql, QUERY_REGISTRY
+
+# Versioned schema migrations: migrations/NNNN_name.sql files applied in order and
+# recorded in schema_migrations. Run with `flask --app app db upgrade`.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+UNIQUE_INDEX = re.compile(r'^CREATE UNIQUE INDEX \w+ ON (\w+) \(([\w, ]+)\)', re.IGNORECASE)
+
+# Objects that already exist in databases created by hand before migrations existed
+ALREADY_APPLIED_ERRORS = {
+    1050: 'table already exists',
+    1060: 'column already exists',
+    1061: 'index already exists',
+    1359: 'trigger already exists',
+}
+
+db_cli = AppGroup('db', help='Schema migrations and query plan checks.')
+
+
+def available_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in '\n'.join(lines).split(';') if statement.strip()]
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT NOT NULL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+
+def duplicate_keys(cursor, statement, limit=20):
+    # Rows that would make a CREATE UNIQUE INDEX fail with 1062, as (columns, [(key..., count)])
+    match = UNIQUE_INDEX.match(statement)
+    if not match:
+        return None, []
+    table, columns = match.group(1), match.group(2)
+    cursor.execute(f'SELECT {columns}, COUNT(*) FROM {table} GROUP BY {columns} '
+                   f'HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC LIMIT {limit}')
+    return f'{table} ({columns})', cursor.fetchall()
+
+
+@db_cli.command('upgrade')
+def upgrade():
+    """Apply all pending migrations."""
+    cursor = mysql.connection.cursor()
+    applied = applied_versions(cursor)
+    pending = [migration for migration in available_migrations() if migration[0] not in applied]
+    if not pending:
+        click.echo('Schema is up to date')
+
+    for version, name, path in pending:
+        click.echo(f'Applying {version:04d}_{name}')
+        with open(path, encoding='utf-8') as f:
+            statements = split_statements(f.read())
+        for statement in statements:
+            key, duplicates = duplicate_keys(cursor, statement)
+            if duplicates:
+                click.echo(f'  {statement.splitlines()[0]}')
+                click.echo(f'  cannot be applied: {key} has duplicate values:')
+                for row in duplicates:
+                    click.echo(f"    {', '.join(repr(value) for value in row[:-1])} ({row[-1]} rows)")
+                click.echo(f'Merge or remove the duplicate rows, then run `db upgrade` again; the statements '
+                           f'of {version:04d}_{name} that already ran are skipped.')
+                sys.exit(1)
+            try:
+                cursor.execute(statement)
+            except MySQLdb.OperationalError as e:
+                if e.args[0] not in ALREADY_APPLIED_ERRORS:
+                    raise
+                click.echo(f'  skipped ({ALREADY_APPLIED_ERRORS[e.args[0]]}): {statement.splitlines()[0]}')
+        cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (version, name))
+        mysql.connection.commit()
+    cursor.close()
+
+
+@db_cli.command('status')
+def status():
+    """List migrations and whether they have been applied."""
+    cursor = mysql.connection.cursor()
+    applied = applied_versions(cursor)
+    cursor.close()
+    for version, name, _ in available_migrations():
+        click.echo(f"{'applied' if version in applied else 'pending':8} {version:04d}_{name}")
+
+
+@db_cli.command('check')
+def check():
+    """EXPLAIN every registered query and flag full table scans."""
+    cursor = mysql.connection.cursor(cursorclass=DictCursor)
+    full_scans = 0
+    for name, (sql, params, allow_full_scan) in sorted(QUERY_REGISTRY.items()):
+        cursor.execute('EXPLAIN ' + sql, params)
+        for row in cursor.fetchall():
+            scan = row['type'] == 'ALL' and not allow_full_scan
+            full_scans += scan
+            click.echo(f"{'FULL SCAN' if scan else 'ok':9} {name:32} table={row['table']} type={row['type']} "
+                       f"key={row['key']} rows={row['rows']}")
+    cursor.close()
+
+    if full_scans:
+        click.echo(f'{full_scans} full table scan(s) found')
+        sys.exit(1)
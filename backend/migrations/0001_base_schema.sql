@@ -0,0 +1,37 @@
+-- Core tables. IF NOT EXISTS lets existing hand-made databases adopt this history.
+CREATE TABLE IF NOT EXISTS userss (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    first_name VARCHAR(100) NOT NULL,
+    last_name VARCHAR(100) NOT NULL,
+    date_of_birth DATE NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    position VARCHAR(100) NOT NULL,
+    id_number VARCHAR(50) NOT NULL,
+    phone_number VARCHAR(30) NOT NULL,
+    password VARCHAR(255) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS resources (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    section VARCHAR(255) NOT NULL,
+    image_path VARCHAR(255) NULL
+);
+
+CREATE TABLE IF NOT EXISTS assets (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    resource_id INT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    stock_count INT NOT NULL DEFAULT 0,
+    deduction INT NOT NULL DEFAULT 0,
+    date DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS deleted_assets (
+    id INT NOT NULL PRIMARY KEY,
+    resource_id INT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    stock_count INT NOT NULL DEFAULT 0,
+    deduction INT NOT NULL DEFAULT 0,
+    date DATE NOT NULL
+);
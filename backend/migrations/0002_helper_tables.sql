@@ -0,0 +1,24 @@
+-- Daily stock totals maintained by the asset write paths (see stock_rollup.py).
+-- Populate once with: flask --app app backfill-stock-rollup
+CREATE TABLE IF NOT EXISTS asset_daily_stock (
+    day DATE NOT NULL PRIMARY KEY,
+    total_assets BIGINT NOT NULL DEFAULT 0,
+    asset_count INT NOT NULL DEFAULT 0
+);
+
+-- Per-table change counters bumped by every write (see table_versions.py)
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(64) NOT NULL PRIMARY KEY,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+);
+
+-- Login sessions referenced by signed tokens (see auth.py)
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id CHAR(32) NOT NULL PRIMARY KEY,
+    user_id INT NOT NULL,
+    created_at DATETIME NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NULL,
+    INDEX idx_user_sessions_user (user_id)
+);
@@ -0,0 +1,25 @@
+-- Indexes backing the hot endpoint queries; `flask --app app db check` verifies them.
+
+-- /api/login, /signup
+CREATE UNIQUE INDEX uk_userss_email ON userss (email);
+CREATE UNIQUE INDEX uk_userss_id_number ON userss (id_number);
+
+-- /reports/types, /reports/* (join on r.name), image reference counting
+CREATE INDEX idx_resources_name ON resources (name);
+CREATE INDEX idx_resources_image_path ON resources (image_path);
+
+-- /api/resources/<id>/assets: InnoDB appends the primary key, so this also serves
+-- "resource_id = ? AND id > ? ORDER BY id" keyset pages
+CREATE INDEX idx_assets_resource ON assets (resource_id);
+
+-- /reports/*: covers the date-range report without touching the clustered index
+CREATE INDEX idx_assets_resource_date ON assets (resource_id, date, name, stock_count, deduction);
+
+-- /assets/search, /assets/download
+CREATE INDEX idx_assets_name ON assets (name);
+
+-- /api/dashboard/low-stock
+CREATE INDEX idx_assets_stock_count ON assets (stock_count);
+
+-- /api/recent-updates
+CREATE INDEX idx_assets_date ON assets (date);
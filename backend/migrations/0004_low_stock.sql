@@ -0,0 +1,23 @@
+-- Reorder thresholds: a per-asset override, else the section's, else LOW_STOCK_THRESHOLD
+ALTER TABLE assets ADD COLUMN reorder_threshold INT NULL;
+
+CREATE TABLE IF NOT EXISTS section_thresholds (
+    section VARCHAR(255) NOT NULL PRIMARY KEY,
+    threshold INT NOT NULL
+);
+
+-- Assets currently below their threshold, maintained by the asset write paths (see
+-- low_stock.py). Populate once with: flask --app app backfill-low-stock
+CREATE TABLE IF NOT EXISTS low_stock_assets (
+    asset_id INT NOT NULL PRIMARY KEY,
+    resource_id INT NOT NULL,
+    section VARCHAR(255) NOT NULL,
+    stock_count INT NOT NULL,
+    threshold INT NOT NULL,
+    INDEX idx_low_stock_order (stock_count, asset_id),
+    INDEX idx_low_stock_section (section, stock_count, asset_id),
+    INDEX idx_low_stock_resource (resource_id)
+);
+
+-- Refreshing a section's assets looks resources up by section
+CREATE INDEX idx_resources_section ON resources (section);
@@ -0,0 +1,9 @@
+-- Change feed written by the asset/resource write paths and streamed to dashboards
+-- over SSE (see change_feed.py). Old rows are pruned after CHANGE_FEED_RETENTION.
+CREATE TABLE IF NOT EXISTS change_events (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    event_type VARCHAR(32) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_change_events_created (created_at)
+);
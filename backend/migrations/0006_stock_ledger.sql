@@ -0,0 +1,66 @@
+-- Append-only stock history (see stock_ledger.py). The triggers below record every
+-- insert, stock change and delete on assets, whichever code path makes it. With
+-- binary logging enabled, creating triggers needs SUPER or
+-- log_bin_trust_function_creators=1 for the migrating user.
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    asset_id INT NOT NULL,
+    resource_id INT NOT NULL,
+    kind ENUM('insert', 'update', 'delete') NOT NULL,
+    -- The asset's values after the change; NULL for deletes
+    stock_count INT NULL,
+    deduction INT NULL,
+    asset_date DATE NULL,
+    -- Change in net stock (stock_count - deduction)
+    stock_delta INT NOT NULL,
+    recorded_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_stock_movements_asset (asset_id, id),
+    INDEX idx_stock_movements_recorded (recorded_at)
+);
+
+-- Compacted state: every asset's values as of the snapshot's last movement
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    last_movement_id BIGINT UNSIGNED NOT NULL,
+    taken_at DATETIME(6) NOT NULL,
+    asset_count INT NOT NULL DEFAULT 0,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_stock_snapshots_taken (taken_at)
+);
+
+CREATE TABLE IF NOT EXISTS stock_snapshot_rows (
+    snapshot_id INT NOT NULL,
+    asset_id INT NOT NULL,
+    resource_id INT NOT NULL,
+    stock_count INT NOT NULL,
+    deduction INT NOT NULL,
+    asset_date DATE NOT NULL,
+    PRIMARY KEY (snapshot_id, asset_id),
+    INDEX idx_stock_snapshot_rows_resource (snapshot_id, resource_id)
+);
+
+CREATE TRIGGER assets_ledger_insert AFTER INSERT ON assets FOR EACH ROW
+    INSERT INTO stock_movements (asset_id, resource_id, kind, stock_count, deduction, asset_date, stock_delta)
+    VALUES (NEW.id, NEW.resource_id, 'insert', NEW.stock_count, NEW.deduction, NEW.date,
+            NEW.stock_count - NEW.deduction);
+
+-- Renames and threshold changes are not stock movements
+CREATE TRIGGER assets_ledger_update AFTER UPDATE ON assets FOR EACH ROW
+    INSERT INTO stock_movements (asset_id, resource_id, kind, stock_count, deduction, asset_date, stock_delta)
+    SELECT NEW.id, NEW.resource_id, 'update', NEW.stock_count, NEW.deduction, NEW.date,
+           (NEW.stock_count - NEW.deduction) - (OLD.stock_count - OLD.deduction)
+    FROM DUAL
+    WHERE NOT (NEW.stock_count <=> OLD.stock_count AND NEW.deduction <=> OLD.deduction
+               AND NEW.date <=> OLD.date AND NEW.resource_id <=> OLD.resource_id);
+
+CREATE TRIGGER assets_ledger_delete AFTER DELETE ON assets FOR EACH ROW
+    INSERT INTO stock_movements (asset_id, resource_id, kind, stock_delta)
+    VALUES (OLD.id, OLD.resource_id, 'delete', -(OLD.stock_count - OLD.deduction));
+
+-- Opening balance for assets that predate the ledger. Runs after the triggers exist,
+-- so a write racing the migration is recorded before this row and this row (the
+-- later one) still reflects it.
+INSERT INTO stock_movements (asset_id, resource_id, kind, stock_count, deduction, asset_date, stock_delta)
+SELECT id, resource_id, 'insert', stock_count, deduction, date, stock_count - deduction
+FROM assets
+ORDER BY id;
@@ -0,0 +1,25 @@
+-- Soft-deleted assets keep their threshold and deletion time so they can be restored,
+-- and are moved to deleted_assets_archive once old (see asset_archive.py).
+-- Rows deleted before this migration get the time it ran.
+ALTER TABLE deleted_assets ADD COLUMN reorder_threshold INT NULL;
+ALTER TABLE deleted_assets ADD COLUMN deleted_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX idx_deleted_assets_deleted ON deleted_assets (deleted_at, id);
+
+-- Archive partitioned by month of deletion. archive-deleted-assets adds the monthly
+-- partitions as it goes; expired months are exported and dropped whole.
+CREATE TABLE IF NOT EXISTS deleted_assets_archive (
+    id INT NOT NULL,
+    resource_id INT NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    stock_count INT NOT NULL DEFAULT 0,
+    deduction INT NOT NULL DEFAULT 0,
+    date DATE NOT NULL,
+    reorder_threshold INT NULL,
+    deleted_at DATETIME NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, deleted_at)
+)
+PARTITION BY RANGE (TO_DAYS(deleted_at)) (
+    PARTITION p_old VALUES LESS THAN (TO_DAYS('2000-01-01')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
+)
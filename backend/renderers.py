@@ -0,0 +1,220 @@
+import datetime
+import html
+import importlib.util
+import logging
+import os
+import shutil
+import threading
+import zlib
+
+# PDF renderers for reports. Nothing heavy is imported until a PDF is actually
+# rendered: workers that only serve JSON never load pandas or a PDF engine.
+#
+# REPORT_PDF_RENDERER picks one by name; "auto" takes the first available in
+# registration order: wkhtmltopdf (pdfkit + the binary), WeasyPrint, then the
+# built-in writer, which needs nothing outside the standard library.
+# register() adds more.
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {}
+_chosen = {}
+_chosen_lock = threading.Lock()
+
+# Searched when WKHTMLTOPDF_PATH is not set and wkhtmltopdf is not on PATH
+WKHTMLTOPDF_CANDIDATES = (
+    '/usr/local/bin/wkhtmltopdf',
+    '/usr/bin/wkhtmltopdf',
+    '/opt/homebrew/bin/wkhtmltopdf',
+    r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe',
+)
+
+
+def register(renderer):
+    RENDERERS[renderer.name] = renderer
+    return renderer
+
+
+def _installed(module):
+    # Finds the package without importing it
+    return importlib.util.find_spec(module) is not None
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def table_html(data, columns, stages):
+    # pandas' table markup when pandas is installed (as reports always looked),
+    # otherwise the same table built by hand
+    if _installed('pandas'):
+        import pandas as pd
+
+        with stages.time('dataframe'):
+            df = pd.DataFrame(data, columns=columns)
+        with stages.time('html'):
+            return df.to_html(index=False)
+
+    with stages.time('html'):
+        head = ''.join(f'<th>{html.escape(str(column))}</th>' for column in columns)
+        rows = ''.join('<tr>' + ''.join(f'<td>{html.escape(_cell(value))}</td>' for value in row) + '</tr>'
+                       for row in data)
+        return (f'<table border="1" class="dataframe"><thead><tr style="text-align: right;">{head}</tr></thead>'
+                f'<tbody>{rows}</tbody></table>')
+
+
+class WkhtmltopdfRenderer:
+    name = 'wkhtmltopdf'
+
+    def __init__(self):
+        self.configurations = {}
+
+    def binary(self, config):
+        configured = config.get('WKHTMLTOPDF_PATH')
+        if configured:
+            return configured if os.path.isfile(configured) else None
+        found = shutil.which('wkhtmltopdf')
+        if found:
+            return found
+        return next((path for path in WKHTMLTOPDF_CANDIDATES if os.path.isfile(path)), None)
+
+    def available(self, config):
+        return _installed('pdfkit') and self.binary(config) is not None
+
+    def render(self, data, columns, config, stages):
+        import pdfkit
+
+        binary = self.binary(config)
+        if binary not in self.configurations:
+            self.configurations[binary] = pdfkit.configuration(wkhtmltopdf=binary)
+        page = table_html(data, columns, stages)
+        with stages.time('pdf'):
+            return pdfkit.from_string(page, False, configuration=self.configurations[binary])
+
+
+class WeasyPrintRenderer:
+    name = 'weasyprint'
+
+    def available(self, config):
+        return _installed('weasyprint')
+
+    def render(self, data, columns, config, stages):
+        import weasyprint
+
+        page = table_html(data, columns, stages)
+        with stages.time('pdf'):
+            return weasyprint.HTML(string=page).write_pdf()
+
+
+class BuiltinRenderer:
+    # A plain monospaced table on landscape A4 pages, header repeated on each page
+    name = 'builtin'
+
+    PAGE_WIDTH, PAGE_HEIGHT = 842, 595
+    MARGIN = 36
+    MAX_COLUMN_WIDTH = 40  # characters; longer values are cut
+    FONT_SIZES = (8, 7, 6, 5)
+
+    def available(self, config):
+        return True
+
+    def render(self, data, columns, config, stages):
+        with stages.time('html'):
+            lines = self.layout(data, columns)
+        with stages.time('pdf'):
+            return self.document(lines)
+
+    def layout(self, data, columns):
+        cells = [[_cell(value) for value in row] for row in data]
+        widths = [min(max([len(str(column))] + [len(row[i]) for row in cells]), self.MAX_COLUMN_WIDTH)
+                  for i, column in enumerate(columns)]
+
+        def line(values):
+            return '  '.join(value[:width].ljust(width) for value, width in zip(values, widths)).rstrip()
+
+        header = line([str(column) for column in columns])
+        rule = '  '.join('-' * width for width in widths)
+        return [header, rule] + [line(row) for row in cells]
+
+    def document(self, lines):
+        usable_width = self.PAGE_WIDTH - 2 * self.MARGIN
+        longest = max(len(line) for line in lines)
+        # Courier glyphs are 0.6 em wide: use the largest size that fits, else cut lines
+        size = next((size for size in self.FONT_SIZES if longest * size * 0.6 <= usable_width), self.FONT_SIZES[-1])
+        chars = int(usable_width / (size * 0.6))
+        leading = size * 1.4
+        per_page = int((self.PAGE_HEIGHT - 2 * self.MARGIN) / leading) - 2
+
+        header, rule, body = lines[0][:chars], lines[1][:chars], [line[:chars] for line in lines[2:]]
+        pages = [body[start:start + per_page] for start in range(0, len(body), per_page)] or [[]]
+
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # page tree, once the page objects are numbered
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        page_ids = []
+        for page in pages:
+            text = [f'BT /F2 {size} Tf {self.MARGIN} {self.PAGE_HEIGHT - self.MARGIN - size} Td {leading:.1f} TL',
+                    f'({self._escape(header)}) Tj /F1 {size} Tf T* ({self._escape(rule)}) Tj']
+            text.extend(f'T* ({self._escape(line)}) Tj' for line in page)
+            text.append('ET')
+            stream = zlib.compress('\n'.join(text).encode('latin-1'))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream
+                           + b'\nendstream')
+            content_id = len(objects)
+            objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.PAGE_WIDTH} {self.PAGE_HEIGHT}] '
+                           f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> '
+                           f'/Contents {content_id} 0 R >>'.encode('ascii'))
+            page_ids.append(len(objects))
+        kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+        objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('ascii')
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+        out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(out)
+
+    @staticmethod
+    def _escape(text):
+        text = text.encode('latin-1', 'replace').decode('latin-1')
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+register(WkhtmltopdfRenderer())
+register(WeasyPrintRenderer())
+register(BuiltinRenderer())
+
+
+def get_renderer(config):
+    """The renderer REPORT_PDF_RENDERER selects, discovered once per setting."""
+    setting = config.get('REPORT_PDF_RENDERER', 'auto')
+    key = (setting, config.get('WKHTMLTOPDF_PATH'))
+    with _chosen_lock:
+        renderer = _chosen.get(key)
+    if renderer is not None:
+        return renderer
+
+    if setting == 'auto':
+        renderer = next(renderer for renderer in RENDERERS.values() if renderer.available(config))
+    else:
+        renderer = RENDERERS.get(setting)
+        if renderer is None:
+            raise RuntimeError(f"REPORT_PDF_RENDERER must be auto or one of {', '.join(RENDERERS)}")
+        if not renderer.available(config):
+            raise RuntimeError(f'The {setting} PDF renderer is not installed (check WKHTMLTOPDF_PATH for wkhtmltopdf)')
+    logger.info('Rendering report PDFs with %s', renderer.name)
+    with _chosen_lock:
+        _chosen[key] = renderer
+    return renderer
@@ -0,0 +1,977 @@
+from flask import Blueprint, current_app, g, request, jsonify, send_file, url_for, Response, stream_with_context
+from MySQLdb.constants import FIELD_TYPE
+from MySQLdb.cursors import DictCursor, SSCursor
+from werkzeug.http import dump_options_header
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import csv
+from datetime import datetime, timedelta
+import fcntl
+import hashlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unicodedata
+from urllib.parse import quote
+import uuid
+from db import mysql, read_only, register_query
+from http_cache import versioned
+import metrics
+import renderers
+import search_index
+import stock_ledger
+import table_versions
+
+# Reports, exports and asset search
+bp = Blueprint('reports', __name__)
+
+
+@bp.record_once
+def init_reports(state):
+    os.makedirs(os.path.join(state.app.config['REPORT_CACHE_DIR'], 'jobs'), exist_ok=True)
+    # Reports are rendered on a bounded worker pool; clients submit, poll and then download
+    state.app.extensions['report_executor'] = ThreadPoolExecutor(
+        max_workers=state.app.config['REPORT_WORKERS'], thread_name_prefix='report-worker')
+
+
+# Existing Report Endpoints
+RESOURCE_TYPES_QUERY = register_query('reports.types', 'SELECT DISTINCT name FROM resources')
+
+
+@bp.route('/reports/types', methods=['GET'])
+@read_only
+@versioned('resources')
+def get_resource_types():
+    try:
+        cur = mysql.connection.cursor()
+        cur.execute(RESOURCE_TYPES_QUERY)
+        data = cur.fetchall()
+        resource_types = [{'type': row[0]} for row in data]
+        cur.close()
+        return jsonify(resource_types)
+    except Exception as e:
+        current_app.logger.error(f"Error fetching resource types: {str(e)}")
+        return jsonify({'error': 'Failed to fetch resource types'}), 500
+
+# Report queries and rendering, shared by the synchronous endpoints and the job workers
+REPORT_QUERY = register_query('reports.report', '''
+    SELECT a.name, a.stock_count, a.deduction, a.date, r.section 
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    WHERE r.name = %s AND a.date BETWEEN %s AND %s
+''', ('Gloves', '2024-01-01', '2024-12-31'))
+
+ASSET_SEARCH_QUERY = register_query('reports.asset_search', '''
+    SELECT 
+        a.name AS asset_name,
+        r.name AS resource_name,
+        a.stock_count,
+        a.deduction,
+        a.date,
+        r.section
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    WHERE a.name = %s
+''', ('Gloves',))
+
+
+REPORT_STAGE_SECONDS = metrics.Histogram('hams_report_stage_seconds', 'Report rendering time by stage',
+                                         ['stage'], buckets=metrics.STAGE_BUCKETS)
+
+
+def report_query(spec):
+    if spec['kind'] == 'asset':
+        return ASSET_SEARCH_QUERY, [spec['assetName']]
+
+    query = REPORT_QUERY
+    params = [spec['reportType'], spec['startDate'], spec['endDate']]
+
+    if spec.get('assetName'):
+        query += ' AND a.name = %s'
+        params.append(spec['assetName'])
+    return query, params
+
+
+def fetch_rows(cur, spec):
+    query, params = report_query(spec)
+    with REPORT_STAGE_SECONDS.time('query'):
+        cur.execute(query, params)
+        data = cur.fetchall()
+    columns = [desc[0] for desc in cur.description]
+    return data, columns
+
+
+def render_pdf(data, columns):
+    # The renderer (and pandas, if it uses it) is loaded on the first PDF, not at startup
+    renderer = renderers.get_renderer(current_app.config)
+    return renderer.render(data, columns, current_app.config, REPORT_STAGE_SECONDS)
+
+
+# Rendered PDFs are cached on disk. File names start with the assets/resources version
+# stamp, so any asset write makes older files unreachable and they are swept on the next store.
+def data_version(cur):
+    versions = table_versions.current(cur, ('assets', 'resources'))
+    return f"v{versions['assets']}-{versions['resources']}"
+
+
+def version_key(version):
+    assets, resources = version[1:].split('-')
+    return int(assets), int(resources)
+
+
+def report_cache_path(spec, version):
+    key = json.dumps([spec['kind'], spec.get('reportType'), spec.get('startDate'),
+                      spec.get('endDate'), spec.get('assetName')])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return os.path.join(current_app.config['REPORT_CACHE_DIR'], f'{version}-{digest}.pdf')
+
+
+def store_report(path, pdf, version):
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+
+    # Sweep files rendered from older data; newer ones may belong to a concurrent job
+    current = version_key(version)
+    cache_dir = current_app.config['REPORT_CACHE_DIR']
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.pdf'):
+            continue
+        if version_key(name.rsplit('-', 1)[0]) < current:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def report_download_name(spec, extension='pdf'):
+    if spec['kind'] == 'asset':
+        return f"{spec['assetName']}_report.{extension}"
+    return f"{spec['reportType']}_report_{spec['startDate']}_to_{spec['endDate']}.{extension}"
+
+
+def build_report(cur, spec, version=None):
+    # Returns the path of a cached PDF for spec, rendering it first if needed; None when there is no data.
+    # A job passes the version it was submitted against, so its PDF lands where submit looks for it.
+    version = version or data_version(cur)
+    path = report_cache_path(spec, version)
+    if os.path.exists(path):
+        return path
+
+    data, columns = fetch_rows(cur, spec)
+    if not data:
+        return None
+
+    store_report(path, render_pdf(data, columns), version)
+    return path
+
+
+def send_report(path, spec):
+    return send_file(
+        path,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=report_download_name(spec)
+    )
+
+
+# Data exports. Rows come from a server-side cursor in REPORT_EXPORT_BATCH_SIZE batches:
+# csv/ndjson are streamed to the client as they are read, xlsx/parquet are written
+# batch by batch to a temporary file, so memory stays bounded for any date range.
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_batches(cur, first_batch):
+    batch = first_batch
+    batch_size = current_app.config['REPORT_EXPORT_BATCH_SIZE']
+    while batch:
+        yield batch
+        batch = cur.fetchmany(batch_size)
+
+
+def csv_chunks(cur, columns, first_batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in export_batches(cur, first_batch):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def ndjson_chunks(cur, columns, first_batch):
+    for batch in export_batches(cur, first_batch):
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in batch)
+
+
+def write_xlsx(path, cur, columns, first_batch):
+    from openpyxl import Workbook
+
+    # Write-only workbooks flush rows to disk instead of keeping cell objects around
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Report')
+    sheet.append(columns)
+    for batch in export_batches(cur, first_batch):
+        for row in batch:
+            sheet.append(list(row))
+    workbook.save(path)
+
+
+def parquet_type(type_code):
+    import pyarrow as pa
+
+    if type_code in (FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.LONG,
+                     FIELD_TYPE.LONGLONG, FIELD_TYPE.INT24, FIELD_TYPE.YEAR):
+        return pa.int64()
+    if type_code in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE):
+        return pa.float64()
+    if type_code in (FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE):
+        return pa.date32()
+    if type_code in (FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP):
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def write_parquet(path, cur, columns, first_batch):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Schema comes from the cursor description so every batch (and row group) agrees
+    schema = pa.schema([(desc[0], parquet_type(desc[1])) for desc in cur.description])
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in export_batches(cur, first_batch):
+            arrays = {column: [row[i] for row in batch] for i, column in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(arrays, schema=schema))
+
+
+EXPORT_WRITERS = {'xlsx': write_xlsx, 'parquet': write_parquet}
+EXPORT_DEPENDENCIES = {'xlsx': 'openpyxl', 'parquet': 'pyarrow'}
+
+
+def attachment_disposition(download_name):
+    # As send_file does it: asset names may hold quotes or non-latin-1 text, so those go in
+    # an RFC 5987 filename* with an ASCII filename as the fallback
+    try:
+        download_name.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': simple, 'filename*': f"UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"}
+    else:
+        names = {'filename': download_name}
+    return dump_options_header('attachment', names)
+
+
+def export_report(spec, export_format):
+    if export_format in EXPORT_DEPENDENCIES:
+        try:
+            __import__(EXPORT_DEPENDENCIES[export_format])
+        except ImportError:
+            return jsonify({'error': f'{export_format} export requires {EXPORT_DEPENDENCIES[export_format]} '
+                                     f'to be installed'}), 501
+
+    cur = mysql.connection.cursor(SSCursor)
+    query, params = report_query(spec)
+    cur.execute(query, params)
+    columns = [desc[0] for desc in cur.description]
+    first_batch = cur.fetchmany(current_app.config['REPORT_EXPORT_BATCH_SIZE'])
+    if not first_batch:
+        cur.close()
+        return None
+
+    download_name = report_download_name(spec, export_format)
+    mimetype = EXPORT_MIMETYPES[export_format]
+
+    if export_format in EXPORT_WRITERS:
+        fd, path = tempfile.mkstemp(suffix=f'.{export_format}')
+        os.close(fd)
+        try:
+            EXPORT_WRITERS[export_format](path, cur, columns, first_batch)
+        except Exception:
+            os.remove(path)
+            raise
+        finally:
+            cur.close()
+
+        response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=download_name)
+        response.call_on_close(lambda: os.remove(path))
+        return response
+
+    chunks = csv_chunks if export_format == 'csv' else ndjson_chunks
+
+    def generate():
+        try:
+            yield from chunks(cur, columns, first_batch)
+        finally:
+            cur.close()
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = attachment_disposition(download_name)
+    return response
+
+
+def parse_export_format():
+    export_format = request.args.get('format', 'pdf')
+    if export_format != 'pdf' and export_format not in EXPORT_MIMETYPES:
+        raise ValueError('format must be one of pdf, csv, xlsx, parquet, ndjson')
+    return export_format
+
+
+@bp.route('/reports/download', methods=['GET'])
+@read_only
+def download_asset_report():
+    try:
+        report_type = request.args.get('reportType')
+        start_date = request.args.get('startDate')
+        end_date = request.args.get('endDate')
+        asset_name = request.args.get('assetName', None)
+
+        if not report_type or not start_date or not end_date:
+            return jsonify({'error': 'Missing parameters'}), 400
+
+        try:
+            export_format = parse_export_format()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        spec = {'kind': 'report', 'reportType': report_type, 'startDate': start_date,
+                'endDate': end_date, 'assetName': asset_name}
+
+        if export_format != 'pdf':
+            response = export_report(spec, export_format)
+            if response is None:
+                return jsonify({'error': 'No data found for the selected criteria'}), 404
+            return response
+
+        cur = mysql.connection.cursor()
+        path = build_report(cur, spec)
+        cur.close()
+
+        if not path:
+            return jsonify({'error': 'No data found for the selected criteria'}), 404
+
+        return send_report(path, spec)
+
+    except Exception as e:
+        current_app.logger.error(f"Report generation error: {str(e)}")
+        return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
+
+# Preview aggregates and pages, computed in SQL so the response size does not grow
+# with the date range. Everything reads the covering idx_assets_resource_date.
+PREVIEW_FROM = '''
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    WHERE r.name = %s AND a.date BETWEEN %s AND %s
+'''
+
+PREVIEW_AGGREGATES = '''
+    COUNT(*) AS row_count,
+    SUM(a.stock_count) AS total_stock,
+    SUM(a.deduction) AS total_deduction,
+    SUM(a.stock_count - a.deduction) AS net_stock,
+    MIN(a.stock_count) AS min_stock,
+    MAX(a.stock_count) AS max_stock
+'''
+
+# groupBy -> group expression; weeks start on Monday, as in the dashboard timeline
+PREVIEW_GROUPS = {
+    'section': 'r.section',
+    'asset': 'a.name',
+    'day': "DATE_FORMAT(a.date, '%%Y-%%m-%%d')",
+    'week': "DATE_FORMAT(DATE_SUB(a.date, INTERVAL WEEKDAY(a.date) DAY), '%%Y-%%m-%%d')",
+}
+
+PREVIEW_PAGE_SIZE = 100
+
+PREVIEW_TOTALS_QUERY = 'SELECT {aggregates} {source}'
+register_query('reports.preview_totals',
+               PREVIEW_TOTALS_QUERY.format(aggregates=PREVIEW_AGGREGATES, source=PREVIEW_FROM),
+               ('Gloves', '2024-01-01', '2024-12-31'))
+
+PREVIEW_GROUPS_QUERY = '''
+    SELECT {expression} AS group_key, {aggregates}
+    {source}
+    GROUP BY group_key
+    HAVING group_key > %s
+    ORDER BY group_key
+'''
+for group_by, expression in PREVIEW_GROUPS.items():
+    register_query(f'reports.preview_by_{group_by}',
+                   PREVIEW_GROUPS_QUERY.format(expression=expression, aggregates=PREVIEW_AGGREGATES,
+                                               source=PREVIEW_FROM),
+                   ('Gloves', '2024-01-01', '2024-12-31', ''))
+
+PREVIEW_PAGE_QUERY = '''
+    SELECT a.id, a.name, a.stock_count, a.deduction, a.date, r.section
+    {source} AND (a.date, a.id) > (%s, %s)
+    ORDER BY a.date, a.id
+    LIMIT %s
+'''
+register_query('reports.preview_page', PREVIEW_PAGE_QUERY.format(source=PREVIEW_FROM),
+               ('Gloves', '2024-01-01', '2024-12-31', '0001-01-01', 0, 100))
+
+
+def preview_source(spec):
+    params = [spec['reportType'], spec['startDate'], spec['endDate']]
+    if spec.get('assetName'):
+        return PREVIEW_FROM + ' AND a.name = %s', params + [spec['assetName']]
+    return PREVIEW_FROM, params
+
+
+def aggregate_item(row):
+    # row: (row_count, total_stock, total_deduction, net_stock, min_stock, max_stock); SUMs come back as Decimal
+    row_count, total_stock, total_deduction, net_stock, min_stock, max_stock = row
+    return {'rowCount': row_count, 'totalStock': int(total_stock or 0), 'totalDeduction': int(total_deduction or 0),
+            'netStock': int(net_stock or 0), 'minStock': min_stock, 'maxStock': max_stock}
+
+
+def preview_totals(cur, spec):
+    source, params = preview_source(spec)
+    cur.execute(PREVIEW_TOTALS_QUERY.format(aggregates=PREVIEW_AGGREGATES, source=source), params)
+    return aggregate_item(cur.fetchone())
+
+
+def preview_groups(cur, spec, group_by, after, limit):
+    source, params = preview_source(spec)
+    query = PREVIEW_GROUPS_QUERY.format(expression=PREVIEW_GROUPS[group_by], aggregates=PREVIEW_AGGREGATES,
+                                        source=source)
+    params.append(after or '')
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit + 1)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+
+    next_after = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1][0]
+    return [{'group': row[0], **aggregate_item(row[1:])} for row in rows], next_after
+
+
+def parse_preview_after(value):
+    # Keyset cursor "<YYYY-MM-DD>:<id>" from a previous page's nextAfter
+    if not value:
+        return '0001-01-01', 0
+    date, asset_id = value.rsplit(':', 1)
+    return datetime.strptime(date, '%Y-%m-%d').date(), int(asset_id)
+
+
+def preview_page(cur, spec, after, limit):
+    source, params = preview_source(spec)
+    cur.execute(PREVIEW_PAGE_QUERY.format(source=source), params + list(after) + [limit + 1])
+    rows = cur.fetchall()
+    columns = [desc[0] for desc in cur.description]
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = f"{rows[-1][4].strftime('%Y-%m-%d')}:{rows[-1][0]}"
+    return [dict(zip(columns, row)) for row in rows], next_after
+
+
+@bp.route('/reports/preview', methods=['GET'])
+@read_only
+@versioned('assets', 'resources')
+def preview_asset_report():
+    # Without groupBy/limit this is the full list of rows, as before. ?groupBy=section|asset|day|week
+    # returns one aggregate per group instead; ?limit= (with ?after= from the previous
+    # page's nextAfter) pages the groups or, without groupBy, the rows by date
+    try:
+        report_type = request.args.get('reportType')
+        start_date = request.args.get('startDate')
+        end_date = request.args.get('endDate')
+        asset_name = request.args.get('assetName', None)
+
+        if not report_type or not start_date or not end_date:
+            return jsonify({'error': 'Missing parameters'}), 400
+
+        group_by = request.args.get('groupBy')
+        if group_by is not None and group_by not in PREVIEW_GROUPS:
+            return jsonify({'error': f"groupBy must be one of {', '.join(PREVIEW_GROUPS)}"}), 400
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            if limit < 1:
+                return jsonify({'error': 'limit must be a positive integer'}), 400
+            limit = min(limit, current_app.config['LIST_MAX_LIMIT'])
+        after = request.args.get('after')
+        spec = {'kind': 'report', 'reportType': report_type, 'startDate': start_date, 'endDate': end_date,
+                'assetName': asset_name}
+
+        cur = mysql.connection.cursor()
+        if group_by:
+            groups, next_after = preview_groups(cur, spec, group_by, after, limit)
+            totals = preview_totals(cur, spec)
+            cur.close()
+            return jsonify({'groupBy': group_by, 'groups': groups, 'totals': totals, 'nextAfter': next_after})
+
+        if limit is not None or after:
+            try:
+                after = parse_preview_after(after)
+            except ValueError:
+                cur.close()
+                return jsonify({'error': 'after must be <YYYY-MM-DD>:<id>'}), 400
+            rows, next_after = preview_page(cur, spec, after, limit or PREVIEW_PAGE_SIZE)
+            totals = preview_totals(cur, spec)
+            cur.close()
+            return jsonify({'rows': rows, 'totals': totals, 'nextAfter': next_after})
+
+        data, columns = fetch_rows(cur, spec)
+        cur.close()
+
+        report_data = [dict(zip(columns, row)) for row in data]
+        return jsonify(report_data)
+
+    except Exception as e:
+        current_app.logger.error(f"Preview error: {str(e)}")
+        return jsonify({'error': f'Failed to generate preview: {str(e)}'}), 500
+
+# Point-in-time stock from the ledger (see stock_ledger.py)
+def stock_item(asset_id, name, values):
+    stock_count, deduction, date = values[1:]
+    return {'assetId': asset_id, 'assetName': name, 'stockCount': stock_count, 'deduction': deduction,
+            'netStock': stock_count - deduction, 'date': date.strftime('%Y-%m-%d')}
+
+
+@bp.route('/reports/stock', methods=['GET'])
+@read_only
+@versioned('assets', 'resources')
+def stock_report():
+    # ?reportType=<resource name>&at=YYYY-MM-DD (end of that day) or a timestamp; no
+    # `at` reads the current stock straight from assets
+    report_type = request.args.get('reportType')
+    if not report_type:
+        return jsonify({'error': 'reportType is required'}), 400
+    try:
+        before = stock_ledger.parse_before(request.args.get('at'))
+    except ValueError:
+        return jsonify({'error': 'at must be YYYY-MM-DD or an ISO timestamp'}), 400
+
+    try:
+        cur = mysql.connection.cursor()
+        resource_ids = stock_ledger.resource_ids(cur, report_type)
+        if before is None:
+            stock = stock_ledger.current(cur, resource_ids)
+        else:
+            stock = stock_ledger.state(cur, before, resource_ids)
+        names = stock_ledger.asset_names(cur, resource_ids, stock)
+        cur.close()
+
+        items = sorted((stock_item(asset_id, names.get(asset_id), values) for asset_id, values in stock.items()),
+                       key=lambda item: (item['assetName'] or '', item['assetId']))
+        return jsonify({
+            'reportType': report_type,
+            'at': before.isoformat() if before else None,
+            'items': items,
+            'totals': {
+                'stockCount': sum(item['stockCount'] for item in items),
+                'deduction': sum(item['deduction'] for item in items),
+                'netStock': sum(item['netStock'] for item in items),
+            },
+        })
+    except Exception as e:
+        current_app.logger.error(f"Stock report error: {str(e)}")
+        return jsonify({'error': f'Failed to generate stock report: {str(e)}'}), 500
+
+
+@bp.route('/reports/stock-movement', methods=['GET'])
+@read_only
+@versioned('assets', 'resources')
+def stock_movement_report():
+    # Opening stock at the start of startDate, closing stock at the end of endDate and
+    # the movements recorded in between, per asset of one resource type
+    report_type = request.args.get('reportType')
+    if not report_type or not request.args.get('startDate') or not request.args.get('endDate'):
+        return jsonify({'error': 'Missing parameters'}), 400
+    try:
+        start = stock_ledger.parse_before(request.args['startDate']) - timedelta(days=1)
+        end = stock_ledger.parse_before(request.args['endDate'])
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    try:
+        cur = mysql.connection.cursor()
+        resource_ids = stock_ledger.resource_ids(cur, report_type)
+        opening = stock_ledger.state(cur, start, resource_ids)
+        closing = stock_ledger.state(cur, end, resource_ids)
+        movements = stock_ledger.movement_counts(cur, start, end, resource_ids) if resource_ids else {}
+        asset_ids = set(opening) | set(closing) | set(movements)
+        names = stock_ledger.asset_names(cur, resource_ids, asset_ids)
+        cur.close()
+
+        items = []
+        for asset_id in asset_ids:
+            opening_stock = opening[asset_id][1] - opening[asset_id][2] if asset_id in opening else 0
+            closing_stock = closing[asset_id][1] - closing[asset_id][2] if asset_id in closing else 0
+            count, _ = movements.get(asset_id, (0, 0))
+            items.append({'assetId': asset_id, 'assetName': names.get(asset_id), 'openingStock': opening_stock,
+                          'closingStock': closing_stock, 'change': closing_stock - opening_stock,
+                          'movements': count})
+        items.sort(key=lambda item: (item['assetName'] or '', item['assetId']))
+        return jsonify({'reportType': report_type, 'startDate': request.args['startDate'],
+                        'endDate': request.args['endDate'], 'items': items})
+    except Exception as e:
+        current_app.logger.error(f"Stock movement report error: {str(e)}")
+        return jsonify({'error': f'Failed to generate stock movement report: {str(e)}'}), 500
+
+
+# New Asset Search Endpoints
+def fuzzy_search(query):
+    # Typeahead/typo-tolerant search: ranked ids from the in-process index, then one
+    # join for just the requested page
+    limit = request.args.get('limit', current_app.config['SEARCH_DEFAULT_LIMIT'], type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if limit < 1 or offset < 0:
+        return jsonify({'error': 'limit must be positive and offset non-negative'}), 400
+    limit = min(limit, current_app.config['SEARCH_MAX_LIMIT'])
+
+    index = search_index.get_index()
+    cur = mysql.connection.cursor()
+    index.ensure_current(cur, current_app.config['SEARCH_REPLAY_LIMIT'])
+    cur.close()
+    hits, total = index.search(query, limit, offset)
+
+    cur = mysql.connection.cursor(DictCursor)
+    results = search_index.fetch_page(cur, hits)
+    cur.close()
+
+    return jsonify({'query': query, 'total': total, 'results': results})
+
+
+@bp.route('/assets/search', methods=['GET'])
+@read_only
+@versioned('assets', 'resources')
+def search_asset():
+    query = request.args.get('q')
+    if query is not None:
+        if not query.strip():
+            return jsonify({'error': 'q must not be empty'}), 400
+        try:
+            return fuzzy_search(query)
+        except Exception as e:
+            current_app.logger.error(f"Asset search error: {str(e)}")
+            return jsonify({'error': f'Failed to search assets: {str(e)}'}), 500
+
+    asset_name = request.args.get('assetName')
+    if not asset_name:
+        return jsonify({'error': 'Asset name is required'}), 400
+
+    try:
+        cur = mysql.connection.cursor()
+        data, columns = fetch_rows(cur, {'kind': 'asset', 'assetName': asset_name})
+        cur.close()
+
+        if not data:
+            return jsonify({'error': 'No assets found with that name'}), 404
+
+        results = [dict(zip(columns, row)) for row in data]
+        return jsonify(results)
+
+    except Exception as e:
+        current_app.logger.error(f"Asset search error: {str(e)}")
+        return jsonify({'error': f'Failed to search assets: {str(e)}'}), 500
+
+@bp.route('/assets/download', methods=['GET'])
+@read_only
+def download_asset_search():
+    asset_name = request.args.get('assetName')
+    if not asset_name:
+        return jsonify({'error': 'Asset name is required'}), 400
+
+    try:
+        export_format = parse_export_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        spec = {'kind': 'asset', 'assetName': asset_name}
+
+        if export_format != 'pdf':
+            response = export_report(spec, export_format)
+            if response is None:
+                return jsonify({'error': 'No assets found with that name'}), 404
+            return response
+
+        cur = mysql.connection.cursor()
+        path = build_report(cur, spec)
+        cur.close()
+
+        if not path:
+            return jsonify({'error': 'No assets found with that name'}), 404
+
+        return send_report(path, spec)
+
+    except Exception as e:
+        current_app.logger.error(f"Asset download error: {str(e)}")
+        return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
+
+
+# Report Job Endpoints
+# Job records are JSON files in REPORT_CACHE_DIR/jobs, next to the PDFs they point
+# at, so a status poll or download can land on any worker process, not only the one
+# whose executor renders the job. Records are written whole and renamed into place.
+# Unfinished jobs are also listed in jobs/pending.json, which submissions read and
+# update under a file lock, so dedupe and the queue limit hold across processes.
+report_jobs_lock = threading.Lock()
+REPORT_JOB_PRUNE_INTERVAL = 60  # Seconds between sweeps of expired job records
+
+
+def report_jobs_dir():
+    return os.path.join(current_app.config['REPORT_CACHE_DIR'], 'jobs')
+
+
+def report_job_path(job_id):
+    return os.path.join(report_jobs_dir(), f'{job_id}.json')
+
+
+def save_report_job(job):
+    path = report_job_path(job['id'])
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def load_report_job(job_id):
+    # Job ids are uuid4 hex; anything else cannot name a record
+    if len(job_id) != 32 or any(c not in '0123456789abcdef' for c in job_id):
+        return None
+    try:
+        with open(report_job_path(job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextlib.contextmanager
+def pending_report_jobs():
+    # Yields {job_id: job} for unfinished jobs; changes are saved when the block exits.
+    # The threading lock keeps threads of this process off each other, flock other processes.
+    jobs_dir = report_jobs_dir()
+    with report_jobs_lock, open(os.path.join(jobs_dir, 'pending.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = os.path.join(jobs_dir, 'pending.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {'jobs': {}, 'pruned_at': 0}
+
+        yield index['jobs']
+
+        now = time.time()
+        if now - index['pruned_at'] >= REPORT_JOB_PRUNE_INTERVAL:
+            prune_report_jobs(index['jobs'], now)
+            index['pruned_at'] = now
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+
+def report_worker_alive(worker):
+    # Only processes on this host can be checked; elsewhere the timeout decides
+    if not worker or worker[0] != socket.gethostname():
+        return True
+    pid = worker[1]
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def report_job_stale(job):
+    # Unfinished jobs whose worker has exited, or that ran past REPORT_JOB_TIMEOUT, will never finish
+    if job['status'] not in ('queued', 'running'):
+        return False
+    started = job.get('started_at') or job['created_at']
+    return time.time() - started > current_app.config['REPORT_JOB_TIMEOUT'] or \
+        not report_worker_alive(job.get('worker'))
+
+
+def fail_stale_report_jobs(pending):
+    for job_id, job in list(pending.items()):
+        if not report_job_stale(job):
+            continue
+        del pending[job_id]
+        record = load_report_job(job_id)
+        if record and record['status'] in ('queued', 'running'):
+            record.update(status='failed', error='Report worker stopped before the job finished',
+                          finished_at=time.time())
+            save_report_job(record)
+
+
+def prune_report_jobs(pending, now):
+    # Records are rewritten when a job finishes, so the file time is when it finished
+    cutoff = now - current_app.config['REPORT_JOB_RETENTION']
+    for entry in os.scandir(report_jobs_dir()):
+        if not entry.name.endswith(('.json', '.tmp')) or entry.name == 'pending.json':
+            continue
+        if entry.name.split('.', 1)[0] in pending:
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def parse_report_spec(data):
+    kind = data.get('kind', 'report')
+    if kind == 'asset':
+        if not data.get('assetName'):
+            raise ValueError('Asset name is required')
+        return {'kind': 'asset', 'assetName': data['assetName']}
+    if kind != 'report':
+        raise ValueError('kind must be "report" or "asset"')
+    if not data.get('reportType') or not data.get('startDate') or not data.get('endDate'):
+        raise ValueError('Missing parameters')
+    return {'kind': 'report', 'reportType': data['reportType'], 'startDate': data['startDate'],
+            'endDate': data['endDate'], 'assetName': data.get('assetName') or None}
+
+
+def job_status(job):
+    status = {
+        'jobId': job['id'],
+        'status': job['status'],
+        'createdAt': job['created_at'],
+        'finishedAt': job['finished_at'],
+        'statusUrl': url_for('reports.get_report_job', job_id=job['id']),
+    }
+    if job['status'] == 'done':
+        status['downloadUrl'] = url_for('reports.download_report_job', job_id=job['id'])
+    if job['error']:
+        status['error'] = job['error']
+    return status
+
+
+def run_report_job(app, job):
+    with app.app_context():
+        job.update(status='running', started_at=time.time())
+        save_report_job(job)
+        with pending_report_jobs() as pending:
+            if job['id'] in pending:
+                pending[job['id']].update(status='running', started_at=job['started_at'])
+
+        try:
+            g.mysql_read_only = True
+            cur = mysql.connection.cursor()
+            if mysql.on_replica and version_key(data_version(cur)) < version_key(job['version']):
+                # The replica has not caught up with the data the job was submitted against
+                cur.close()
+                mysql.teardown(None)
+                g.mysql_read_only = False
+                cur = mysql.connection.cursor()
+            try:
+                path = build_report(cur, job['spec'], job['version'])
+            finally:
+                cur.close()
+            result = {'status': 'done', 'path': path} if path else \
+                {'status': 'failed', 'error': 'No data found for the selected criteria'}
+        except Exception as e:
+            app.logger.error(f"Report job {job['id']} failed: {str(e)}")
+            result = {'status': 'failed', 'error': f'Failed to generate report: {str(e)}'}
+
+        job.update(result, finished_at=time.time())
+        save_report_job(job)
+        with pending_report_jobs() as pending:
+            pending.pop(job['id'], None)
+
+
+@bp.route('/reports/jobs', methods=['POST'])
+def submit_report_job():
+    try:
+        spec = parse_report_spec(request.get_json(silent=True) or request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        cur = mysql.connection.cursor()
+        version = data_version(cur)
+        cur.close()
+        cached = os.path.exists(report_cache_path(spec, version))
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'spec': spec,
+            'version': version,
+            'status': 'queued',
+            'path': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'worker': [socket.gethostname(), os.getpid()],
+        }
+        if cached:
+            job.update(status='done', path=report_cache_path(spec, version), finished_at=job['created_at'])
+            save_report_job(job)
+            return jsonify(job_status(job)), 202
+
+        with pending_report_jobs() as pending:
+            fail_stale_report_jobs(pending)
+
+            # Identical reports already in flight share one job
+            for job_id, other in pending.items():
+                if other['spec'] == spec and other['version'] == version:
+                    existing = load_report_job(job_id)
+                    if existing:
+                        return jsonify(job_status(existing)), 202
+
+            if len(pending) >= current_app.config['REPORT_QUEUE_LIMIT']:
+                return jsonify({'error': 'Report queue is full, try again shortly'}), 503, {'Retry-After': '10'}
+
+            save_report_job(job)
+            pending[job['id']] = {key: job[key] for key in
+                                  ('spec', 'version', 'status', 'created_at', 'started_at', 'worker')}
+
+        current_app.extensions['report_executor'].submit(
+            run_report_job, current_app._get_current_object(), dict(job))
+
+        return jsonify(job_status(job)), 202
+
+    except Exception as e:
+        current_app.logger.error(f"Report job submission error: {str(e)}")
+        return jsonify({'error': f'Failed to submit report: {str(e)}'}), 500
+
+
+@bp.route('/reports/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    job = load_report_job(job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    if report_job_stale(job):
+        with pending_report_jobs() as pending:
+            pending.setdefault(job_id, job)
+            fail_stale_report_jobs(pending)
+        job = load_report_job(job_id) or job
+    return jsonify(job_status(job))
+
+
+@bp.route('/reports/jobs/<job_id>/download', methods=['GET'])
+def download_report_job(job_id):
+    job = load_report_job(job_id)
+    if not job:
+        return jsonify({'error': 'Report job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify(job_status(job)), 409
+    path, spec = job['path'], job['spec']
+
+    if not os.path.exists(path):
+        # Swept because the assets changed since the job finished
+        return jsonify({'error': 'Report expired, please submit it again'}), 410
+
+    return send_report(path, spec)
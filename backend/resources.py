@@ -0,0 +1,860 @@
+import os
+from datetime import datetime, timedelta
+import click
+from flask import Blueprint, current_app, g, request, jsonify, send_from_directory, Response, stream_with_context, json
+from MySQLdb.cursors import DictCursor, SSDictCursor  # Important fix
+from auth import login_required
+from db import mysql, register_query
+from http_cache import versioned
+import asset_archive
+import asset_bulk
+import auth
+import cache
+import change_feed
+import images
+import low_stock
+import search_index
+import stock_ledger
+import stock_rollup
+import table_versions
+
+# Auth, resource and asset management
+bp = Blueprint('resources', __name__, cli_group=None)
+
+
+@bp.record_once
+def create_upload_folder(state):
+    os.makedirs(state.app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+
+# Queries checked by `flask --app app db check`
+SIGNUP_CONFLICT_QUERY = register_query('auth.signup_conflict',
+                                       'SELECT * FROM userss WHERE email = %s OR id_number = %s',
+                                       ('nurse@example.org', 'ID-0001'))
+LOGIN_QUERY = register_query('auth.login', 'SELECT id, password FROM userss WHERE email = %s',
+                             ('nurse@example.org',))
+
+
+# Routes
+@bp.route('/signup', methods=['POST'])
+def signup():
+    try:
+        data = request.json
+        required_fields = ['firstName', 'lastName', 'dateOfBirth', 'email', 
+                         'position', 'idNumber', 'phoneNumber', 'password']
+        
+        if not all(field in data for field in required_fields):
+            return jsonify({'message': 'Missing required fields'}), 400
+
+        cursor = mysql.connection.cursor(cursorclass=DictCursor)
+        
+        # Check if email or ID number already exists
+        cursor.execute(SIGNUP_CONFLICT_QUERY, (data['email'], data['idNumber']))
+        existing_user = cursor.fetchone()
+
+        if existing_user:
+            conflict = 'Email' if existing_user['email'] == data['email'] else 'ID Number'
+            return jsonify({'message': f'{conflict} already exists!'}), 409
+
+        # Hash password (off the request thread, at the configured work factor)
+        hashed_password = auth.hash_password(data['password'])
+
+        # Insert new user
+        cursor.execute("""
+            INSERT INTO userss 
+            (first_name, last_name, date_of_birth, email, position, id_number, phone_number, password)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (
+            data['firstName'],
+            data['lastName'],
+            data['dateOfBirth'],
+            data['email'],
+            data['position'],
+            data['idNumber'],
+            data['phoneNumber'],
+            hashed_password
+        ))
+
+        mysql.connection.commit()
+        cursor.close()
+
+        return jsonify({'message': 'User registered successfully!'}), 201
+
+    except auth.AuthBusy:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/login', methods=['POST'])
+def login():
+    try:
+        data = request.json
+        username = data.get('username')
+        password = data.get('password')
+
+        if not username or not password:
+            return jsonify({'status': 'error', 'message': 'Invalid username or password!'}), 401
+
+        cursor = mysql.connection.cursor(cursorclass=DictCursor)
+        cursor.execute(LOGIN_QUERY, (username,))
+        user = cursor.fetchone()
+
+        if not user:
+            return jsonify({'status': 'error', 'message': 'Invalid username or password!'}), 401
+
+        stored_password = user['password']
+        if not auth.check_password(password, stored_password):
+            return jsonify({'status': 'error', 'message': 'Invalid username or password!'}), 401
+
+        # Transparently move old hashes to the configured BCRYPT_ROUNDS
+        if auth.needs_rehash(stored_password):
+            cursor.execute("UPDATE userss SET password = %s WHERE id = %s",
+                           (auth.hash_password(password), user['id']))
+
+        token, expires_in = auth.create_session(cursor, user['id'])
+        mysql.connection.commit()
+        cursor.close()
+
+        return jsonify({'status': 'success', 'message': 'Login successful!',
+                        'token': token, 'expiresIn': expires_in}), 200
+    except auth.AuthBusy:
+        raise
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@bp.route('/api/logout', methods=['POST'])
+@login_required
+def logout():
+    if not g.session_id:
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    cursor = mysql.connection.cursor()
+    auth.revoke_session(cursor, g.session_id)
+    mysql.connection.commit()
+    cursor.close()
+    return jsonify({'status': 'success', 'message': 'Logged out'})
+
+
+@bp.route('/api/me', methods=['GET'])
+@login_required
+def current_user():
+    if not g.user_id:
+        return jsonify({'status': 'error', 'message': 'Authentication required'}), 401
+
+    cursor = mysql.connection.cursor(cursorclass=DictCursor)
+    cursor.execute('SELECT id, first_name, last_name, email, position FROM userss WHERE id = %s', (g.user_id,))
+    user = cursor.fetchone()
+    cursor.close()
+
+    if not user:
+        return jsonify({'status': 'error', 'message': 'User not found'}), 404
+    return jsonify(user)
+
+
+@bp.route('/uploads/<filename>')
+def uploaded_file(filename):
+    folder = current_app.config['UPLOAD_FOLDER']
+    variant = request.args.get('variant')
+    if variant and variant in current_app.config['IMAGE_VARIANTS'] and images.is_content_addressed(filename):
+        variant_file = images.variant_name(filename, variant)
+        if os.path.exists(os.path.join(folder, variant_file)):
+            filename = variant_file
+
+    if not images.is_content_addressed(filename):
+        # Legacy uploads are stored under their original name and may be overwritten
+        return send_from_directory(folder, filename, max_age=3600)
+
+    # Content-addressed files never change: cache for a year, ETag is the content hash
+    # (plus variant). send_from_directory answers If-None-Match and Range requests itself.
+    response = send_from_directory(folder, filename, etag=filename.rsplit('.', 1)[0],
+                                   max_age=current_app.config['IMAGE_CACHE_MAX_AGE'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+
+
+# List helpers (keyset pagination, projection and streaming)
+RESOURCE_COLUMNS = ('id', 'name', 'section', 'image_path')
+ASSET_COLUMNS = ('id', 'resource_id', 'name', 'stock_count', 'deduction', 'date', 'reorder_threshold')
+
+
+def parse_list_args(columns):
+    fields = request.args.get('fields')
+    if fields:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in selected if field not in columns]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # The keyset cursor needs the id, so it is always returned
+        if 'id' not in selected:
+            selected.insert(0, 'id')
+    else:
+        selected = ['*']
+
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, current_app.config['LIST_MAX_LIMIT'])
+
+    stream = request.args.get('stream')
+    if stream not in (None, 'json', 'ndjson'):
+        raise ValueError('stream must be "json" or "ndjson"')
+
+    return selected, after_id, limit, stream
+
+
+def build_list_query(table, selected, where, params, after_id, limit):
+    clauses = list(where)
+    params = list(params)
+    if after_id is not None:
+        clauses.append('id > %s')
+        params.append(after_id)
+
+    query = f"SELECT {', '.join(selected)} FROM {table}"
+    if clauses:
+        query += ' WHERE ' + ' AND '.join(clauses)
+    query += ' ORDER BY id'
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit)
+    return query, params
+
+
+register_query('resources.list_page', *build_list_query('resources', ['*'], [], [], 0, 100))
+register_query('assets.list_page', *build_list_query('assets', ['*'], ['resource_id = %s'], [1], 0, 100))
+
+
+def stream_rows(query, params, stream):
+    # Server-side cursor: rows are pulled from MySQL in batches as the client reads
+    cursor = mysql.connection.cursor(cursorclass=SSDictCursor)
+    cursor.execute(query, params)
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+
+    def generate():
+        try:
+            if stream == 'json':
+                yield '['
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if stream == 'ndjson':
+                    yield ''.join(json.dumps(row) + '\n' for row in rows)
+                else:
+                    chunk = ','.join(json.dumps(row) for row in rows)
+                    yield chunk if first else ',' + chunk
+                first = False
+            if stream == 'json':
+                yield ']'
+        finally:
+            cursor.close()
+
+    mimetype = 'application/x-ndjson' if stream == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def list_rows(table, columns, where=(), params=(), include_assets=False):
+    try:
+        selected, after_id, limit, stream = parse_list_args(columns)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query, params = build_list_query(table, selected, where, params, after_id, limit)
+    if stream:
+        if include_assets:
+            return jsonify({'error': 'include=assets cannot be streamed'}), 400
+        return stream_rows(query, params, stream)
+
+    def load():
+        cursor = mysql.connection.cursor(cursorclass=DictCursor)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if include_assets:
+            # One query for the whole page instead of one request per resource
+            grouped = assets_by_resource(cursor, 'r.id IN ({ids})', [row['id'] for row in rows])
+            rows = [dict(row, assets=grouped.get(row['id'], [])) for row in rows]
+        cursor.close()
+        return rows
+
+    # Cached per table; the key is the statement itself, so every filter/page has its own entry
+    key = f'{table}:{query}:{params!r}' + (':assets' if include_assets else '')
+    rows = cache.get_cache().get_or_load(key, [table, 'assets'] if include_assets else [table], load)
+
+    response = jsonify(rows)
+    if limit is not None and len(rows) == limit:
+        response.headers['X-Next-After-Id'] = str(rows[-1]['id'])
+    return response
+
+
+# Assets of many resources at once, grouped by resource. {where} filters resources.
+ASSETS_BY_RESOURCE_QUERY = '''
+    SELECT r.id AS group_id, {columns}
+    FROM resources r
+    LEFT JOIN assets a ON a.resource_id = r.id
+    WHERE {where}
+    ORDER BY r.id, a.id
+'''
+register_query('assets.by_resource_ids',
+               ASSETS_BY_RESOURCE_QUERY.format(columns='a.*', where='r.id IN (%s, %s)'), (1, 2))
+register_query('assets.by_section', ASSETS_BY_RESOURCE_QUERY.format(columns='a.*', where='r.section = %s'), ('ICU',))
+
+
+def assets_by_resource(cursor, where, params, selected=ASSET_COLUMNS):
+    """Return {resource id: [asset rows]} for the resources matching `where`.
+
+    Resources without assets map to an empty list. A '{ids}' placeholder in `where`
+    is expanded to one %s per param, in chunks for long id lists.
+    """
+    columns = ', '.join(f'a.{column}' for column in selected)
+    chunks = [params[i:i + 1000] for i in range(0, len(params), 1000)] if '{ids}' in where else [params]
+    grouped = {}
+    for chunk in chunks:
+        if not chunk and '{ids}' in where:
+            continue
+        cursor.execute(ASSETS_BY_RESOURCE_QUERY.format(
+            columns=columns, where=where.format(ids=', '.join(['%s'] * len(chunk)))), chunk)
+        for row in cursor.fetchall():
+            assets = grouped.setdefault(row.pop('group_id'), [])
+            if row['id'] is not None:
+                assets.append(row)
+    return grouped
+
+
+# Resource Management
+@bp.route('/api/resources', methods=['GET'])
+def get_resources():
+    # ?include=assets embeds each resource's assets, so a whole inventory is one request
+    include = request.args.get('include')
+    if include is None:
+        return list_resources()
+    if include != 'assets':
+        return jsonify({'error': 'include must be "assets"'}), 400
+    return list_resources_with_assets()
+
+
+@versioned('resources')
+def list_resources():
+    return list_rows('resources', RESOURCE_COLUMNS)
+
+
+@versioned('resources', 'assets')
+def list_resources_with_assets():
+    return list_rows('resources', RESOURCE_COLUMNS, include_assets=True)
+
+
+@bp.route('/api/assets', methods=['GET'])
+@versioned('assets', 'resources')
+def get_assets_by_resource():
+    # ?resourceIds=1,2,3 or ?section=ICU: the assets of several resources from one query,
+    # as {"assetsByResource": {"<resource id>": [...]}}; ?fields= as on the list endpoints
+    section = request.args.get('section')
+    try:
+        resource_ids = [int(value) for value in request.args.get('resourceIds', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': 'resourceIds must be a comma-separated list of ids'}), 400
+    if bool(resource_ids) == bool(section):
+        return jsonify({'error': 'Pass either resourceIds or section'}), 400
+    max_ids = current_app.config['RESOURCE_BATCH_MAX_IDS']
+    if len(resource_ids) > max_ids:
+        return jsonify({'error': f'At most {max_ids} resourceIds per request'}), 400
+
+    fields = request.args.get('fields')
+    selected = list(ASSET_COLUMNS)
+    if fields:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in selected if field not in ASSET_COLUMNS]
+        if unknown:
+            return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        if 'id' not in selected:
+            selected.insert(0, 'id')
+
+    resource_ids = list(dict.fromkeys(resource_ids))
+    if section:
+        where, params = 'r.section = %s', [section]
+    else:
+        where, params = 'r.id IN ({ids})', resource_ids
+
+    def load():
+        cursor = mysql.connection.cursor(cursorclass=DictCursor)
+        grouped = assets_by_resource(cursor, where, params, selected)
+        cursor.close()
+        return grouped
+
+    key = f'assets:by-resource:{where}:{params!r}:{selected!r}'
+    grouped = cache.get_cache().get_or_load(key, ['assets', 'resources'], load)
+
+    body = {'assetsByResource': {str(resource_id): assets for resource_id, assets in grouped.items()}}
+    if resource_ids:
+        body['notFound'] = [resource_id for resource_id in resource_ids if resource_id not in grouped]
+    return jsonify(body)
+
+
+@bp.route('/api/resources', methods=['POST'])
+@login_required
+def add_resource():
+    name = request.form.get('name')
+    section = request.form.get('section')
+    file = request.files.get('image')
+
+    if not name or not section or not file:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    if allowed_file(file.filename):
+        filename = images.store_upload(file, current_app.config['UPLOAD_FOLDER'],
+                                       current_app.config['IMAGE_VARIANTS'])
+
+        cursor = mysql.connection.cursor()
+        cursor.execute(
+            'INSERT INTO resources (name, section, image_path) VALUES (%s, %s, %s)',
+            (name, section, filename)
+        )
+        resource_id = cursor.lastrowid
+        table_versions.bump(cursor, 'resources')
+        event_id = change_feed.publish(cursor, 'resource.created', {
+            'resource': change_feed.resource_snapshot(resource_id, name, section, filename)
+        })
+        mysql.connection.commit()
+        cursor.close()
+        cache.get_cache().invalidate('resources')
+        search_index.get_index().resource_written(resource_id, name, event_id)
+
+        return jsonify({'id': resource_id, 'name': name, 'section': section, 'image_path': filename}), 201
+    else:
+        return jsonify({'error': 'Invalid file type'}), 400
+
+
+@bp.route('/api/resources/<int:resource_id>', methods=['PUT'])
+@login_required
+def update_resource(resource_id):
+    name = request.form.get('name')
+    section = request.form.get('section')
+    file = request.files.get('image')
+
+    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
+    cursor.execute('SELECT * FROM resources WHERE id = %s', (resource_id,))
+    resource = cursor.fetchone()
+
+    if not resource:
+        return jsonify({'error': 'Resource not found'}), 404
+
+    old_filename = filename = resource['image_path']  # Now safe with DictCursor
+
+    if file and allowed_file(file.filename):
+        filename = images.store_upload(file, current_app.config['UPLOAD_FOLDER'],
+                                       current_app.config['IMAGE_VARIANTS'])
+
+    update_cursor = mysql.connection.cursor()
+    update_cursor.execute(
+        'UPDATE resources SET name = %s, section = %s, image_path = %s WHERE id = %s',
+        (name or resource['name'], section or resource['section'], filename, resource_id)
+    )
+    if section and section != resource['section']:
+        low_stock.refresh_resources(update_cursor, [resource_id])
+    table_versions.bump(update_cursor, 'resources')
+    event_id = change_feed.publish(update_cursor, 'resource.updated', {
+        'resource': change_feed.resource_snapshot(resource_id, name or resource['name'],
+                                                  section or resource['section'], filename),
+        'previous': change_feed.resource_snapshot(resource_id, resource['name'], resource['section'],
+                                                  old_filename),
+    })
+    mysql.connection.commit()
+    cache.get_cache().invalidate('resources')
+    search_index.get_index().resource_written(resource_id, name or resource['name'], event_id)
+    update_cursor.close()
+
+    return jsonify({'message': 'Resource updated successfully'})
+
+
+@bp.route('/api/resources/<int:resource_id>', methods=['DELETE'])
+@login_required
+def delete_resource(resource_id):
+    cursor = mysql.connection.cursor(cursorclass=DictCursor)  # Fix here
+    cursor.execute('SELECT * FROM resources WHERE id = %s', (resource_id,))
+    resource = cursor.fetchone()
+
+    if not resource:
+        return jsonify({'error': 'Resource not found'}), 404
+
+    delete_cursor = mysql.connection.cursor()
+    delete_cursor.execute('DELETE FROM resources WHERE id = %s', (resource_id,))
+    low_stock.refresh_resources(delete_cursor, [resource_id])
+    table_versions.bump(delete_cursor, 'resources')
+    event_id = change_feed.publish(delete_cursor, 'resource.deleted', {
+        'resource': change_feed.resource_snapshot(resource_id, resource['name'], resource['section'],
+                                                  resource['image_path'])
+    })
+    mysql.connection.commit()
+    cache.get_cache().invalidate('resources')
+    search_index.get_index().resource_removed(resource_id, event_id)
+    delete_cursor.close()
+
+    return jsonify({'message': 'Resource deleted successfully'})
+
+
+# Asset Management Endpoints
+@bp.route('/api/resources/<int:resource_id>/assets', methods=['GET'])
+@versioned('assets')
+def get_assets(resource_id):
+    return list_rows('assets', ASSET_COLUMNS, ['resource_id = %s'], [resource_id])
+
+
+@bp.route('/api/assets/<int:asset_id>/history', methods=['GET'])
+@versioned('assets')
+def get_asset_history(asset_id):
+    # Stock movements oldest first; pass the last id back as ?after= for the next page
+    after = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', 50, type=int)
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, current_app.config['LIST_MAX_LIMIT'])
+
+    cursor = mysql.connection.cursor()
+    movements = stock_ledger.history(cursor, asset_id, after, limit + 1)
+    cursor.close()
+    next_after = movements[limit - 1]['id'] if len(movements) > limit else None
+    return jsonify({'movements': movements[:limit], 'nextAfter': next_after})
+
+
+@bp.route('/api/assets/<int:asset_id>', methods=['PUT'])
+@login_required
+def update_asset(asset_id):
+    data = request.get_json()
+    name = data.get('name')
+    stock_count = data.get('stockCount')
+    deduction = data.get('deduction')
+    date = data.get('date')
+
+    if not all([name, stock_count, deduction, date]):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    cursor = mysql.connection.cursor()
+    previous = change_feed.asset_snapshot(cursor, asset_id)
+    stock_rollup.apply_asset(cursor, asset_id, -1)
+    cursor.execute(
+        'UPDATE assets SET name = %s, stock_count = %s, deduction = %s, date = %s WHERE id = %s',
+        (name, stock_count, deduction, date, asset_id)
+    )
+    stock_rollup.apply_asset(cursor, asset_id, 1)
+    low_stock.refresh_assets(cursor, [asset_id])
+    table_versions.bump(cursor, 'assets')
+    event_id = None
+    if previous:
+        event_id = change_feed.publish(cursor, 'asset.updated', {
+            'asset': change_feed.asset_snapshot(cursor, asset_id),
+            'previous': previous,
+        })
+    mysql.connection.commit()
+    cursor.close()
+    cache.get_cache().invalidate('assets')
+    search_index.get_index().asset_written(asset_id, name, event_id)
+    return jsonify({'message': 'Asset updated successfully'})
+
+
+@bp.route('/api/resources/<int:resource_id>/assets', methods=['POST'])
+@login_required
+def add_asset(resource_id):
+    data = request.get_json()
+    name = data.get('name')
+    stock_count = data.get('stockCount')
+    deduction = data.get('deduction')
+    date = data.get('date')
+
+    if not all([name, stock_count, deduction, date]):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    cursor = mysql.connection.cursor()
+    cursor.execute(
+        'INSERT INTO assets (resource_id, name, stock_count, deduction, date) VALUES (%s, %s, %s, %s, %s)',
+        (resource_id, name, stock_count, deduction, date)
+    )
+    asset_id = cursor.lastrowid
+    stock_rollup.apply_asset(cursor, asset_id, 1)
+    low_stock.refresh_assets(cursor, [asset_id])
+    table_versions.bump(cursor, 'assets')
+    event_id = change_feed.publish(cursor, 'asset.created', {'asset': change_feed.asset_snapshot(cursor, asset_id)})
+    mysql.connection.commit()
+    cursor.close()
+    cache.get_cache().invalidate('assets')
+    search_index.get_index().asset_written(asset_id, name, event_id, resource_id)
+    return jsonify(
+        {'id': asset_id, 'resource_id': resource_id, 'name': name, 'stockCount': stock_count, 'deduction': deduction,
+         'date': date}), 201
+
+
+@bp.route('/api/assets/<int:asset_id>', methods=['DELETE'])
+@login_required
+def delete_asset(asset_id):
+    cursor = mysql.connection.cursor()
+    previous = change_feed.asset_snapshot(cursor, asset_id)
+    deleted, _ = asset_archive.soft_delete(cursor, [asset_id], 1)
+    if not deleted:
+        mysql.connection.rollback()
+        cursor.close()
+        return jsonify({'error': 'Asset not found'}), 404
+
+    event_id = change_feed.publish(cursor, 'asset.deleted', {'asset': previous})
+    mysql.connection.commit()
+    cursor.close()
+    cache.get_cache().invalidate('assets')
+    search_index.get_index().asset_removed(asset_id, event_id)
+
+    return jsonify({'message': 'Asset moved to deleted_assets table'})
+
+
+@bp.route('/api/assets/bulk/delete', methods=['POST'])
+@login_required
+def bulk_delete_assets():
+    # {"ids": [...]}: every asset found is moved to deleted_assets in one transaction
+    try:
+        ids = asset_archive.parse_ids(request.get_json(silent=True), current_app.config['ASSET_BULK_MAX_ROWS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = mysql.connection.cursor()
+    try:
+        deleted, _ = asset_archive.soft_delete(cursor, ids, current_app.config['ASSET_BULK_BATCH_SIZE'])
+        if deleted:
+            event_id = change_feed.publish(cursor, 'assets.bulk',
+                                           change_feed.bulk_payload(deleted, deleted=len(deleted)))
+        mysql.connection.commit()
+    except Exception as e:
+        mysql.connection.rollback()
+        return jsonify({'error': f'Bulk delete failed, no assets were deleted: {str(e)}'}), 500
+    finally:
+        cursor.close()
+    if deleted:
+        cache.get_cache().invalidate('assets')
+        search_index.get_index().assets_removed(deleted, event_id)
+
+    return jsonify({
+        'deleted': len(deleted),
+        'notFound': [asset_id for asset_id in ids if asset_id not in deleted],
+    })
+
+
+@bp.route('/api/assets/bulk/restore', methods=['POST'])
+@login_required
+def bulk_restore_assets():
+    # {"ids": [...]}: moves assets back from deleted_assets (not from the archive) with their ids
+    try:
+        ids = asset_archive.parse_ids(request.get_json(silent=True), current_app.config['ASSET_BULK_MAX_ROWS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = mysql.connection.cursor()
+    try:
+        restored, skipped, _ = asset_archive.restore(cursor, ids, current_app.config['ASSET_BULK_BATCH_SIZE'])
+        if restored:
+            event_id = change_feed.publish(cursor, 'assets.bulk',
+                                           change_feed.bulk_payload(restored, restored=len(restored)))
+        mysql.connection.commit()
+    except Exception as e:
+        mysql.connection.rollback()
+        return jsonify({'error': f'Bulk restore failed, no assets were restored: {str(e)}'}), 500
+    finally:
+        cursor.close()
+    if restored:
+        cache.get_cache().invalidate('assets')
+        search_index.get_index().assets_written(restored, event_id)
+
+    return jsonify({
+        'restored': len(restored),
+        'skipped': [{'id': asset_id, 'reason': reason} for asset_id, reason in skipped.items()],
+    })
+
+
+# Reorder thresholds
+def parse_threshold(data):
+    # null clears the threshold so the section's (or the default) applies again
+    threshold = (data or {}).get('threshold')
+    if threshold is not None and (not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 0):
+        raise ValueError('threshold must be a non-negative integer or null')
+    return threshold
+
+
+@bp.route('/api/assets/<int:asset_id>/threshold', methods=['PUT'])
+@login_required
+def set_asset_threshold(asset_id):
+    try:
+        threshold = parse_threshold(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = mysql.connection.cursor()
+    cursor.execute('SELECT id FROM assets WHERE id = %s FOR UPDATE', (asset_id,))
+    if not cursor.fetchone():
+        cursor.close()
+        return jsonify({'error': 'Asset not found'}), 404
+    previous = change_feed.asset_snapshot(cursor, asset_id)
+
+    cursor.execute('UPDATE assets SET reorder_threshold = %s WHERE id = %s', (threshold, asset_id))
+    low_stock.refresh_assets(cursor, [asset_id])
+    table_versions.bump(cursor, 'assets')
+    change_feed.publish(cursor, 'asset.updated', {
+        'asset': change_feed.asset_snapshot(cursor, asset_id),
+        'previous': previous,
+    })
+    mysql.connection.commit()
+    cursor.close()
+    cache.get_cache().invalidate('assets')
+    return jsonify({'id': asset_id, 'reorderThreshold': threshold})
+
+
+@bp.route('/api/sections/thresholds', methods=['GET'])
+@versioned('section_thresholds')
+def get_section_thresholds():
+    cursor = mysql.connection.cursor(cursorclass=DictCursor)
+    cursor.execute('SELECT section, threshold FROM section_thresholds ORDER BY section')
+    sections = cursor.fetchall()
+    cursor.close()
+    return jsonify({'default': low_stock.default_threshold(), 'sections': sections})
+
+
+@bp.route('/api/sections/<section>/threshold', methods=['PUT'])
+@login_required
+def set_section_threshold(section):
+    try:
+        threshold = parse_threshold(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = mysql.connection.cursor()
+    if threshold is None:
+        cursor.execute('DELETE FROM section_thresholds WHERE section = %s', (section,))
+    else:
+        cursor.execute("""
+            INSERT INTO section_thresholds (section, threshold) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE threshold = VALUES(threshold)
+        """, (section, threshold))
+    low_stock.refresh_section(cursor, section)
+    table_versions.bump(cursor, 'section_thresholds')
+    # Membership of a whole section can change; clients refetch the low-stock list
+    change_feed.publish(cursor, 'section_threshold.updated', {'section': section, 'threshold': threshold})
+    mysql.connection.commit()
+    cursor.close()
+    return jsonify({'section': section, 'threshold': threshold})
+
+
+@bp.route('/api/assets/bulk', methods=['POST', 'PUT'])
+@login_required
+def bulk_assets():
+    # POST creates assets, PUT updates them (rows need an id). Accepts a JSON array or a
+    # text/csv body, which is read and written batch by batch as it streams in.
+    for_update = request.method == 'PUT'
+    batch_size = min(request.args.get('batchSize', type=int) or current_app.config['ASSET_BULK_BATCH_SIZE'],
+                     current_app.config['ASSET_BULK_MAX_BATCH_SIZE'])
+    if batch_size < 1:
+        return jsonify({'error': 'batchSize must be a positive integer'}), 400
+    max_rows = current_app.config['ASSET_BULK_MAX_ROWS']
+
+    if request.mimetype == 'text/csv':
+        rows = asset_bulk.csv_rows(request.stream)
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            return jsonify({'error': 'Expected a JSON array of assets or a text/csv body'}), 400
+
+    cursor = mysql.connection.cursor()
+    try:
+        writer = asset_bulk.BulkAssetWriter(cursor, for_update, batch_size)
+        for row_number, row in enumerate(rows, start=1):
+            if row_number > max_rows:
+                mysql.connection.rollback()
+                return jsonify({'error': f'At most {max_rows} rows can be imported at once'}), 413
+            writer.add(row_number, row)
+        results = writer.finish()
+        if writer.written:
+            # Too many rows to describe one by one; clients refetch the summary
+            event_id = change_feed.publish(cursor, 'assets.bulk', change_feed.bulk_payload(
+                writer.assets, written=writer.written, updated=for_update))
+        mysql.connection.commit()
+    except Exception as e:
+        mysql.connection.rollback()
+        return jsonify({'error': f'Bulk write failed, no rows were saved: {str(e)}'}), 500
+    finally:
+        cursor.close()
+    cache.get_cache().invalidate('assets')
+    if writer.written:
+        search_index.get_index().assets_written(writer.assets, event_id)
+
+    written = sum(1 for result in results if result['status'] in ('created', 'updated'))
+    return jsonify({
+        'written': written,
+        'failed': len(results) - written,
+        'results': results,
+    }), 200
+
+
+@bp.cli.command('backfill-stock-rollup')
+def backfill_stock_rollup():
+    """Rebuild the asset_daily_stock rollup from the assets table."""
+    cursor = mysql.connection.cursor()
+    days = stock_rollup.backfill(cursor)
+    mysql.connection.commit()
+    cursor.close()
+    click.echo(f'Backfilled {days} days into asset_daily_stock')
+
+
+@bp.cli.command('compact-stock-ledger')
+def compact_stock_ledger():
+    """Fold recent stock movements into a new snapshot and drop old snapshots."""
+    cursor = mysql.connection.cursor()
+    snapshot = stock_ledger.compact(cursor, current_app.config['STOCK_SNAPSHOT_LAG'])
+    mysql.connection.commit()
+    if snapshot:
+        click.echo(f'Snapshot {snapshot[0]} holds {snapshot[1]} assets')
+    else:
+        click.echo('No new stock movements to compact')
+    pruned = stock_ledger.prune_snapshots(cursor, current_app.config['STOCK_SNAPSHOTS_KEPT'])
+    mysql.connection.commit()
+    cursor.close()
+    if pruned:
+        click.echo(f'Dropped {pruned} old snapshot(s)')
+
+
+@bp.cli.command('archive-deleted-assets')
+@click.option('--batch-size', type=int, help='Rows moved per transaction [default: DELETED_ASSETS_ARCHIVE_BATCH_SIZE].')
+@click.option('--max-batches', type=int, help='Stop after this many batches; the next run carries on.')
+def archive_deleted_assets(batch_size, max_batches):
+    """Move old deleted_assets rows to the archive and drop expired archive months."""
+    config = current_app.config
+    cutoff = datetime.now() - timedelta(days=config['DELETED_ASSETS_ARCHIVE_AFTER'])
+    moved = asset_archive.archive(mysql.connection, cutoff, batch_size or config['DELETED_ASSETS_ARCHIVE_BATCH_SIZE'],
+                                  max_batches, config['DELETED_ASSETS_ARCHIVE_PAUSE'])
+    click.echo(f'Archived {moved} deleted assets from before {cutoff:%Y-%m-%d %H:%M}')
+
+    if config['DELETED_ASSETS_ARCHIVE_RETENTION'] is not None:
+        before = datetime.now() - timedelta(days=config['DELETED_ASSETS_ARCHIVE_RETENTION'])
+        for path in asset_archive.purge(mysql.connection, before, config['DELETED_ASSETS_EXPORT_DIR']):
+            click.echo(f'Exported and dropped {path}')
+
+
+@bp.cli.command('sweep-images')
+def sweep_images():
+    """Remove uploaded images no resource refers to any more."""
+    config = current_app.config
+    cursor = mysql.connection.cursor()
+    removed = images.sweep_unreferenced(cursor, config['UPLOAD_FOLDER'], config['IMAGE_VARIANTS'],
+                                        config['IMAGE_SWEEP_GRACE'])
+    cursor.close()
+    click.echo(f'Removed {len(removed)} unreferenced image(s)')
+
+
+@bp.cli.command('backfill-low-stock')
+def backfill_low_stock():
+    """Rebuild low_stock_assets from the assets table and current thresholds."""
+    cursor = mysql.connection.cursor()
+    rows = low_stock.backfill(cursor)
+    mysql.connection.commit()
+    cursor.close()
+    click.echo(f'{rows} assets are below their reorder threshold')
+
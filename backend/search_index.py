@@ -0,0 +1,403 @@
+import bisect
+import collections
+import heapq
+import json
+import re
+import threading
+
+from flask import current_app
+
+from db import register_query
+import change_feed
+
+# In-process index over the words of asset names (plus the owning resource's name)
+# for typeahead and typo-tolerant search. Each worker keeps its own copy, loaded in
+# full once and then kept current from change_events: every write in any process
+# publishes an event, and a search first reloads just the rows touched by events
+# past the last one applied. The index is only rebuilt when it cannot follow the feed
+# (pruned or too many events, or a bulk write too large to list its ids).
+
+INDEX_RESOURCES_QUERY = register_query('search.index_resources', 'SELECT id, name FROM resources',
+                                       allow_full_scan=True)
+INDEX_ASSETS_QUERY = register_query('search.index_assets', """
+    SELECT a.id, a.resource_id, a.name
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+""", allow_full_scan=True)
+
+# Hits carry only ids; the join runs for the page that is actually returned
+SEARCH_PAGE_QUERY = """
+    SELECT
+        a.id,
+        a.name AS asset_name,
+        r.name AS resource_name,
+        a.stock_count,
+        a.deduction,
+        a.date,
+        r.section
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    WHERE a.id IN ({ids})
+"""
+register_query('search.page', SEARCH_PAGE_QUERY.format(ids='%s, %s'), (1, 2))
+
+FEED_HEAD_QUERY = 'SELECT COALESCE(MAX(id), 0) FROM change_events'
+
+INDEX_RESOURCES_BY_ID_QUERY = 'SELECT id, name FROM resources WHERE id IN ({ids})'
+register_query('search.resources_by_id', INDEX_RESOURCES_BY_ID_QUERY.format(ids='%s, %s'), (1, 2))
+INDEX_ASSETS_BY_ID_QUERY = """
+    SELECT a.id, a.resource_id, a.name
+    FROM assets a
+    JOIN resources r ON a.resource_id = r.id
+    WHERE a.id IN ({ids})
+"""
+register_query('search.assets_by_id', INDEX_ASSETS_BY_ID_QUERY.format(ids='%s, %s'), (1, 2))
+
+NON_WORD = re.compile(r'[^0-9a-z]+')
+
+# How well a query word matches a name word: exact, prefix (still typing), or a
+# misspelling whose trigram Dice similarity clears MIN_FUZZY_SIMILARITY. Fuzzy scores
+# are rounded down to one decimal so documents fall into a few score tiers.
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+MAX_FUZZY_SCORE = 0.8
+MIN_FUZZY_SIMILARITY = 0.4
+MIN_FUZZY_LENGTH = 3
+
+
+def tokenize(text):
+    return NON_WORD.sub(' ', (text or '').lower()).split()
+
+
+def _fetch_by_ids(cursor, query, ids, chunk_size=1000):
+    ids = list(ids)
+    rows = []
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        cursor.execute(query.format(ids=', '.join(['%s'] * len(chunk))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def word_grams(word):
+    # Padded like pg_trgm: "  s", " sy", "syr", ... "ge "
+    padded = '  ' + word + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Held while the index catches up with the change feed or is rebuilt
+        self.update_lock = threading.Lock()
+        self.rebuilding = False
+        self.last_event_id = None  # change_events id the index is current to
+        self.resources = {}  # resource id -> name
+        self.assets = {}  # asset id -> (name, resource id)
+        self.resource_assets = collections.defaultdict(set)
+        self.doc_words = {}  # asset id -> words of the asset and resource name
+        self.word_assets = {}  # word -> asset ids
+        self.words = []  # sorted vocabulary, for prefix ranges
+        self.gram_words = collections.defaultdict(set)  # trigram -> words
+
+    # Maintenance
+    def _add_word(self, word, asset_id):
+        if word not in self.word_assets:
+            self.word_assets[word] = set()
+            bisect.insort(self.words, word)
+            for gram in word_grams(word):
+                self.gram_words[gram].add(word)
+        self.word_assets[word].add(asset_id)
+
+    def _drop_word(self, word, asset_id):
+        ids = self.word_assets[word]
+        ids.discard(asset_id)
+        if not ids:
+            del self.word_assets[word]
+            del self.words[bisect.bisect_left(self.words, word)]
+            for gram in word_grams(word):
+                self.gram_words[gram].discard(word)
+                if not self.gram_words[gram]:
+                    del self.gram_words[gram]
+
+    def _index_asset(self, asset_id):
+        name, resource_id = self.assets[asset_id]
+        words = frozenset(tokenize(name) + tokenize(self.resources[resource_id]))
+        self.doc_words[asset_id] = words
+        for word in words:
+            self._add_word(word, asset_id)
+
+    def _unindex_asset(self, asset_id):
+        for word in self.doc_words.pop(asset_id, ()):
+            self._drop_word(word, asset_id)
+
+    def _put_asset(self, asset_id, name, resource_id):
+        self._remove_asset(asset_id)
+        if resource_id not in self.resources:
+            # Orphaned assets never come back from the page join
+            return
+        self.assets[asset_id] = (name, resource_id)
+        self.resource_assets[resource_id].add(asset_id)
+        self._index_asset(asset_id)
+
+    def _remove_asset(self, asset_id):
+        old = self.assets.pop(asset_id, None)
+        if old:
+            self.resource_assets[old[1]].discard(asset_id)
+            self._unindex_asset(asset_id)
+
+    def _put_resource(self, resource_id, name):
+        # A rename only touches the words it adds or drops; the assets' own words
+        # (often unique, and costly to take out of the vocabulary) stay as they are
+        old_words = set(tokenize(self.resources.get(resource_id)))
+        new_words = set(tokenize(name))
+        self.resources[resource_id] = name
+        dropped, added = old_words - new_words, new_words - old_words
+        if not dropped and not added:
+            return
+        for asset_id in self.resource_assets[resource_id]:
+            own = set(tokenize(self.assets[asset_id][0]))
+            words = set(self.doc_words[asset_id])
+            for word in dropped - own:
+                words.discard(word)
+                self._drop_word(word, asset_id)
+            for word in added - own:
+                words.add(word)
+                self._add_word(word, asset_id)
+            self.doc_words[asset_id] = frozenset(words)
+
+    def _remove_resource(self, resource_id):
+        for asset_id in list(self.resource_assets[resource_id]):
+            self._remove_asset(asset_id)
+        self.resource_assets.pop(resource_id, None)
+        self.resources.pop(resource_id, None)
+
+    def rebuild(self, cursor):
+        # The feed position is read first: anything written after it is replayed
+        # on top of the loaded rows, which is harmless since replays reload rows
+        cursor.execute(FEED_HEAD_QUERY)
+        head = cursor.fetchone()[0]
+        fresh = SearchIndex()
+        cursor.execute(INDEX_RESOURCES_QUERY)
+        fresh.resources = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.execute(INDEX_ASSETS_QUERY)
+        for asset_id, resource_id, name in cursor.fetchall():
+            fresh._put_asset(asset_id, name, resource_id)
+        with self.lock:
+            self.resources, self.assets = fresh.resources, fresh.assets
+            self.resource_assets, self.doc_words = fresh.resource_assets, fresh.doc_words
+            self.word_assets, self.words = fresh.word_assets, fresh.words
+            self.gram_words = fresh.gram_words
+            self.last_event_id = head
+
+    def ensure_current(self, cursor, replay_limit):
+        if self.last_event_id is None:
+            with self.update_lock:
+                if self.last_event_id is None:
+                    self.rebuild(cursor)
+            return
+
+        # During a rebuild, searches keep using the current copy instead of waiting
+        if not self.update_lock.acquire(blocking=not self.rebuilding):
+            return
+        try:
+            events, head = change_feed.replay(cursor, self.last_event_id, replay_limit)
+            if head < self.last_event_id:
+                # A replica that is behind this copy; it catches up on its own
+                return
+            if events is None or not self.replay(cursor, events):
+                self.rebuilding = True
+                try:
+                    self.rebuild(cursor)
+                finally:
+                    self.rebuilding = False
+        finally:
+            self.update_lock.release()
+
+    def replay(self, cursor, events):
+        """Apply change_events rows by reloading the assets and resources they touched.
+
+        Returns False for an event that does not say which rows it touched (a bulk
+        write too large to list them); the caller rebuilds instead.
+        """
+        if not events:
+            return True
+        asset_ids, resource_ids = set(), set()
+        for _, event_type, payload in events:
+            data = json.loads(payload)
+            if event_type.startswith('asset.'):
+                asset_ids.add((data.get('asset') or {}).get('id'))
+            elif event_type.startswith('resource.'):
+                resource_ids.add((data.get('resource') or {}).get('id'))
+            elif event_type == 'assets.bulk':
+                if 'ids' not in data:
+                    return False
+                asset_ids.update(data['ids'])
+        asset_ids.discard(None)
+        resource_ids.discard(None)
+
+        resources = dict(_fetch_by_ids(cursor, INDEX_RESOURCES_BY_ID_QUERY, resource_ids))
+        assets = {row[0]: row[1:] for row in _fetch_by_ids(cursor, INDEX_ASSETS_BY_ID_QUERY, asset_ids)}
+        with self.lock:
+            for resource_id in resource_ids:
+                if resource_id in resources:
+                    self._put_resource(resource_id, resources[resource_id])
+                else:
+                    self._remove_resource(resource_id)
+            for asset_id in asset_ids:
+                if asset_id in assets:
+                    resource_id, name = assets[asset_id]
+                    self._put_asset(asset_id, name, resource_id)
+                else:
+                    self._remove_asset(asset_id)
+            self.last_event_id = max(self.last_event_id, events[-1][0])
+        return True
+
+    # Writes made by this process are applied at once when their change event is the
+    # very next one; otherwise the next search picks them up from the feed.
+    def _advance(self, event_id):
+        if event_id is None or self.last_event_id is None or event_id != self.last_event_id + 1:
+            return False
+        self.last_event_id = event_id
+        return True
+
+    def asset_written(self, asset_id, name, event_id, resource_id=None):
+        with self.lock:
+            if self._advance(event_id):
+                if resource_id is None and asset_id in self.assets:
+                    resource_id = self.assets[asset_id][1]
+                self._put_asset(asset_id, name, resource_id)
+
+    def asset_removed(self, asset_id, event_id):
+        with self.lock:
+            if self._advance(event_id):
+                self._remove_asset(asset_id)
+
+    def assets_removed(self, asset_ids, event_id):
+        # One event for many assets, e.g. a bulk delete
+        with self.lock:
+            if self._advance(event_id):
+                for asset_id in asset_ids:
+                    self._remove_asset(asset_id)
+
+    def assets_written(self, assets, event_id):
+        # assets: {asset id: (resource id, name)} written under one event
+        with self.lock:
+            if self._advance(event_id):
+                for asset_id, (resource_id, name) in assets.items():
+                    self._put_asset(asset_id, name, resource_id)
+
+    def resource_written(self, resource_id, name, event_id):
+        with self.lock:
+            if self._advance(event_id):
+                self._put_resource(resource_id, name)
+
+    def resource_removed(self, resource_id, event_id):
+        with self.lock:
+            if self._advance(event_id):
+                self._remove_resource(resource_id)
+
+    # Queries
+    def _word_matches(self, token):
+        matches = {}
+        if token in self.word_assets:
+            matches[token] = EXACT_SCORE
+        start = bisect.bisect_left(self.words, token)
+        for word in self.words[start:bisect.bisect_left(self.words, token + '\uffff')]:
+            matches.setdefault(word, PREFIX_SCORE)
+
+        if len(token) >= MIN_FUZZY_LENGTH:
+            grams = word_grams(token)
+            shared = collections.Counter()
+            for gram in grams:
+                shared.update(self.gram_words.get(gram, ()))
+            for word, count in shared.items():
+                if word in matches:
+                    continue
+                # A word of n characters has n + 1 padded trigrams
+                similarity = 2 * count / (len(grams) + len(word) + 1)
+                if similarity >= MIN_FUZZY_SIMILARITY:
+                    matches[word] = min(int(similarity * 10) / 10, MAX_FUZZY_SCORE)
+        return matches
+
+    def _tiers(self, token):
+        # [(score, ids whose best match for this token scores exactly that)], best first
+        by_score = collections.defaultdict(list)
+        for word, score in self._word_matches(token).items():
+            by_score[score].append(self.word_assets[word])
+
+        tiers, seen = [], set()
+        for score in sorted(by_score, reverse=True):
+            ids = set().union(*by_score[score]) - seen
+            if ids:
+                tiers.append((score, ids))
+                seen |= ids
+        return tiers, seen
+
+    def search(self, query, limit, offset=0):
+        """Return ([(asset id, score)], total hits) for one page of ranked results.
+
+        Every query word has to match a word of the asset or resource name; words
+        that match nothing at all are ignored so one stray word does not empty the
+        result. Ties are ordered newest asset first.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        with self.lock:
+            matched = [(tiers, ids) for tiers, ids in map(self._tiers, tokens) if tiers]
+            if not matched:
+                return [], 0
+
+            per_token = [tiers for tiers, _ in matched]
+            total = len(set.intersection(*[ids for _, ids in matched]))
+            wanted = offset + limit
+            hits = []
+
+            # Walk tier combinations best total score first; each combination's
+            # intersection holds the assets scoring exactly that much.
+            start = (0,) * len(per_token)
+            queue = [(-combination_score(per_token, start), start)]
+            visited = {start}
+            while queue and len(hits) < wanted:
+                negative_score, combination = heapq.heappop(queue)
+                ids = set.intersection(*[per_token[i][tier][1] for i, tier in enumerate(combination)])
+                score = round(-negative_score / len(per_token), 4)
+                hits.extend((asset_id, score) for asset_id in heapq.nlargest(wanted - len(hits), ids))
+
+                for i in range(len(combination)):
+                    following = combination[:i] + (combination[i] + 1,) + combination[i + 1:]
+                    if following[i] < len(per_token[i]) and following not in visited:
+                        visited.add(following)
+                        heapq.heappush(queue, (-combination_score(per_token, following), following))
+
+        return hits[offset:wanted], total
+
+
+def combination_score(per_token, combination):
+    return sum(per_token[i][tier][0] for i, tier in enumerate(combination))
+
+
+def init_app(app):
+    app.config.setdefault('SEARCH_DEFAULT_LIMIT', 10)
+    app.config.setdefault('SEARCH_MAX_LIMIT', 50)
+    app.config.setdefault('SEARCH_REPLAY_LIMIT', 5000)
+    app.extensions['search_index'] = SearchIndex()
+
+
+def get_index():
+    return current_app.extensions['search_index']
+
+
+def fetch_page(cursor, hits):
+    # Runs the join for one page of hits and returns rows in rank order
+    if not hits:
+        return []
+    ids = [asset_id for asset_id, _ in hits]
+    cursor.execute(SEARCH_PAGE_QUERY.format(ids=', '.join(['%s'] * len(ids))), ids)
+    rows = {row['id']: row for row in cursor.fetchall()}
+    results = []
+    for asset_id, score in hits:
+        row = rows.get(asset_id)
+        if row:
+            row['score'] = score
+            results.append(row)
+    return results
@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+
+from db import register_query
+
+# Stock history. Triggers on assets (migration 0006) append a row to stock_movements
+# for every insert, stock change and delete, so `assets` stays the cheap current-state
+# read and nothing is lost when a row is overwritten. compact() periodically folds the
+# movements into a snapshot of every asset; the state at any earlier time is then the
+# latest snapshot before it plus the short tail of movements after that snapshot,
+# never a scan of the whole history.
+
+SNAPSHOT_BEFORE_QUERY = register_query('ledger.snapshot_before', """
+    SELECT id, last_movement_id FROM stock_snapshots
+    WHERE taken_at < %s
+    ORDER BY taken_at DESC
+    LIMIT 1
+""", ('2024-01-01',))
+
+# Snapshot rows not touched by the tail, plus each tail asset's latest movement.
+# The {..._resources} slots narrow both halves to some resources.
+STATE_QUERY = """
+    SELECT s.asset_id, s.resource_id, s.stock_count, s.deduction, s.asset_date
+    FROM stock_snapshot_rows s
+    LEFT JOIN (
+        SELECT DISTINCT asset_id FROM stock_movements
+        WHERE id > %s AND recorded_at < %s
+    ) touched ON touched.asset_id = s.asset_id
+    WHERE s.snapshot_id = %s AND touched.asset_id IS NULL {snapshot_resources}
+    UNION ALL
+    SELECT m.asset_id, m.resource_id, m.stock_count, m.deduction, m.asset_date
+    FROM stock_movements m
+    JOIN (
+        SELECT MAX(id) AS id FROM stock_movements
+        WHERE id > %s AND recorded_at < %s
+        GROUP BY asset_id
+    ) latest ON latest.id = m.id
+    WHERE m.kind <> 'delete' {tail_resources}
+"""
+register_query('ledger.state', STATE_QUERY.format(snapshot_resources='', tail_resources=''),
+               (0, '2024-01-01', 1, 0, '2024-01-01'))
+
+HISTORY_QUERY = register_query('ledger.history', """
+    SELECT id, kind, stock_count, deduction, asset_date, stock_delta, recorded_at
+    FROM stock_movements
+    WHERE asset_id = %s AND id > %s
+    ORDER BY id
+    LIMIT %s
+""", (1, 0, 50))
+
+
+RESOURCE_IDS_QUERY = register_query('ledger.resource_ids', 'SELECT id FROM resources WHERE name = %s', ('Gloves',))
+
+
+def resource_ids(cursor, name):
+    cursor.execute(RESOURCE_IDS_QUERY, (name,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def asset_names(cursor, resource_ids, asset_ids):
+    # Current names, falling back to deleted_assets and then the archive for assets
+    # removed since
+    names = {}
+    if resource_ids:
+        cursor.execute(f"SELECT id, name FROM assets WHERE resource_id IN ({', '.join(['%s'] * len(resource_ids))})",
+                       list(resource_ids))
+        names.update(cursor.fetchall())
+    for table in ('deleted_assets', 'deleted_assets_archive'):
+        missing = [asset_id for asset_id in asset_ids if asset_id not in names]
+        for start in range(0, len(missing), 1000):
+            chunk = missing[start:start + 1000]
+            cursor.execute(f"SELECT id, name FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            names.update(cursor.fetchall())
+    return names
+
+
+def parse_before(value):
+    """Exclusive upper bound for a point-in-time read.
+
+    A date means the end of that day; a full timestamp is used as given. None means now.
+    """
+    if not value:
+        return None
+    if 'T' in value or ' ' in value:
+        return datetime.fromisoformat(value)
+    return datetime.strptime(value, '%Y-%m-%d') + timedelta(days=1)
+
+
+def _resource_filter(column, resource_ids):
+    if resource_ids is None:
+        return '', []
+    return f" AND {column} IN ({', '.join(['%s'] * len(resource_ids))})", list(resource_ids)
+
+
+def current(cursor, resource_ids):
+    # The present needs no history: assets is the live snapshot
+    if not resource_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT id, resource_id, stock_count, deduction, date FROM assets
+        WHERE resource_id IN ({', '.join(['%s'] * len(resource_ids))})
+    """, list(resource_ids))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def state(cursor, before, resource_ids=None):
+    """Return {asset_id: (resource_id, stock_count, deduction, asset_date)} as of `before`.
+
+    Assets that did not exist yet, or had been deleted by then, are left out.
+    """
+    if resource_ids is not None and not resource_ids:
+        return {}
+    cursor.execute(SNAPSHOT_BEFORE_QUERY, (before,))
+    snapshot = cursor.fetchone()
+    snapshot_id, last_movement_id = snapshot if snapshot else (0, 0)
+
+    snapshot_resources, snapshot_params = _resource_filter('s.resource_id', resource_ids)
+    tail_resources, tail_params = _resource_filter('m.resource_id', resource_ids)
+    cursor.execute(
+        STATE_QUERY.format(snapshot_resources=snapshot_resources, tail_resources=tail_resources),
+        [last_movement_id, before, snapshot_id] + snapshot_params + [last_movement_id, before] + tail_params
+    )
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+
+def movement_counts(cursor, start, end, resource_ids=None):
+    # {asset_id: (movements, net stock change)} recorded in [start, end)
+    resources, params = _resource_filter('resource_id', resource_ids)
+    cursor.execute(f"""
+        SELECT asset_id, COUNT(*), SUM(stock_delta) FROM stock_movements
+        WHERE recorded_at >= %s AND recorded_at < %s {resources}
+        GROUP BY asset_id
+    """, [start, end] + params)
+    return {row[0]: (row[1], int(row[2])) for row in cursor.fetchall()}
+
+
+def history(cursor, asset_id, after_id=0, limit=50):
+    cursor.execute(HISTORY_QUERY, (asset_id, after_id, limit))
+    return [{
+        'id': row[0],
+        'kind': row[1],
+        'stockCount': row[2],
+        'deduction': row[3],
+        'date': row[4].strftime('%Y-%m-%d') if row[4] else None,
+        'stockDelta': row[5],
+        'recordedAt': row[6].isoformat(),
+    } for row in cursor.fetchall()]
+
+
+# Compaction
+def compact(cursor, lag):
+    """Write a new snapshot from the previous one plus the movements since.
+
+    Movements younger than `lag` seconds are left for the next run, so a transaction
+    that took its movement id earlier but commits late is not skipped. Returns
+    (snapshot_id, asset_count), or None when there was nothing to fold in.
+    """
+    cursor.execute('SELECT id, last_movement_id FROM stock_snapshots ORDER BY id DESC LIMIT 1')
+    previous = cursor.fetchone()
+    previous_id, previous_last = previous if previous else (0, 0)
+
+    cursor.execute("""
+        SELECT MAX(id), MAX(recorded_at) FROM stock_movements
+        WHERE id > %s AND recorded_at < NOW(6) - INTERVAL %s SECOND
+    """, (previous_last, lag))
+    last_movement_id, taken_at = cursor.fetchone()
+    if last_movement_id is None:
+        return None
+
+    cursor.execute('INSERT INTO stock_snapshots (last_movement_id, taken_at) VALUES (%s, %s)',
+                   (last_movement_id, taken_at))
+    snapshot_id = cursor.lastrowid
+
+    # Unchanged assets carry over; changed ones take their latest movement
+    cursor.execute("""
+        INSERT INTO stock_snapshot_rows (snapshot_id, asset_id, resource_id, stock_count, deduction, asset_date)
+        SELECT %s, s.asset_id, s.resource_id, s.stock_count, s.deduction, s.asset_date
+        FROM stock_snapshot_rows s
+        LEFT JOIN (
+            SELECT DISTINCT asset_id FROM stock_movements WHERE id > %s AND id <= %s
+        ) touched ON touched.asset_id = s.asset_id
+        WHERE s.snapshot_id = %s AND touched.asset_id IS NULL
+    """, (snapshot_id, previous_last, last_movement_id, previous_id))
+    asset_count = cursor.rowcount
+    cursor.execute("""
+        INSERT INTO stock_snapshot_rows (snapshot_id, asset_id, resource_id, stock_count, deduction, asset_date)
+        SELECT %s, m.asset_id, m.resource_id, m.stock_count, m.deduction, m.asset_date
+        FROM stock_movements m
+        JOIN (
+            SELECT MAX(id) AS id FROM stock_movements
+            WHERE id > %s AND id <= %s
+            GROUP BY asset_id
+        ) latest ON latest.id = m.id
+        WHERE m.kind <> 'delete'
+    """, (snapshot_id, previous_last, last_movement_id))
+    asset_count += cursor.rowcount
+
+    cursor.execute('UPDATE stock_snapshots SET asset_count = %s WHERE id = %s', (asset_count, snapshot_id))
+    return snapshot_id, asset_count
+
+
+def prune_snapshots(cursor, keep):
+    # Older snapshots only speed up reads of the distant past; the movements remain.
+    # The header goes first so no reader picks a half-deleted snapshot.
+    cursor.execute('SELECT id FROM stock_snapshots ORDER BY id DESC')
+    expired = [row[0] for row in cursor.fetchall()][keep:]
+    for snapshot_id in expired:
+        cursor.execute('DELETE FROM stock_snapshots WHERE id = %s', (snapshot_id,))
+        cursor.execute('DELETE FROM stock_snapshot_rows WHERE snapshot_id = %s', (snapshot_id,))
+    return len(expired)
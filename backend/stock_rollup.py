@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from db import register_query
+
+# Daily stock totals (asset_daily_stock), kept in step with the assets table by the
+# write endpoints so the dashboard timeline never has to scan the full asset history.
+
+# Each bucket maps a day onto the first day of its period
+BUCKET_EXPRESSIONS = {
+    'day': 'day',
+    'week': 'DATE_SUB(day, INTERVAL WEEKDAY(day) DAY)',
+    'month': 'DATE_SUB(day, INTERVAL DAYOFMONTH(day) - 1 DAY)',
+}
+
+
+def apply_asset(cursor, asset_id, sign):
+    # Add (sign=1) or remove (sign=-1) one asset row's contribution to its day.
+    # Call with -1 before changing/deleting the row and +1 after inserting/updating it,
+    # inside the same transaction as the asset write.
+    cursor.execute("""
+        INSERT INTO asset_daily_stock (day, total_assets, asset_count)
+        SELECT DATE(date), %s * (stock_count - deduction), %s
+        FROM assets
+        WHERE id = %s
+        ON DUPLICATE KEY UPDATE
+            total_assets = total_assets + VALUES(total_assets),
+            asset_count = asset_count + VALUES(asset_count)
+    """, (sign, sign, asset_id))
+
+
+def add_delta(deltas, day, stock_count, deduction, sign):
+    total, count = deltas.get(day, (0, 0))
+    deltas[day] = (total + sign * (stock_count - deduction), count + sign)
+
+
+def apply_deltas(cursor, deltas):
+    # Batched form of apply_asset for bulk writes: deltas maps day -> (total_assets, asset_count)
+    rows = [(day, total, count) for day, (total, count) in deltas.items() if total or count]
+    if rows:
+        cursor.executemany("""
+            INSERT INTO asset_daily_stock (day, total_assets, asset_count) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                total_assets = total_assets + VALUES(total_assets),
+                asset_count = asset_count + VALUES(asset_count)
+        """, rows)
+
+
+def backfill(cursor):
+    # Rebuild the whole rollup from assets; run once after deploying, while writes are quiet
+    cursor.execute('DELETE FROM asset_daily_stock')
+    cursor.execute("""
+        INSERT INTO asset_daily_stock (day, total_assets, asset_count)
+        SELECT DATE(date), SUM(stock_count - deduction), COUNT(*)
+        FROM assets
+        GROUP BY DATE(date)
+    """)
+    return cursor.rowcount
+
+
+def parse_day(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def timeline_query(start=None, end=None, bucket='day'):
+    expression = BUCKET_EXPRESSIONS[bucket]
+    query = f"""
+        SELECT DATE_FORMAT({expression}, '%%Y-%%m-%%d') AS bucket, SUM(total_assets)
+        FROM asset_daily_stock
+        WHERE asset_count > 0
+    """
+    params = []
+    if start:
+        query += ' AND day >= %s'
+        params.append(start)
+    if end:
+        query += ' AND day <= %s'
+        params.append(end)
+    query += ' GROUP BY bucket ORDER BY bucket ASC'
+    return query, params
+
+
+# One row per day, so even the unbounded timeline reads a small table
+register_query('dashboard.timeline', *timeline_query(), allow_full_scan=True)
+register_query('dashboard.timeline_range', *timeline_query('2024-01-01', '2024-12-31', 'week'))
+
+
+def timeline(cursor, start=None, end=None, bucket='day'):
+    cursor.execute(*timeline_query(start, end, bucket))
+    return [{'date': row[0], 'totalAssets': int(row[1])} for row in cursor.fetchall()]
@@ -0,0 +1,29 @@
+# Per-table change counters (table_versions). Every write endpoint bumps the tables
+# it touched in the same transaction, so readers in any process can tell whether
+# cached data is still current with a single primary-key lookup.
+from db import note_write
+
+
+def bump(cursor, *tables):
+    # Returns the new versions; the rows stay locked until commit, so they are ours.
+    # Also keeps this client's next reads on the primary (see db.read_only).
+    note_write()
+    cursor.executemany("""
+        INSERT INTO table_versions (table_name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """, [(table,) for table in tables])
+    return current(cursor, tables)
+
+
+def current(cursor, tables):
+    placeholders = ', '.join(['%s'] * len(tables))
+    cursor.execute(
+        f'SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})',
+        list(tables)
+    )
+    versions = {table: 0 for table in tables}
+    for row in cursor.fetchall():
+        name, version = (row['table_name'], row['version']) if isinstance(row, dict) else row
+        versions[name] = int(version)
+    return versions
+
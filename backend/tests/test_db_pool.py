@@ -0,0 +1,125 @@
+import threading
+import time
+
+import MySQLdb
+import pytest
+
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+        self.rollbacks = 0
+        self.ping_error = False
+        self.rollback_error = False
+
+    def ping(self):
+        if self.ping_error:
+            raise MySQLdb.OperationalError(2006, 'MySQL server has gone away')
+
+    def rollback(self):
+        if self.rollback_error:
+            raise MySQLdb.OperationalError(2013, 'Lost connection')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection(len(opened) + 1))
+        return opened[-1]
+
+    kwargs.setdefault('size', 2)
+    kwargs.setdefault('timeout', 0.05)
+    return ConnectionPool(connect, **kwargs), opened
+
+
+def test_reuses_released_connection_and_rolls_it_back():
+    pool, opened = make_pool()
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert first.rollbacks == 1
+    assert len(opened) == 1
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_times_out_when_every_connection_is_in_use():
+    pool, opened = make_pool(size=1)
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert time.monotonic() - started >= 0.05
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] >= 1
+    assert stats['open'] == 1 and stats['inUse'] == 1
+
+
+def test_waiter_gets_the_connection_released_meanwhile():
+    pool, opened = make_pool(size=1, timeout=2)
+    first = pool.acquire()
+
+    timer = threading.Timer(0.05, pool.release, (first,))
+    timer.start()
+    assert pool.acquire() is first
+    timer.join()
+    assert len(opened) == 1
+
+
+def test_replaces_connections_older_than_recycle():
+    pool, opened = make_pool(recycle=0.01)
+    first = pool.acquire()
+    pool.release(first)
+    time.sleep(0.02)
+    second = pool.acquire()
+    assert second is not first
+    assert first.closed
+    assert pool.stats()['recycled'] == 1
+    assert pool.stats()['open'] == 1
+
+
+def test_replaces_idle_connection_that_fails_its_ping():
+    pool, opened = make_pool(ping_interval=0)
+    first = pool.acquire()
+    pool.release(first)
+    first.ping_error = True
+    time.sleep(0.001)
+    second = pool.acquire()
+    assert second is not first and first.closed
+    assert pool.stats()['pingFailures'] == 1
+
+
+def test_discards_connection_whose_rollback_fails():
+    pool, opened = make_pool(size=1)
+    first = pool.acquire()
+    first.rollback_error = True
+    pool.release(first)
+    assert first.closed
+    stats = pool.stats()
+    assert stats['discarded'] == 1 and stats['open'] == 0
+    # The freed slot opens a new connection
+    assert pool.acquire() is not first
+
+
+def test_failed_connect_frees_its_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise MySQLdb.OperationalError(2003, "Can't connect")
+        return FakeConnection(len(attempts))
+
+    pool = ConnectionPool(connect, size=1, timeout=0.05)
+    with pytest.raises(MySQLdb.OperationalError):
+        pool.acquire()
+    assert pool.stats()['open'] == 0
+    assert pool.acquire().number == 2
@@ -0,0 +1,32 @@
+from flask import Flask, Response
+from werkzeug.http import parse_options_header
+
+import reports
+
+
+def disposition(download_name):
+    header = reports.attachment_disposition(download_name)
+    header.encode('ascii')
+    return parse_options_header(header)
+
+
+def test_plain_names_are_quoted():
+    assert disposition('chairs_report.csv') == ('attachment', {'filename': 'chairs_report.csv'})
+    assert disposition('6" pipe_report.csv') == ('attachment', {'filename': '6" pipe_report.csv'})
+
+
+def test_non_latin_names_get_an_ascii_fallback():
+    header = reports.attachment_disposition('පුටු_report.ndjson')
+    assert 'filename=_report.ndjson;' in header
+    assert "filename*=UTF-8''%E0%B6%B4" in header
+    # Clients that read filename* get the original name back
+    assert disposition('පුටු_report.ndjson') == ('attachment', {'filename': 'පුටු_report.ndjson'})
+
+
+def test_streamed_export_header_encodes():
+    app = Flask(__name__)
+    with app.test_request_context():
+        response = Response(iter([b'a']), mimetype='text/csv')
+        response.headers['Content-Disposition'] = reports.attachment_disposition('தமிழ் "x".csv')
+        # What the server writes to the socket
+        assert response.get_wsgi_headers({})['Content-Disposition'].encode('latin-1')
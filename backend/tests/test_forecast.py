@@ -0,0 +1,80 @@
+import math
+from datetime import datetime
+
+import pandas as pd
+
+import forecast
+
+NOW = datetime(2024, 3, 31, 12, 0)
+
+
+def frames(stock, usage):
+    return (pd.DataFrame(stock, columns=forecast.STOCK_COLUMNS),
+            pd.DataFrame(usage, columns=forecast.USAGE_COLUMNS))
+
+
+def by_asset(frame):
+    return {row['asset_id']: row for row in frame.to_dict('records')}
+
+
+def test_daily_usage_and_days_left_over_the_window():
+    stock, usage = frames(
+        [(1, 'Gloves M', 10, 'Gloves', 'ICU', 300), (2, 'Gloves L', 10, 'Gloves', 'ICU', 50)],
+        [(1, 300, None), (2, 30, None)],
+    )
+    rows = by_asset(forecast.compute(stock, usage, NOW, 30))
+    assert rows[1]['daily_usage'] == 10
+    assert rows[1]['days_left'] == 30
+    assert rows[1]['stockout_at'] == pd.Timestamp('2024-04-30 12:00')
+    assert rows[2]['daily_usage'] == 1
+    assert rows[2]['days_left'] == 50
+
+
+def test_assets_created_inside_the_window_use_their_own_age():
+    stock, usage = frames([(1, 'Mask', 10, 'Masks', 'ER', 100)], [(1, 50, datetime(2024, 3, 26, 12, 0))])
+    row = by_asset(forecast.compute(stock, usage, NOW, 30))[1]
+    assert row['daily_usage'] == 10
+    assert row['days_left'] == 10
+
+
+def test_brand_new_usage_counts_as_at_least_one_day():
+    stock, usage = frames([(1, 'Mask', 10, 'Masks', 'ER', 100)], [(1, 20, datetime(2024, 3, 31, 11, 0))])
+    assert by_asset(forecast.compute(stock, usage, NOW, 30))[1]['daily_usage'] == 20
+
+
+def test_out_of_stock_and_unused_assets():
+    stock, usage = frames(
+        [(1, 'Empty', 10, 'Gloves', 'ICU', 0), (2, 'Unused', 10, 'Gloves', 'ICU', 40),
+         (3, 'Overdrawn', 10, 'Gloves', 'ICU', -5)],
+        [(1, 10, None)],
+    )
+    frame = forecast.compute(stock, usage, NOW, 30)
+    rows = by_asset(frame)
+    assert rows[1]['days_left'] == 0 and rows[3]['days_left'] == 0
+    assert math.isinf(rows[2]['days_left'])
+    assert pd.isna(rows[2]['stockout_at'])
+    assert rows[2]['used'] == 0
+    # Soonest stock-out first, ties by asset id
+    assert list(frame['asset_id']) == [1, 3, 2]
+    assert forecast.summary(frame) == {'assets': 3, 'stockedOut': 2, 'within7Days': 2, 'within30Days': 2,
+                                       'notInUse': 1}
+
+
+def test_select_and_items():
+    stock, usage = frames(
+        [(1, 'Gloves M', 10, 'Gloves', 'ICU', 30), (2, 'Mask', 20, 'Masks', 'ER', 300),
+         (3, 'Gown', 30, 'Gowns', 'ICU', 5)],
+        [(1, 30, None), (2, 30, None)],
+    )
+    frame = forecast.compute(stock, usage, NOW, 30)
+    assert list(forecast.select(frame, section='ICU')['asset_id']) == [1, 3]
+    assert list(forecast.select(frame, resource_id=20)['asset_id']) == [2]
+    assert list(forecast.select(frame, within=100)['asset_id']) == [1]
+
+    items = forecast.items(frame)
+    assert items[0] == {
+        'assetId': 1, 'assetName': 'Gloves M', 'resourceId': 10, 'resourceName': 'Gloves', 'section': 'ICU',
+        'netStock': 30, 'usedInWindow': 30, 'dailyUsage': 1.0, 'daysUntilStockout': 30.0,
+        'stockoutDate': '2024-04-30',
+    }
+    assert items[-1]['daysUntilStockout'] is None and items[-1]['stockoutDate'] is None
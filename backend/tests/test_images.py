@@ -0,0 +1,112 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+from flask import Flask, request
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import images
+
+
+def test_upload_stream_hashes_what_it_writes(tmp_path):
+    stream = images.UploadStream(str(tmp_path), limit=100)
+    stream.write(b'abc')
+    stream.write(b'def')
+    assert stream.size == 6
+    assert stream.digest.hexdigest() == hashlib.sha256(b'abcdef').hexdigest()
+    stream.seek(0)
+    assert stream.read() == b'abcdef'
+    stream.close()
+
+
+def test_upload_stream_stops_at_the_limit(tmp_path):
+    stream = images.UploadStream(str(tmp_path), limit=5)
+    stream.write(b'12345')
+    with pytest.raises(RequestEntityTooLarge):
+        stream.write(b'6')
+    stream.close()
+    assert os.listdir(tmp_path) == []
+
+
+def test_claim_moves_the_upload_and_drops_duplicates(tmp_path):
+    target = tmp_path / 'stored.png'
+    first = images.UploadStream(str(tmp_path), limit=None)
+    first.write(b'image')
+    first.claim(str(target))
+    assert target.read_bytes() == b'image'
+
+    second = images.UploadStream(str(tmp_path), limit=None)
+    second.write(b'image')
+    second.claim(str(target))
+    second.close()
+    assert sorted(os.listdir(tmp_path)) == ['stored.png']
+
+
+def test_unclaimed_parts_are_removed_when_the_request_ends(tmp_path):
+    app = Flask(__name__)
+    app.request_class = images.UploadRequest
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), UPLOAD_MAX_SIZE=1024)
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        part = request.files['image']
+        assert isinstance(part.stream, images.UploadStream)
+        return str(part.stream.size)
+
+    client = app.test_client()
+    response = client.post('/upload', data={'image': (io.BytesIO(b'x' * 100), 'a.png')})
+    assert response.get_data() == b'100'
+    assert os.listdir(tmp_path) == []
+
+    response = client.post('/upload', data={'image': (io.BytesIO(b'x' * 4096), 'a.png')})
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_store_upload_keeps_the_extension_of_non_ascii_names(tmp_path):
+    upload = FileStorage(io.BytesIO(b'image'), filename='රූපය.PNG')
+    filename = images.store_upload(upload, str(tmp_path), {})
+    assert filename == hashlib.sha256(b'image').hexdigest() + '.png'
+    assert (tmp_path / filename).read_bytes() == b'image'
+
+
+class ReferenceCursor:
+    def __init__(self, referenced):
+        self.referenced = referenced
+
+    def execute(self, sql, params):
+        self.rows = [(name,) for name in params if name in self.referenced]
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_sweep_removes_old_unreferenced_images_only(tmp_path):
+    old = time.time() - 7200
+    names = {}
+    for key in ('kept', 'orphan', 'fresh'):
+        names[key] = hashlib.sha256(key.encode()).hexdigest() + '.png'
+        for name in (names[key], images.variant_name(names[key], 'thumb')):
+            (tmp_path / name).write_bytes(b'x')
+            if key != 'fresh':
+                os.utime(tmp_path / name, (old, old))
+
+    removed = images.sweep_unreferenced(ReferenceCursor({names['kept']}), str(tmp_path), {'thumb': 200}, 3600)
+    assert removed == [names['orphan']]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [names['kept'], images.variant_name(names['kept'], 'thumb'),
+         names['fresh'], images.variant_name(names['fresh'], 'thumb')])
+
+
+def test_reusing_a_stored_image_restarts_its_grace_period(tmp_path):
+    stored = tmp_path / (hashlib.sha256(b'image').hexdigest() + '.png')
+    stored.write_bytes(b'image')
+    old = time.time() - 7200
+    os.utime(stored, (old, old))
+
+    images.store_upload(FileStorage(io.BytesIO(b'image'), filename='a.png'), str(tmp_path), {})
+    assert images.sweep_unreferenced(ReferenceCursor(set()), str(tmp_path), {}, 3600) == []
+    assert stored.exists()
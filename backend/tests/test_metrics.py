@@ -0,0 +1,32 @@
+import metrics
+
+
+def test_registered_queries_are_labelled_by_name():
+    sql = 'SELECT id FROM assets WHERE resource_id = %s'
+    metrics.name_statement(sql, 'tests.assets_by_resource')
+    assert metrics.statement_label(sql) == 'tests.assets_by_resource'
+
+
+def test_literals_and_placeholders_collapse_to_one_label():
+    assert metrics.statement_label("SELECT * FROM assets WHERE id = 42 AND name = 'Gloves'") == \
+        metrics.statement_label('SELECT * FROM assets WHERE id = %s AND name = %s') == \
+        'SELECT * FROM assets WHERE id = ? AND name = ?'
+    assert metrics.statement_label("SELECT 'it\\'s', 1.5") == 'SELECT ?, ?'
+
+
+def test_in_and_values_lists_of_any_length_share_a_label():
+    assert metrics.statement_label('SELECT id FROM assets WHERE id IN (%s, %s, %s)') == \
+        metrics.statement_label('SELECT id FROM assets WHERE id IN (%s, %s)') == \
+        'SELECT id FROM assets WHERE id IN (...)'
+    assert metrics.statement_label('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)') == \
+        'INSERT INTO t (a, b) VALUES (...), ...'
+
+
+def test_whitespace_bytes_and_identifiers():
+    assert metrics.statement_label(b'SELECT\n    name\n  FROM   table2\n WHERE x = 1') == \
+        'SELECT name FROM table2 WHERE x = ?'
+
+
+def test_long_statements_are_cut():
+    sql = 'SELECT ' + ', '.join(f'column_{n}' for n in range(100)) + ' FROM t'
+    assert len(metrics.statement_label(sql)) == 200
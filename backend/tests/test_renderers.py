@@ -0,0 +1,105 @@
+import contextlib
+import datetime
+import os
+import re
+import subprocess
+import sys
+import zlib
+
+import pytest
+
+import renderers
+
+
+class Stages:
+    def __init__(self):
+        self.names = []
+
+    @contextlib.contextmanager
+    def time(self, name):
+        self.names.append(name)
+        yield
+
+
+def objects(pdf):
+    # {object number: body}, checked against the xref offsets
+    xref = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+    assert pdf[xref:xref + 4] == b'xref'
+    offsets = [int(line[:10]) for line in pdf[xref:].split(b'\n') if re.match(rb'^\d{10} 00000 n', line)]
+    found = {}
+    for number, offset in enumerate(offsets, start=1):
+        header = b'%d 0 obj\n' % number
+        assert pdf[offset:offset + len(header)] == header
+        found[number] = pdf[offset + len(header):pdf.index(b'\nendobj\n', offset)]
+    return found
+
+
+def page_text(pdf):
+    texts = []
+    for body in objects(pdf).values():
+        if b'/FlateDecode' in body:
+            stream = body.split(b'stream\n', 1)[1].rsplit(b'\nendstream', 1)[0]
+            texts.append(zlib.decompress(stream).decode('latin-1'))
+    return texts
+
+
+def test_builtin_writes_a_well_formed_pdf():
+    stages = Stages()
+    rows = [('Gloves (M)', 120, datetime.date(2024, 1, 5), None)]
+    pdf = renderers.BuiltinRenderer().render(rows, ['name', 'stock_count', 'date', 'section'], {}, stages)
+    assert pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n')
+    assert stages.names == ['html', 'pdf']
+    text, = page_text(pdf)
+    assert 'name' in text and 'stock_count' in text
+    assert 'Gloves \\(M\\)' in text
+    assert '2024-01-05' in text
+
+
+def test_builtin_splits_long_tables_into_pages_with_the_header_on_each():
+    rows = [(n, f'asset {n}') for n in range(200)]
+    pdf = renderers.BuiltinRenderer().render(rows, ['id', 'name'], {}, Stages())
+    pages = page_text(pdf)
+    assert len(pages) > 1
+    assert all('(id' in page.splitlines()[1] for page in pages)
+    assert re.search(rb'/Count %d\b' % len(pages), pdf)
+    assert sum(page.count('asset ') for page in pages) == 200
+
+
+def test_builtin_handles_no_rows_and_characters_outside_latin1():
+    pdf = renderers.BuiltinRenderer().render([], ['name'], {}, Stages())
+    assert len(page_text(pdf)) == 1
+    pdf = renderers.BuiltinRenderer().render([('Syringe µ 5ml ✓',)], ['name'], {}, Stages())
+    assert 'Syringe \xb5 5ml ?' in page_text(pdf)[0]
+
+
+def test_get_renderer_by_name_and_auto(monkeypatch):
+    monkeypatch.setattr(renderers, '_chosen', {})
+    assert renderers.get_renderer({'REPORT_PDF_RENDERER': 'builtin'}).name == 'builtin'
+
+    # Nothing else installed: auto falls back to the built-in writer
+    monkeypatch.setattr(renderers, '_installed', lambda module: False)
+    assert renderers.get_renderer({'REPORT_PDF_RENDERER': 'auto'}).name == 'builtin'
+
+    with pytest.raises(RuntimeError):
+        renderers.get_renderer({'REPORT_PDF_RENDERER': 'weasyprint'})
+    with pytest.raises(RuntimeError):
+        renderers.get_renderer({'REPORT_PDF_RENDERER': 'latex'})
+
+
+def test_wkhtmltopdf_needs_the_configured_binary_to_exist(tmp_path, monkeypatch):
+    renderer = renderers.WkhtmltopdfRenderer()
+    assert renderer.binary({'WKHTMLTOPDF_PATH': str(tmp_path / 'missing')}) is None
+    binary = tmp_path / 'wkhtmltopdf'
+    binary.write_text('')
+    assert renderer.binary({'WKHTMLTOPDF_PATH': str(binary)}) == str(binary)
+
+    monkeypatch.setattr(renderers.shutil, 'which', lambda name: None)
+    monkeypatch.setattr(renderers, 'WKHTMLTOPDF_CANDIDATES', (str(binary),))
+    assert renderer.binary({'WKHTMLTOPDF_PATH': None}) == str(binary)
+
+
+def test_importing_renderers_loads_no_pdf_or_dataframe_library():
+    code = 'import sys, renderers; print(sorted({"pandas", "pdfkit", "weasyprint"} & set(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(renderers.__file__),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
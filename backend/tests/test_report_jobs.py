@@ -0,0 +1,76 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+import reports
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(REPORT_CACHE_DIR=str(tmp_path), REPORT_JOB_RETENTION=3600, REPORT_JOB_TIMEOUT=900)
+    os.makedirs(tmp_path / 'jobs')
+    with app.app_context():
+        yield app
+
+
+def queued_job(**fields):
+    job = {'id': os.urandom(16).hex(), 'spec': {'kind': 'asset', 'assetName': 'x'}, 'version': 'v1-1',
+           'status': 'queued', 'path': None, 'error': None, 'created_at': time.time(), 'started_at': None,
+           'finished_at': None, 'worker': [socket.gethostname(), os.getpid()]}
+    job.update(fields)
+    return job
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+def test_jobs_of_exited_workers_fail(app):
+    dead = queued_job(worker=[socket.gethostname(), dead_pid()])
+    live = queued_job()
+    with reports.pending_report_jobs() as pending:
+        for job in (dead, live):
+            reports.save_report_job(job)
+            pending[job['id']] = job
+
+    with reports.pending_report_jobs() as pending:
+        reports.fail_stale_report_jobs(pending)
+        assert list(pending) == [live['id']]
+
+    failed = reports.load_report_job(dead['id'])
+    assert failed['status'] == 'failed' and failed['finished_at']
+    assert reports.load_report_job(live['id'])['status'] == 'queued'
+
+
+def test_jobs_past_the_timeout_fail(app):
+    job = queued_job(status='running', started_at=time.time() - 1000)
+    assert reports.report_job_stale(job)
+    assert not reports.report_job_stale(dict(job, started_at=time.time()))
+    assert not reports.report_job_stale(dict(job, status='done'))
+
+
+def test_expired_records_are_pruned(app, tmp_path):
+    old, recent, pending_old = queued_job(status='done'), queued_job(status='done'), queued_job()
+    for job in (old, recent, pending_old):
+        reports.save_report_job(job)
+    stamp = time.time() - 7200
+    for job in (old, pending_old):
+        os.utime(reports.report_job_path(job['id']), (stamp, stamp))
+
+    with reports.pending_report_jobs() as pending:
+        pending[pending_old['id']] = pending_old
+
+    assert reports.load_report_job(old['id']) is None
+    assert reports.load_report_job(recent['id'])
+    assert reports.load_report_job(pending_old['id'])
+    with open(tmp_path / 'jobs' / 'pending.json', encoding='utf-8') as f:
+        assert list(json.load(f)['jobs']) == [pending_old['id']]
@@ -0,0 +1,236 @@
+import json
+
+import search_index
+from search_index import SearchIndex
+
+
+class FakeDatabase:
+    def __init__(self, resources, assets):
+        self.resources = dict(resources)  # id -> name
+        self.assets = dict(assets)  # id -> (resource id, name)
+        self.events = []  # (id, event_type, payload)
+        self.queries = []
+
+    def publish(self, event_type, data):
+        event_id = (self.events[-1][0] if self.events else 0) + 1
+        self.events.append((event_id, event_type, json.dumps(data)))
+        return event_id
+
+
+class FakeCursor:
+    # Answers the statements search_index and change_feed.replay run
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        db = self.db
+        sql = ' '.join(sql.split())
+        db.queries.append(sql)
+        head = db.events[-1][0] if db.events else 0
+        if sql == search_index.FEED_HEAD_QUERY:
+            self.rows = [(head,)]
+        elif sql.startswith('SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM change_events'):
+            self.rows = [(db.events[0][0] if db.events else 0, head)]
+        elif 'FROM change_events WHERE id >' in sql:
+            after, limit = params
+            self.rows = [event for event in db.events if event[0] > after][:limit]
+        elif sql == 'SELECT id, name FROM resources':
+            self.rows = list(db.resources.items())
+        elif sql.startswith('SELECT id, name FROM resources WHERE id IN'):
+            self.rows = [(i, db.resources[i]) for i in params if i in db.resources]
+        elif sql.startswith('SELECT a.id, a.resource_id, a.name FROM assets a JOIN resources r'):
+            ids = params if 'WHERE a.id IN' in sql else list(db.assets)
+            self.rows = [(i,) + db.assets[i] for i in ids if i in db.assets and db.assets[i][0] in db.resources]
+        else:
+            raise AssertionError(f'unexpected statement: {sql}')
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+def built_index(db):
+    index = SearchIndex()
+    index.ensure_current(FakeCursor(db), 100)
+    return index
+
+
+def ids(hits):
+    return [asset_id for asset_id, _ in hits]
+
+
+def same_as_rebuild(index, db):
+    fresh = SearchIndex()
+    fresh.rebuild(FakeCursor(db))
+    return (fresh.assets == index.assets and fresh.doc_words == index.doc_words
+            and fresh.word_assets == index.word_assets and fresh.words == index.words
+            and fresh.gram_words == {gram: words for gram, words in index.gram_words.items() if words})
+
+
+def sample_database():
+    return FakeDatabase(
+        {1: 'Gloves', 2: 'Syringe'},
+        {
+            1: (1, 'Nitrile gloves'),
+            2: (1, 'Latex gloves'),
+            3: (2, 'Syringe 5ml'),
+            4: (2, 'Syringe 10ml'),
+            5: (1, 'Glove box'),
+        },
+    )
+
+
+# Ranking
+def test_tokenize_lowercases_and_splits_on_punctuation():
+    assert search_index.tokenize('Syringe, 5-ml (Sterile)') == ['syringe', '5', 'ml', 'sterile']
+    assert search_index.tokenize(None) == []
+
+
+def test_exact_match_ranks_above_prefix_and_ties_are_newest_first():
+    index = built_index(sample_database())
+    hits, total = index.search('glove', 10)
+    # "glove" is exact for asset 5 only; "gloves" is a prefix match for 1 and 2
+    assert ids(hits) == [5, 2, 1]
+    assert [score for _, score in hits] == [1.0, 0.9, 0.9]
+    assert total == 3
+
+
+def test_misspelling_matches_fuzzily_below_prefix_matches():
+    index = built_index(sample_database())
+    hits, _ = index.search('syrnge', 10)
+    assert ids(hits) == [4, 3]
+    assert all(0 < score <= search_index.MAX_FUZZY_SCORE for _, score in hits)
+
+
+def test_every_matching_word_must_match_and_unmatched_words_are_ignored():
+    index = built_index(sample_database())
+    assert ids(index.search('latex gloves', 10)[0]) == [2]
+    assert ids(index.search('latex qqqq', 10)[0]) == [2]
+    assert index.search('qqqq', 10) == ([], 0)
+
+
+def test_resource_name_words_are_searchable():
+    index = built_index(sample_database())
+    # Asset 5 is named "Glove box"; its resource adds "gloves"
+    assert 5 in ids(index.search('gloves box', 10)[0])
+
+
+def test_pages_keep_the_total():
+    index = built_index(sample_database())
+    first, total = index.search('glove', 2)
+    second, _ = index.search('glove', 2, offset=2)
+    assert total == 3
+    assert ids(first) + ids(second) == [5, 2, 1]
+
+
+# Following the change feed
+def test_replays_events_from_any_process_without_rebuilding():
+    db = sample_database()
+    index = built_index(db)
+
+    db.assets[3] = (2, 'Insulin syringe')
+    db.publish('asset.updated', {'asset': {'id': 3}})
+    db.resources[3] = 'Scalpel'
+    db.publish('resource.created', {'resource': {'id': 3}})
+    db.assets[6] = (3, 'Blade no. 10')
+    db.publish('asset.created', {'asset': {'id': 6}})
+    del db.assets[1]
+    db.publish('asset.deleted', {'asset': {'id': 1}})
+    db.assets[2] = (1, 'Vinyl gloves')
+    db.assets[7] = (1, 'Exam gloves')
+    db.publish('assets.bulk', {'written': 2, 'ids': [2, 7]})
+
+    db.queries.clear()
+    index.ensure_current(FakeCursor(db), 100)
+    assert not any(query == 'SELECT id, name FROM resources' for query in db.queries)
+    assert ids(index.search('insulin', 10)[0]) == [3]
+    assert ids(index.search('scalpel blade', 10)[0]) == [6]
+    assert ids(index.search('nitrile', 10)[0]) == []
+    assert ids(index.search('vinyl', 10)[0]) == [2]
+    assert index.last_event_id == db.events[-1][0]
+    assert same_as_rebuild(index, db)
+
+
+def test_resource_rename_and_delete_update_their_assets():
+    db = sample_database()
+    index = built_index(db)
+
+    db.resources[2] = 'Needles'
+    db.publish('resource.updated', {'resource': {'id': 2}})
+    index.ensure_current(FakeCursor(db), 100)
+    assert ids(index.search('needles', 10)[0]) == [4, 3]
+    assert same_as_rebuild(index, db)
+
+    del db.resources[1]
+    db.publish('resource.deleted', {'resource': {'id': 1}})
+    index.ensure_current(FakeCursor(db), 100)
+    assert index.search('gloves', 10) == ([], 0)
+    assert same_as_rebuild(index, db)
+
+
+def test_nothing_new_costs_one_feed_query():
+    db = sample_database()
+    index = built_index(db)
+    db.queries.clear()
+    index.ensure_current(FakeCursor(db), 100)
+    assert len(db.queries) == 1
+
+
+def test_bulk_event_without_ids_rebuilds():
+    db = sample_database()
+    index = built_index(db)
+    db.assets[8] = (1, 'Surgical gloves')
+    db.publish('assets.bulk', {'written': 5000})
+    index.ensure_current(FakeCursor(db), 100)
+    assert ids(index.search('surgical', 10)[0]) == [8]
+    assert index.last_event_id == db.events[-1][0]
+
+
+def test_falling_further_behind_than_the_replay_limit_rebuilds():
+    db = sample_database()
+    index = built_index(db)
+    for asset_id in range(10, 20):
+        db.assets[asset_id] = (1, 'Apron')
+        db.publish('asset.created', {'asset': {'id': asset_id}})
+    db.queries.clear()
+    index.ensure_current(FakeCursor(db), 5)
+    assert 'SELECT id, name FROM resources' in db.queries
+    assert index.search('apron', 20)[1] == 10
+
+
+def test_a_replica_behind_the_index_leaves_it_alone():
+    db = sample_database()
+    db.assets[6] = (1, 'Apron')
+    db.publish('asset.created', {'asset': {'id': 6}})
+    index = built_index(db)
+
+    lagging = sample_database()
+    index.ensure_current(FakeCursor(lagging), 100)
+    assert ids(index.search('apron', 10)[0]) == [6]
+    assert index.last_event_id == 1
+
+
+def test_local_writes_apply_in_place_only_when_their_event_is_next():
+    db = sample_database()
+    index = built_index(db)
+
+    event_id = db.publish('asset.updated', {'asset': {'id': 1}})
+    db.assets[1] = (1, 'Powder-free gloves')
+    index.asset_written(1, 'Powder-free gloves', event_id)
+    assert ids(index.search('powder', 10)[0]) == [1]
+    assert index.last_event_id == event_id
+
+    # Another process wrote in between: left to the replay
+    db.assets[2] = (1, 'Cotton gloves')
+    db.publish('asset.updated', {'asset': {'id': 2}})
+    event_id = db.publish('assets.bulk', {'written': 1, 'ids': [9]})
+    db.assets[9] = (2, 'Syringe cap')
+    index.assets_written({9: (2, 'Syringe cap')}, event_id)
+    assert ids(index.search('cap', 10)[0]) == []
+    index.ensure_current(FakeCursor(db), 100)
+    assert ids(index.search('cap', 10)[0]) == [9]
+    assert ids(index.search('cotton', 10)[0]) == [2]
+    assert same_as_rebuild(index, db)
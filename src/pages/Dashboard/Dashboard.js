@@ -13,6 +13,63 @@ import {
 } from 'recharts';
 import './Dashboard.css';
 
+const LOW_STOCK_ITEMS = 5;
+const RECENT_UPDATES = 10;
+
+// Apply one asset change event from /api/dashboard/changes to the dashboard state
+const applyAssetChange = (data, type, { asset, previous }) => {
+  const current = type === 'asset.deleted' ? null : asset;
+  const before = type === 'asset.deleted' ? asset : previous;
+
+  // Timeline: move the asset's contribution from its old day to its new one
+  const chart = new Map(data.chartData.map((point) => [point.date, point.totalAssets]));
+  if (before) {
+    chart.set(before.date, (chart.get(before.date) || 0) - (before.stockCount - before.deduction));
+  }
+  if (current) {
+    chart.set(current.date, (chart.get(current.date) || 0) + (current.stockCount - current.deduction));
+  }
+  const chartData = [...chart.entries()]
+    .map(([date, totalAssets]) => ({ date, totalAssets }))
+    .sort((a, b) => a.date.localeCompare(b.date));
+
+  let lowStockItems = data.lowStockItems.filter((item) => item.id !== asset.id);
+  if (current && current.lowStock) {
+    lowStockItems.push({
+      id: current.id,
+      name: current.name,
+      stockCount: current.stockCount,
+      threshold: current.threshold,
+      section: current.section,
+      lastUpdated: current.date
+    });
+  }
+  lowStockItems = lowStockItems
+    .sort((a, b) => a.stockCount - b.stockCount || a.id - b.id)
+    .slice(0, LOW_STOCK_ITEMS);
+
+  let recentUpdates = data.recentUpdates.filter((update) => update.id !== asset.id);
+  if (current) {
+    recentUpdates.push({
+      id: current.id,
+      item: `${current.resourceName} (${current.name})`,
+      action: current.deduction < 0 ? 'Increased' : 'Decreased',
+      quantity: Math.abs(current.deduction),
+      date: current.date
+    });
+  }
+  recentUpdates = recentUpdates.sort((a, b) => b.date.localeCompare(a.date)).slice(0, RECENT_UPDATES);
+
+  return {
+    ...data,
+    totalAssets: data.totalAssets + (current ? 1 : 0) - (before ? 1 : 0),
+    lowStockCount: data.lowStockCount + (current?.lowStock ? 1 : 0) - (before?.lowStock ? 1 : 0),
+    chartData,
+    lowStockItems,
+    recentUpdates
+  };
+};
+
 const Dashboard = () => {
   const navigate = useNavigate();
   const [timeRange, setTimeRange] = useState('week');
@@ -21,6 +78,7 @@ const Dashboard = () => {
     totalAssets: 0,
     totalResources: 0,
     lowStockItems: [],
+    lowStockCount: 0,
     recentUpdates: [],
     chartData: [],
     quickStats: {
@@ -29,85 +87,59 @@ const Dashboard = () => {
     }
   });
 
-  // Fetch all dashboard data
+  // Fetch all dashboard panels in one request; the backend caches the summary
+  // and answers repeat polls with 304 Not Modified via its ETag
   const fetchDashboardData = async () => {
     try {
       setLoading(true);
-
-      // Fetch total assets
-      const assetsResponse = await axios.get('http://localhost:5001/api/total-assets');
-      // Fetch total resources
-      const resourcesResponse = await axios.get('http://localhost:5001/api/total-resources');
-
-      setDashboardData((prevData) => ({
-        ...prevData,
-        totalAssets: assetsResponse.data.totalAssets,
-        totalResources: resourcesResponse.data.totalResources,
-      }));
-    } catch (error) {
-      console.error('Error fetching dashboard data:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  // Fetch chart data
-  const fetchChartData = async () => {
-    try {
-      const response = await axios.get('http://localhost:5001/api/asset-timeline');
-      setDashboardData((prevData) => ({
-        ...prevData,
-        chartData: response.data.chartData,
-      }));
-    } catch (error) {
-      console.error('Error fetching asset timeline:', error);
-    }
-  };
-
-  // Fetch low stock items
-  const fetchLowStockItems = async () => {
-    try {
-      const response = await axios.get('http://localhost:5001/api/dashboard/low-stock');
+      const response = await axios.get('http://localhost:5000/api/dashboard/summary');
+      const summary = response.data;
 
       // Transform backend response to match frontend expectations
-      const transformedItems = response.data.lowStockItems.map(item => ({
+      const transformedItems = summary.lowStockItems.map(item => ({
         id: item.id,
         name: item.assetName,       // Map assetName to name
         stockCount: item.stockCount,
-        threshold: 10,              // Hardcode threshold since backend uses <10
+        threshold: item.threshold,  // Per-asset/section reorder threshold
         section: item.section,      // Preserve additional data if needed
         lastUpdated: item.lastUpdated
       }));
 
       setDashboardData((prevData) => ({
         ...prevData,
+        totalAssets: summary.totalAssets,
+        totalResources: summary.totalResources,
+        chartData: summary.chartData,
         lowStockItems: transformedItems,
+        lowStockCount: summary.lowStockCount,
+        recentUpdates: summary.recentUpdates,
       }));
     } catch (error) {
-      console.error('Error fetching low stock items:', error);
-    }
-  };
-
-  const fetchRecentUpdates = async () => {
-    try {
-      const response = await axios.get('http://localhost:5001/api/recent-updates');
-      setDashboardData(prev => ({
-        ...prev,
-        recentUpdates: response.data.recentUpdates
-      }));
-    } catch (error) {
-      console.error('Error fetching recent updates:', error);
+      console.error('Error fetching dashboard data:', error);
+    } finally {
+      setLoading(false);
     }
   };
 
-  
-
-  // Fetch all data on component mount
+  // Fetch all data on component mount, then follow the change feed instead of polling
   useEffect(() => {
     fetchDashboardData();
-    fetchChartData();
-    fetchLowStockItems();
-    fetchRecentUpdates(); 
+
+    const source = new EventSource('http://localhost:5000/api/dashboard/changes');
+    ['asset.created', 'asset.updated', 'asset.deleted'].forEach((type) =>
+      source.addEventListener(type, (event) =>
+        setDashboardData((prevData) => applyAssetChange(prevData, type, JSON.parse(event.data)))
+      )
+    );
+    source.addEventListener('resource.created', () =>
+      setDashboardData((prevData) => ({ ...prevData, totalResources: prevData.totalResources + 1 }))
+    );
+    // Changes that move many rows at once, or a feed gap: reload the summary
+    ['resource.updated', 'resource.deleted', 'section_threshold.updated', 'assets.bulk', 'reset'].forEach((type) =>
+      source.addEventListener(type, fetchDashboardData)
+    );
+
+    return () => source.close();
   }, []);
 
   // Format date for display
@@ -250,7 +282,7 @@ const Dashboard = () => {
         <div className="dashboard-card low-stock">
           <div className="card-header">
             <h2>Low Stock Alert</h2>
-            <span className="alert-count">{dashboardData.lowStockItems.length} items</span>
+            <span className="alert-count">{dashboardData.lowStockCount} items</span>
           </div>
           <div className="alert-list">
             {dashboardData.lowStockItems.map((item) => (
@@ -261,13 +293,13 @@ const Dashboard = () => {
                     <div
                       className="progress"
                       style={{
-                        width: `${(item.stockCount / 10) * 100}%` // Use hardcoded threshold 10
+                        width: `${item.threshold ? (item.stockCount / item.threshold) * 100 : 0}%`
                       }}
                     ></div>
                   </div>
                 </div>
                 <span className="quantity">
-                  {item.stockCount}/10
+                  {item.stockCount}/{item.threshold}
                 </span>
               </div>
             ))}